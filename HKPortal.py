@@ -1,21 +1,61 @@
 from flask import (Flask, request, redirect, render_template, render_template_string, send_file,url_for,
-    session,)
+    session, jsonify, g, Response,)
 import os
-import pandas as pd
 from datetime import datetime
-import re
 import io
 from functools import wraps
+from werkzeug.local import LocalProxy
+import assets
+from lazyimport import lazy_import
+import ordertable
+import reconcile
+from money import format_cents, parse_cents, to_dollars
+from tenants import KitchenPrefix, Kitchens
+from profiler import SamplingProfiler
+from traffic import TrafficRecorder
+
+# pandas is only imported when a data route first needs it (see lazyimport.py)
+pd = lazy_import("pandas")
 
 app = Flask(__name__)
+app.jinja_env.filters["money"] = format_cents  # {{ cents|money }} -> "1,234.50"
+# Cacheable, fingerprinted static files and compressed pages (see assets.py)
+app.url_defaults(assets.fingerprinted(app.static_folder))
 
 app.secret_key = os.environ.get("SECRET_KEY")
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-EXCEL_FILE = os.path.join(BASE_DIR, "orders.xlsx")
-EXPENSE_FILE = os.path.join(BASE_DIR, "Expenses.xlsx")
-REMIT_FILE = os.path.join(BASE_DIR, "MoneyMatters.xlsx")
 Dashboard_page = "dashboard.html"
 
+# One portal for every kitchen in HK_KITCHENS (see tenants.py); /k/<name>/
+# URLs are routed to that kitchen
+kitchens = Kitchens.from_env(BASE_DIR)
+app.wsgi_app = KitchenPrefix(app.wsgi_app, kitchens)
+
+# The current request's kitchen: its files, storage backend and live indexes
+EXCEL_FILE = LocalProxy(lambda: g.kitchen.excel_file)
+EXPENSE_FILE = LocalProxy(lambda: g.kitchen.expense_file)
+REMIT_FILE = LocalProxy(lambda: g.kitchen.remit_file)
+store = LocalProxy(lambda: g.kitchen.store)
+item_index = LocalProxy(lambda: g.kitchen.item_index)
+insights_index = LocalProxy(lambda: g.kitchen.insights_index)
+day_totals = LocalProxy(lambda: g.kitchen.day_totals)
+monthly_totals = LocalProxy(lambda: g.kitchen.monthly_totals)
+order_search = LocalProxy(lambda: g.kitchen.order_search)
+order_feed = LocalProxy(lambda: g.kitchen.order_feed)
+dashboard_cache = LocalProxy(lambda: g.kitchen.dashboard_cache)
+
+# Opt-in live dashboard updates over /orders/stream (see feed.py). Each open
+# stream holds a worker thread, so they need threaded workers (gthread)
+LIVE_UPDATES = os.environ.get("HK_LIVE_UPDATES", "0") == "1"
+STREAM_SECONDS = float(os.environ.get("HK_STREAM_SECONDS", "300"))
+app.jinja_env.globals["live_updates"] = LIVE_UPDATES
+
+# Opt-in request profiling, controlled from /admin/profile
+ADMIN_USERS = set(os.environ.get("HK_ADMIN_USERS", "admin").split(","))
+profiler = SamplingProfiler(interval=float(os.environ.get("HK_PROFILE_INTERVAL", "0.005")))
+# Opt-in anonymized request log for replay.py (HK_TRAFFIC_LOG, see traffic.py)
+traffic = TrafficRecorder.from_env(app.secret_key)
+
 # In-memory items + current customer for the ongoing order
 items = []
 current_customer = ""
@@ -24,50 +64,76 @@ orderid="order_id"
 def get_cart():
     session.setdefault("items", [])
     session.setdefault("current_customer", "")
-    return session["items"], session["current_customer"]
+    # Drop lines from carts saved before prices were kept in cents
+    items = [i for i in session["items"] if "price_cents" in i]
+    return items, session["current_customer"]
 
 def set_cart(items, current_customer):
     session["items"] = items
     session["current_customer"] = current_customer
     session.modified = True
 
+def logged_in():
+    """Signed in, and to the kitchen this request is for."""
+    return session.get("logged_in") and session.get("kitchen", kitchens.default) == g.kitchen.name
+
 def login_required(f):
     """Decorator to protect routes: sends user to login if not authenticated."""
     @wraps(f)
     def wrapped(*args, **kwargs):
-        if not session.get("logged_in"):
+        if not logged_in():
             return redirect(url_for("login"))
         return f(*args, **kwargs)
     return wrapped
 
-def get_next_order_id():
-    """
-    Look at existing orders.xlsx (if present),
-    find the highest numeric part of 'Order ID',
-    and return HK<last+1>. If no file/IDs, start at HK1000.
-    """
-    base_num = 1000
-
-    if not os.path.exists(EXCEL_FILE):
-        return f"HK{base_num}"
-
-    df = pd.read_excel(EXCEL_FILE)
-
-    if "Order ID" not in df.columns or df["Order ID"].dropna().empty:
-        return f"HK{base_num}"
-
-    nums = []
-    for val in df["Order ID"].dropna().astype(str):
-        m = re.search(r"(\d+)$", val)
-        if m:
-            nums.append(int(m.group(1)))
+def admin_required(f):
+    """Like login_required, but only for the users in HK_ADMIN_USERS."""
+    @wraps(f)
+    def wrapped(*args, **kwargs):
+        if not logged_in():
+            return redirect(url_for("login"))
+        if session.get("user_id") not in ADMIN_USERS:
+            return "Admins only.", 403
+        return f(*args, **kwargs)
+    return wrapped
 
-    if not nums:
-        next_num = base_num
-    else:
-        next_num = max(nums) + 1
+@app.before_request
+def select_kitchen():
+    # The /k/<name>/ prefix wins; otherwise the kitchen picked at login
+    name = request.environ.get(KitchenPrefix.ENVIRON_KEY) or session.get("kitchen")
+    g.kitchen = kitchens.acquire(name if name in kitchens else kitchens.default)
+
+@app.teardown_request
+def release_kitchen(exc):
+    kitchen = g.pop("kitchen", None)
+    if kitchen is not None:
+        kitchens.release(kitchen)
+
+@app.before_request
+def start_profile():
+    # ?profile=1 profiles this one request (admins only); otherwise the
+    # per-endpoint sampling rates set on /admin/profile apply
+    forced = request.args.get("profile") == "1" and session.get("user_id") in ADMIN_USERS
+    if request.endpoint and profiler.wants(request.endpoint, forced):
+        g.profile = profiler.start(f"{request.method} {request.endpoint}")
+
+@app.teardown_request
+def stop_profile(exc):
+    sampler = g.pop("profile", None)
+    if sampler is not None:
+        sampler.stop()
+
+@app.before_request
+def start_traffic_log():
+    if traffic is not None:
+        g.traffic = traffic.start(request, session)
 
-    return f"HK{next_num}"
+@app.after_request
+def record_traffic_log(response):
+    started = g.pop("traffic", None)
+    if started is not None:
+        traffic.record(started, request, response, g.get("order_id"))
+    return response
 
 @app.route("/", methods=["GET", "POST"])
 def login():
@@ -76,10 +142,13 @@ def login():
     On success -> /home
     """
     error = None
+    # Kitchen from the URL prefix, else the one chosen on the form
+    fixed_kitchen = request.environ.get(KitchenPrefix.ENVIRON_KEY)
 
     if request.method == "POST":
         userid = request.form.get("userid", "").strip()
         password = request.form.get("password", "")
+        kitchen = fixed_kitchen or request.form.get("kitchen", kitchens.default)
 
         # ⭐ Hard-coded credentials for now (change as you like)
         VALID_USERS = {
@@ -87,14 +156,22 @@ def login():
             "admin": "admin123",
         }
 
-        if userid in VALID_USERS and VALID_USERS[userid] == password:
+        if kitchen not in kitchens:
+            error = "Please choose a kitchen."
+        elif userid in VALID_USERS and VALID_USERS[userid] == password:
             session["logged_in"] = True
             session["user_id"] = userid
+            session["kitchen"] = kitchen
             return redirect(url_for("home"))
         else:
             error = "Invalid User ID or Password. Please try again."
 
-    return render_template("index.html", error=error)
+    return render_template(
+        "index.html",
+        error=error,
+        kitchens=[] if fixed_kitchen else kitchens.names(),
+        kitchen=g.kitchen.name,
+    )
 
 @app.route("/home", methods=["GET"])
 @login_required
@@ -117,6 +194,10 @@ def no_cache_for_dynamic_pages(response):
         response.headers["Expires"] = "0"
     return response
 
+@app.after_request
+def shrink_response(response):
+    return assets.compress(request, assets.cache_static(request, response))
+
 @app.route("/logout", methods=["GET"])
 def logout():
     """Clear session and go back to login."""
@@ -126,7 +207,7 @@ def logout():
 @app.route("/addorder", methods=["GET"])
 def addorder():
     items, current_customer = get_cart()
-    grand_total = sum(i["line_total"] for i in items) if items else 0
+    grand_total = sum(i["line_total_cents"] for i in items) if items else 0
 
     return render_template(
         "addorderpg.html",
@@ -142,8 +223,20 @@ def add_item():
     items, current_customer = get_cart()
     posted_customer = request.form["customer"].strip()
     item = request.form["item"].strip()
-    price = float(request.form["price"])
-    count = int(request.form["count"])
+    try:
+        if request.form.get("price", "").strip():
+            price_cents = parse_cents(request.form["price"])
+        else:
+            # Blank price: use the menu / last charged price for this item
+            price_cents = item_index.fresh().price_of(item)
+            if price_cents is None:
+                raise ValueError(item)
+        count = int(request.form["count"])
+        # Price Cents and Count are int32 in the order table
+        if abs(price_cents) > ordertable.INT32_MAX or abs(count) > ordertable.INT32_MAX:
+            raise ValueError(count)
+    except ValueError:
+        return "Please enter a valid price and count.", 400
 
     # Fix the customer name on the first add, and reuse afterwards
     if not current_customer:
@@ -151,71 +244,82 @@ def add_item():
     # Always use the stored customer (ignore any tampering on the client)
     customer = current_customer
 
-    line_total = price * count
+    # Money is kept in integer cents; it is only formatted when rendered
+    line_total_cents = price_cents * count
 
     items.append({
         "customer": customer,
         "item": item,
-        "price": price,
+        "price_cents": price_cents,
         "count": count,
-        "line_total": line_total,
+        "line_total_cents": line_total_cents,
     })
     set_cart(items, current_customer)
-    return redirect("/addorder")
+    return redirect(url_for("addorder"))
+
+
+@app.route("/items/suggest")
+@login_required
+def suggest_items():
+    """
+    Autocomplete for the Item field: /items/suggest?q=chi&limit=8
+    - matches the start of the item name or of any word in it
+    - most-ordered items first, each with its current price
+    """
+    q = request.args.get("q", "")
+    try:
+        limit = max(1, min(int(request.args.get("limit", 8)), 50))
+    except ValueError:
+        limit = 8
+    found = item_index.fresh().suggest(q, limit)
+    for it in found:
+        it["price"] = format_cents(it["price_cents"])
+    return jsonify(items=found)
 
 
 @app.route("/submit-order", methods=["POST"])
 def submit_order():
     """
     When user clicks 'Submit Order':
-    - compute next Order ID based on Excel
+    - allocate the next Order ID from the order store
     - apply SAME Order ID to all current items
-    - append them to Excel
+    - append them to the store's tail log
     - clear current in-memory items & customer
     - show acknowledgement page
     """
     "global items, current_customer"
     items, current_customer = get_cart()
     if not items:
-        return redirect("/addorder")
+        return redirect(url_for("addorder"))
 
     today = datetime.now().strftime("%m/%d/%Y")
-    order_id = get_next_order_id()
 
     excel_rows = []
     for it in items:
         excel_rows.append({
-            "Order ID": order_id,
             "Date": today,
             "Customer": it["customer"],
             "Item": it["item"],
-            "Price": float(it["price"]),
+            "Price Cents": int(it["price_cents"]),
             "Count": int(it["count"]),
-            "Line Total": float(it["line_total"]),
+            "Line Total Cents": int(it["line_total_cents"]),
             "Status": "Accepted",
         })
 
-    new_df = pd.DataFrame(excel_rows)
-
-    if os.path.exists(EXCEL_FILE):
-        existing_df = pd.read_excel(EXCEL_FILE)
-        out_df = pd.concat([existing_df, new_df], ignore_index=True)
-    else:
-        out_df = new_df
-
-    out_df.to_excel(EXCEL_FILE, index=False)
+    order_id = store.append_order(excel_rows)
+    g.order_id = order_id   # for the traffic log
 
     order_date = today
     customer_name = current_customer
-    grand_total = sum(r["Line Total"] for r in excel_rows)
+    grand_total = sum(r["Line Total Cents"] for r in excel_rows)
     line_items = [
         {
             "date": today,
             "customer": r["Customer"],
             "item": r["Item"],
-            "price": r["Price"],
+            "price_cents": r["Price Cents"],
             "count": r["Count"],
-            "line_total": r["Line Total"],
+            "line_total_cents": r["Line Total Cents"],
         }
         for r in excel_rows
     ]
@@ -234,10 +338,32 @@ def submit_order():
         grand_total=grand_total,
     )
 
+SEARCH_FIELDS = ("customer", "item", "status", "from_date", "to_date")
+
+def search_results():
+    """One page of /orders/search results for the query string."""
+    try:
+        page = max(1, int(request.args.get("page", 1)))
+        per_page = max(1, min(int(request.args.get("per_page", 25)), 100))
+    except ValueError:
+        page, per_page = 1, 25
+    return order_search.fresh().search(
+        customer=request.args.get("customer", "").strip(),
+        item=request.args.get("item", "").strip(),
+        status=request.args.get("status", "").strip(),
+        from_day=ordertable.day_number(request.args.get("from_date", "").strip()),
+        to_day=ordertable.day_number(request.args.get("to_date", "").strip()),
+        page=page,
+        per_page=per_page,
+    )
+
 @app.route("/search-order", methods=["GET", "POST"])
 @login_required
 def srchorder():
-    order_info = None
+    """
+    Order ID lookup (POST), or a search over customer, item, status and
+    date range (GET, same parameters as /orders/search).
+    """
     error = None
 
     if request.method == "POST":
@@ -249,7 +375,20 @@ def srchorder():
             # Redirect to view_order() which you already have
             return redirect(url_for("view_order", order_id=order_id))
 
-    return render_template("srchorder.html", order_info=order_info, error=error)
+    query = {name: request.args.get(name, "").strip() for name in SEARCH_FIELDS}
+    results = search_results() if any(query.values()) else None
+    return render_template("srchorder.html", error=error, query=query, results=results)
+
+@app.route("/orders/search", methods=["GET"])
+@login_required
+def search_orders():
+    """
+    Order search API, newest first:
+    /orders/search?customer=rav&item=biri&status=delivered&from_date=2025-12-01&to_date=2025-12-31&page=1&per_page=25
+    - customer / item: each word matches the start of a word in the name
+    - status: a status, "not_cancelled", or empty for all
+    """
+    return jsonify(search_results())
 
 @app.route("/updorder", methods=["GET","POST"])
 @login_required
@@ -272,15 +411,10 @@ def updorder():
 @app.route("/order/<order_id>/forupdate", methods=["GET"])
 def update_view_order(order_id):
     """View an existing order later by ID using the same acknowledgment page."""
-    if not os.path.exists(EXCEL_FILE):
+    if not store.exists():
         return f"No orders found. File {EXCEL_FILE} does not exist.", 404
 
-    df = pd.read_excel(EXCEL_FILE)
-
-    if "Order ID" not in df.columns:
-        return "Invalid orders file (no 'Order ID' column).", 500
-
-    subset = df[df["Order ID"] == order_id]
+    subset = store.find_order(order_id)
 
     if subset.empty:
         return f"No order found with ID {order_id}", 404
@@ -292,16 +426,16 @@ def update_view_order(order_id):
             "date": row["Date"],
             "customer": row["Customer"],
             "item": row["Item"],
-            "price": float(row["Price"]),
+            "price_cents": int(row["Price Cents"]),
             "count": int(row["Count"]),
-            "line_total": float(row["Line Total"]),
+            "line_total_cents": int(row["Line Total Cents"]),
             "status": row["Status"]
         })
 
     order_date = line_items[0]["date"]
     customer_name = line_items[0]["customer"]
     status= line_items[0]["status"]
-    grand_total = sum(li["line_total"] for li in line_items)
+    grand_total = sum(li["line_total_cents"] for li in line_items)
 
     return render_template(
         "updstatus.html",
@@ -328,47 +462,98 @@ def update_order_status(order_id):
         return redirect(url_for("view_order", order_id=order_id))
 
     # Ensure the Excel file exists
-    if not os.path.exists(EXCEL_FILE):
+    if not store.exists():
         return f"No orders found. File {EXCEL_FILE} does not exist.", 404
 
-    df = pd.read_excel(EXCEL_FILE)
-
-    if "Order ID" not in df.columns:
-        return "Invalid orders file (no 'Order ID' column).", 500
+    # ✅ Update status (one event appended to the order store)
+    updated = store.set_status([order_id], new_status)
 
-    # Find rows for this order_id
-    mask = df["Order ID"] == order_id
-
-    if not mask.any():
+    if not updated:
+        year = store.archived_year(order_id)
+        if year is not None:
+            return f"Cannot update order {order_id}: it is in archived year {year} (read-only).", 409
         return f"No order found with ID {order_id}", 404
 
-    # Make sure Status column exists
-    if "Status" not in df.columns:
-        df["Status"] = ""
-
-    # ✅ Update status
-    df.loc[mask, "Status"] = new_status
-
-    # Save back to Excel
-    df.to_excel(EXCEL_FILE, index=False)
-
     # Redirect back to the order details page (updateOrder)
     #return redirect(url_for("updorder",  msg="Order updated successfully"))
     msg= "Order id : " + order_id + " updated successfully"
     return render_template("updorder.html", msg=msg)
 
+@app.route("/orders/bulk-status", methods=["POST"])
+@login_required
+def bulk_update_status():
+    """
+    Update the Status of many orders in one go.
+    - order_ids: the orders ticked on the dashboard, or
+    - apply_to=filtered: every order the dashboard showed (shown_ids), not
+      orders that came in after the page was rendered
+    All of them are changed with a single write to the order store. Orders
+    in an archived year are read-only; the message counts them as skipped.
+    """
+    new_status = request.form.get("new_status", "").strip()
+    order_ids = [o.strip() for o in request.form.getlist("order_ids") if o.strip()]
+    filters = {
+        "from_date": request.form.get("from_date", "").strip(),
+        "to_date": request.form.get("to_date", "").strip(),
+        "customer": request.form.get("customer", "").strip(),
+        "status": request.form.get("status", "").strip().lower(),
+    }
+    apply_to_filtered = request.form.get("apply_to") == "filtered"
+
+    if not new_status or (not order_ids and not apply_to_filtered):
+        return redirect(url_for("dashboard", **filters))
+
+    if not store.exists():
+        return f"No orders found. File {EXCEL_FILE} does not exist.", 404
+
+    if apply_to_filtered:
+        order_ids = request.form.get("shown_ids", "").split()
+        if not order_ids:
+            return redirect(url_for("dashboard", **filters))
+
+    updated = store.set_status(order_ids, new_status)
+
+    msg = f"{updated} order(s) updated to {new_status}"
+    if updated < len(set(order_ids)):
+        archived = store.archived_orders(order_ids)
+        if archived:
+            years = ", ".join(str(y) for y in sorted(set(archived.values())))
+            msg += f"; {len(archived)} skipped: archived year {years} is read-only"
+    return redirect(url_for("dashboard", msg=msg, **filters))
+
+
+@app.route("/orders/stream", methods=["GET"])
+@login_required
+def order_stream():
+    """
+    Server-Sent Events for the order screens: an "order" event for each
+    submitted order and a "status" event for each status change, as they
+    are committed (see feed.py). A reconnecting browser resumes after its
+    Last-Event-ID. Off unless HK_LIVE_UPDATES=1; each stream ends after
+    HK_STREAM_SECONDS and the browser reconnects.
+    """
+    if not LIVE_UPDATES:
+        return "Live updates are off (set HK_LIVE_UPDATES=1).", 404
+    # The stream outlives the request, so hold the feed itself, not the proxy
+    feed = order_feed._get_current_object()
+    try:
+        after = int(request.headers.get("Last-Event-ID", ""))
+    except ValueError:
+        after = store.data_version()
+    return Response(
+        feed.stream(after, STREAM_SECONDS),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.route("/order/<order_id>", methods=["GET"])
 def view_order(order_id):
     """View an existing order later by ID using the same acknowledgment page."""
-    if not os.path.exists(EXCEL_FILE):
+    if not store.exists():
         return f"No orders found. File {EXCEL_FILE} does not exist.", 404
 
-    df = pd.read_excel(EXCEL_FILE)
-
-    if "Order ID" not in df.columns:
-        return "Invalid orders file (no 'Order ID' column).", 500
-
-    subset = df[df["Order ID"] == order_id]
+    subset = store.find_order(order_id)
 
     if subset.empty:
         return f"No order found with ID {order_id}", 404
@@ -380,16 +565,16 @@ def view_order(order_id):
             "date": row["Date"],
             "customer": row["Customer"],
             "item": row["Item"],
-            "price": float(row["Price"]),
+            "price_cents": int(row["Price Cents"]),
             "count": int(row["Count"]),
-            "line_total": float(row["Line Total"]),
+            "line_total_cents": int(row["Line Total Cents"]),
             "status": row["Status"]
         })
 
     order_date = line_items[0]["date"]
     customer_name = line_items[0]["customer"]
     status= line_items[0]["status"]
-    grand_total = sum(li["line_total"] for li in line_items)
+    grand_total = sum(li["line_total_cents"] for li in line_items)
 
     return render_template(
         "order_confirmation.html",
@@ -408,7 +593,35 @@ def reset_order():
     global items, current_customer
     items = []
     current_customer = ""
-    return redirect("/addorder")
+    return redirect(url_for("addorder"))
+
+def dashboard_results(from_date, to_date, customer, status):
+    """(summary, orders) for one combination of dashboard filters."""
+    # Summary always excludes cancelled orders; the table follows the status filter.
+    # Date-only ranges come from the per-day prefix sums.
+    if customer:
+        summary = store.order_summary(from_date, to_date, customer)
+    else:
+        summary = day_totals.fresh().summary(from_date, to_date)
+    grouped = store.list_orders(from_date, to_date, customer, status)
+
+    orders = []
+    if not grouped.empty:
+        for _, row in grouped.iterrows():
+            display_date = row["Date_parsed"].strftime("%m-%d-%Y`") if not pd.isna(row["Date_parsed"]) else ""
+            orders.append({
+                orderid: row["Order ID"],
+                "date": display_date,
+                "customer": row["Customer"],
+                "status": row["Status"],
+                "total_cents": int(row["Order Total Cents"]),
+                "line_count": int(row["Line Count"]),
+            })
+
+        # Sort newest first
+        orders.sort(key=lambda r: (r["date"], r[orderid]), reverse=True)
+
+    return summary, orders
 
 @app.route("/dashboard", methods=["GET"])
 def dashboard():
@@ -425,11 +638,12 @@ def dashboard():
     status_q = request.args.get("status", "").strip().lower() 
     if "status" not in request.args:
        status_q = "not_cancelled"
+    msg = request.args.get("msg")
     # If no file yet, render empty dashboard
-    if not os.path.exists(EXCEL_FILE):
+    if not store.exists():
         summary = {
             "total_orders": 0,
-            "total_revenue": 0.0,
+            "total_revenue": 0,
             "total_items": 0,
         }
         orders = []
@@ -442,101 +656,12 @@ def dashboard():
             customer=customer_q,
         )
 
-    df = pd.read_excel(EXCEL_FILE)
-
-    if df.empty or "Order ID" not in df.columns:
-        summary = {
-            "total_orders": 0,
-            "total_revenue": 0.0,
-            "total_items": 0,
-        }
-        orders = []
-        return render_template(
-            Dashboard_page,
-            summary=summary,
-            orders=orders,
-            from_date=from_date_str,
-            to_date=to_date_str,
-            customer=customer_q,
-        )
-
-    # Parse dates from the "Date" column
-    df["Date_parsed"] = pd.to_datetime(df["Date"], errors="coerce")
-
-    # Apply date filters if provided (browser sends YYYY-MM-DD)
-    if from_date_str:
-        from_dt = pd.to_datetime(from_date_str, errors="coerce")
-        if not pd.isna(from_dt):
-            df = df[df["Date_parsed"] >= from_dt]
-
-    if to_date_str:
-        to_dt = pd.to_datetime(to_date_str, errors="coerce")
-        if not pd.isna(to_dt):
-            # include the end date fully
-            df = df[df["Date_parsed"] <= to_dt]
-
-    # Apply customer filter (contains, case-insensitive)
-    if customer_q:
-        df = df[df["Customer"].astype(str).str.contains(customer_q, case=False, na=False)]
-    df_filtered = df.copy()        
-    df_table=df.copy()
-    if status_q == "not_cancelled":
-        df_filtered = df_filtered[
-        df_filtered["Status"].astype(str).str.lower() != "cancelled"]
-    elif status_q:
-        df_filtered = df_filtered[df_filtered["Status"].astype(str).str.lower() == status_q]
-    #→ EXCLUDE CANCELLED ORDERS FROM SUMMARY
-    df_summary= df[df["Status"].astype(str).str.lower() != "cancelled"]
-    # After filtering, compute summary
-    if df_summary.empty:
-        summary = {
-            "total_orders": 0,
-            "total_revenue": 0.0,
-            "total_items": 0,
-        }
-        orders = []
-    else:
-        total_orders = df_summary["Order ID"].nunique()
-        total_revenue = float(df_summary["Line Total"].sum())
-        total_items = int(df_summary["Count"].sum())
-
-        summary = {
-            "total_orders": total_orders,
-            "total_revenue": total_revenue,
-            "total_items": total_items,
-        }
-    
-    orders = []
-    if not df_filtered.empty:
-        # Aggregate one row per order
-        grouped = (
-            df_filtered.groupby("Order ID")
-              .agg({
-                  "Date_parsed": "max",
-                  "Customer": "first",
-                  "Status": "first",
-                  "Line Total": "sum",
-                  "Item": "count",
-              })
-              .reset_index()
-        )
-
-        grouped.rename(columns={"Line Total": "Order Total", "Item": "Line Count"}, inplace=True)
-
-        orders = []
-        for _, row in grouped.iterrows():
-            display_date = row["Date_parsed"].strftime("%m-%d-%Y`") if not pd.isna(row["Date_parsed"]) else ""
-            orders.append({
-                orderid: row["Order ID"],
-                "date": display_date,
-                "customer": row["Customer"],
-                "status": row["Status"],
-                "total": float(row["Order Total"]),
-                "line_count": int(row["Line Count"]),
-            })
-
-        # Sort newest first
-        orders.sort(key=lambda r: (r["date"], r[orderid]), reverse=True)
+    # Repeated views (today, not_cancelled, a regular customer) come from the
+    # cache until the next write. Customer matching is case-insensitive.
+    key = (from_date_str, to_date_str, customer_q.lower(), status_q)
+    summary, orders = dashboard_cache.get(
+        key, store.data_version(), lambda: dashboard_results(*key)
+    )
 
     return render_template(
         Dashboard_page,
@@ -546,6 +671,7 @@ def dashboard():
         to_date=to_date_str,
         customer=customer_q,
         status=status_q,
+        msg=msg,
     )
 
 @app.route("/menu")
@@ -570,18 +696,18 @@ def export_stats_excel():
     )
 
 def compute_grand_totals(stats_by_year):
-
+    """Sum the monthly rows of every year (all values in integer cents)."""
     grand = {
-        "total_expense": 0.0,
-        "total_cash": 0.0,
-        "total_revenue": 0.0,
+        "total_expense": 0,
+        "total_cash": 0,
+        "total_revenue": 0,
     }
 
     for year, rows in stats_by_year.items():
         for row in rows:
-            grand["total_expense"] += float(row.get("total_expense", 0) or 0)
-            grand["total_cash"]    += float(row.get("total_cash", 0) or 0)
-            grand["total_revenue"] += float(row.get("total_revenue", 0) or 0)
+            grand["total_expense"] += int(row.get("total_expense", 0) or 0)
+            grand["total_cash"]    += int(row.get("total_cash", 0) or 0)
+            grand["total_revenue"] += int(row.get("total_revenue", 0) or 0)
 
     return grand
 
@@ -589,6 +715,7 @@ def stats_to_dataframe(stats_by_year):
     """
     Flattens stats_by_year into a DataFrame with columns:
     Year, Month, Total Expense, Total Cash, Total Revenue
+    (cents converted back to dollars for the Excel export)
     """
     rows = []
     for year, monthly in stats_by_year.items():
@@ -596,9 +723,9 @@ def stats_to_dataframe(stats_by_year):
             rows.append({
                 "Year": year,
                 "Month": row["month"],
-                "Total Expense": float(row.get("total_expense", 0) or 0),
-                "Total Cash": float(row.get("total_cash", 0) or 0),
-                "Total Revenue": float(row.get("total_revenue", 0) or 0),
+                "Total Expense": to_dollars(int(row.get("total_expense", 0) or 0)),
+                "Total Cash": to_dollars(int(row.get("total_cash", 0) or 0)),
+                "Total Revenue": to_dollars(int(row.get("total_revenue", 0) or 0)),
             })
     return pd.DataFrame(rows)
 
@@ -615,91 +742,136 @@ def stats():
     )
 
 def build_stats():
+    # Monthly revenue / expense / cash (integer cents), kept current from
+    # the store's write events instead of re-reading the workbooks
+    return monthly_totals.fresh().stats_by_year()
+
+# Entry forms for the two sheets next to orders.xlsx
+ENTRY_FORMS = {
+    "expenses": {"title": "Add Expense", "label": "Expense", "amount": "Amount Cents",
+                 "placeholder": "e.g. Walmart"},
+    "remits": {"title": "Add Cash Remittance", "label": "Type of Remit", "amount": "Cash Amount Cents",
+               "placeholder": "e.g. Zelle from Sid"},
+}
+
+@app.route("/expenses/add", methods=["GET", "POST"], endpoint="add_expense")
+@app.route("/remits/add", methods=["GET", "POST"], endpoint="add_remit")
+@login_required
+def add_entry():
+    """
+    Add one expense or cash remittance: date, description, amount.
+    The entry is appended to the store like an order and shows up on
+    /stats right away; the workbook itself is updated on the next compaction.
+    """
+    kind = "expenses" if request.endpoint == "add_expense" else "remits"
+    form = ENTRY_FORMS[kind]
+    error = None
+    msg = request.args.get("msg")
 
-    # Read Excel files
-    df_orders = pd.read_excel(EXCEL_FILE)
-    df_exp = pd.read_excel(EXPENSE_FILE)
-    df_cash = pd.read_excel(REMIT_FILE)
-
-    # Build three monthly summaries
-    rev_df = build_monthly_sum(
-        df_orders,
-        amt_col="Line Total",
-        new_col="total_revenue",
-        exclude_cancelled=True,
-    )
+    if request.method == "POST":
+        text = request.form.get("description", "").strip()
+        try:
+            day = datetime.strptime(request.form.get("date", "").strip(), "%Y-%m-%d")
+            amount_cents = parse_cents(request.form.get("amount", ""))
+        except ValueError:
+            day = amount_cents = None
+        if not text or day is None or not amount_cents:
+            error = f"Please enter a date, {form['label'].lower()} and a non-zero amount."
+        else:
+            try:
+                store.append_entry(kind, {
+                    "Date": day.strftime("%m/%d/%Y"),
+                    form["label"]: text,
+                    form["amount"]: amount_cents,
+                })
+            except ValueError as exc:
+                error = f"Cannot add an entry for {day:%m/%d/%Y}: {exc}."
+            else:
+                msg = f"{form['label']} of {format_cents(amount_cents)} on {day:%m/%d/%Y} saved"
+                return redirect(url_for(request.endpoint, msg=msg))
 
-    exp_df = build_monthly_sum(
-        df_exp,
-        amt_col="Amount",
-        new_col="total_expense",
-        exclude_cancelled=False,
+    return render_template(
+        "addentry.html",
+        form=form,
+        error=error,
+        msg=msg,
+        today=datetime.now().strftime("%Y-%m-%d"),
     )
 
-    cash_df = build_monthly_sum(
-        df_cash,
-        amt_col="Cash Amount",
-        new_col="total_cash",
-        exclude_cancelled=False,
-    )
+@app.route("/insights", methods=["GET"])
+@login_required
+def insights():
+    """
+    Top items and customers (cancelled orders excluded):
+    - period: "all", a year ("2025") or a month ("2025-12")
+    - n: how many rows per list (default 10)
+    Served from running counters, so this never re-reads the order history.
+    """
+    index = insights_index.fresh()
+    periods = index.periods()
+    period = request.args.get("period", "all")
+    if period not in periods:
+        period = "all"
+    try:
+        n = max(1, min(int(request.args.get("n", 10)), 100))
+    except ValueError:
+        n = 10
 
-    # Merge them all on Year + Month
-    merged = (
-        rev_df
-        .merge(exp_df, on=["Year", "MonthNum", "Month"], how="outer")
-        .merge(cash_df, on=["Year", "MonthNum", "Month"], how="outer")
-        .fillna(0)
+    return render_template(
+        "insights.html",
+        period=period,
+        periods=periods,
+        n=n,
+        top=index.top(period, n),
     )
-    
-    # Convert to your stats_by_year structure
-    stats_by_year = {}
-    merged = merged.sort_values(["Year", "MonthNum"])
-
-    for _, row in merged.iterrows():
-        year = int(row["Year"])
-        month_label = row["Month"]
-
-        stats_by_year.setdefault(year, []).append({
-            "month": month_label,
-            "total_revenue": float(row.get("total_revenue", 0.0)),
-            "total_expense": float(row.get("total_expense", 0.0)),
-            "total_cash": float(row.get("total_cash", 0.0)),
-        })
-    return stats_by_year
 
-def build_monthly_sum(df, amt_col, new_col, exclude_cancelled=False):
+@app.route("/admin/profile", methods=["GET", "POST"])
+@admin_required
+def admin_profile():
     """
-    Helper to aggregate a single dataframe into:
-    Year, MonthNum, Month, <new_col>
-
-    - df:        input DataFrame
-    - amt_col:   column to sum (e.g., 'Line Total', 'Amount', 'Cash Amount')
-    - new_col:   output column name (e.g., 'total_revenue')
-    - exclude_cancelled: if True, filter out Status == 'cancelled'
+    Profiling controls:
+    - POST endpoint + rate (0..1): profile that fraction of its requests
+    - POST action=reset: drop the samples collected so far
+    Any single request can also be profiled by adding ?profile=1.
     """
-    if df.empty:
-        # Return empty frame with expected columns
-        return pd.DataFrame(columns=["Year", "MonthNum", "Month", new_col])
-
-    df = df.copy()
-
-    if exclude_cancelled and "Status" in df.columns:
-        df = df[df["Status"].astype(str).str.lower() != "cancelled"].copy()
-
-    # Parse Date (mm/dd/yyyy)
-    df["Date"] = pd.to_datetime(df["Date"], format="%m/%d/%Y")
+    if request.method == "POST":
+        if request.form.get("action") == "reset":
+            profiler.reset()
+        else:
+            endpoint = request.form.get("endpoint", "").strip()
+            try:
+                rate = float(request.form.get("rate", "0"))
+            except ValueError:
+                return "Rate must be a number between 0 and 1.", 400
+            if endpoint not in app.view_functions:
+                return f"Unknown endpoint: {endpoint}", 400
+            profiler.set_rate(endpoint, rate)
+        return redirect(url_for("admin_profile"))
 
-    df["Year"] = df["Date"].dt.year
-    df["MonthNum"] = df["Date"].dt.month
-    df["Month"] = df["Date"].dt.strftime("%b")
+    return render_template(
+        "admin_profile.html",
+        rates=sorted(profiler.rates.items()),
+        requests=sorted(profiler.requests.items()),
+        samples=sum(profiler.stacks.values()),
+        endpoints=sorted(e for e in app.view_functions if e != "static"),
+    )
 
-    grouped = (
-        df.groupby(["Year", "MonthNum", "Month"])
-          .agg(**{new_col: (amt_col, "sum")})
-          .reset_index()
+@app.route("/admin/profile/collapsed", methods=["GET"])
+@admin_required
+def admin_profile_download():
+    """Aggregated samples as a collapsed-stack file (flamegraph.pl, speedscope)."""
+    return send_file(
+        io.BytesIO(profiler.collapsed().encode("utf-8")),
+        as_attachment=True,
+        download_name="HarrysKitchen_profile.collapsed",
+        mimetype="text/plain",
     )
 
-    return grouped
+@app.route("/admin/cache", methods=["GET"])
+@admin_required
+def admin_cache():
+    """Dashboard result cache of this kitchen, for this worker: size and hit/miss counts."""
+    return jsonify(dashboard_cache.stats())
 
 @app.route("/monthly-summary", methods=["GET"])
 def monthly_summary():
@@ -717,50 +889,28 @@ def monthly_summary():
         year_int = now.year
 
     summary_rows = []
-    monthly_total = 0.0
+    monthly_total = 0
     file_missing = False
     no_data = False
 
-    if not os.path.exists(EXCEL_FILE):
+    if not store.exists():
         file_missing = True
     else:
-        df = pd.read_excel(EXCEL_FILE)
-
-        # Make sure the date column exists
-        if "Date" in df.columns:
-            df["Date"] = pd.to_datetime(df["Date"], errors="coerce")
-            df = df.dropna(subset=["Date"])
+        # Per-day totals for the selected month (cancelled excluded)
+        df_grouped = store.daily_totals(year_int, month_int)
 
-            # Optionally exclude Cancelled
-            if "Status" in df.columns:
-                df = df[df["Status"].astype(str).str.lower() != "cancelled"]
-
-            # Filter by selected month & year
-            df_filtered = df[
-                (df["Date"].dt.month == month_int) &
-                (df["Date"].dt.year == year_int)
-            ]
-
-            if df_filtered.empty:
-                no_data = True
-            else:
-                # Group by date (just the date part)
-                df_grouped = df_filtered.groupby(df_filtered["Date"].dt.date).agg(
-                    total_amount=("Line Total", "sum"),
-                    order_count=("Order ID", "nunique") if "Order ID" in df.columns else ("Date", "count")
-                ).reset_index()
-
-                # Prepare rows for template
-                for _, row in df_grouped.iterrows():
-                    summary_rows.append({
-                        "date": row["Date"].strftime("%Y-%m-%d"),
-                        "order_count": int(row["order_count"]),
-                        "total_amount": float(row["total_amount"])
-                    })
-
-                monthly_total = sum(r["total_amount"] for r in summary_rows)
-        else:
+        if df_grouped.empty:
             no_data = True
+        else:
+            # Prepare rows for template
+            for _, row in df_grouped.iterrows():
+                summary_rows.append({
+                    "date": row["Date"].strftime("%Y-%m-%d"),
+                    "order_count": int(row["order_count"]),
+                    "total_cents": int(row["total_cents"])
+                })
+
+            monthly_total = sum(r["total_cents"] for r in summary_rows)
 
     # Month options for dropdown
     month_options = [
@@ -779,6 +929,86 @@ def monthly_summary():
         no_data=no_data,
     )
 
+def reconciliation_args():
+    """(from_date, to_date, tolerance_cents) from the query string; defaults to this month, exact match."""
+    today = datetime.now()
+    from_date = request.args.get("from_date", "").strip() or today.strftime("%Y-%m-01")
+    to_date = request.args.get("to_date", "").strip() or today.strftime("%Y-%m-%d")
+    try:
+        tolerance_cents = max(0, parse_cents(request.args.get("tolerance", "") or "0"))
+    except ValueError:
+        tolerance_cents = 0
+    return from_date, to_date, tolerance_cents
+
+def reconciliation(from_date, to_date, tolerance_cents):
+    """(days, gaps) of reconcile.reconcile for a date range (YYYY-MM-DD strings)."""
+    from_day, to_day = ordertable.day_number(from_date), ordertable.day_number(to_date)
+    table = store.order_table(from_day, to_day)
+    return reconcile.reconcile(table, store.load_remits(from_day, to_day), from_day, to_day, tolerance_cents)
+
+@app.route("/reconciliation", methods=["GET"])
+@login_required
+def reconciliation_report():
+    """
+    Cash remitted vs order revenue per day (see reconcile.py):
+    - from_date / to_date (YYYY-MM-DD), default: this month so far
+    - tolerance: difference in dollars still counted as matched
+    - only=flagged: hide the matched days
+    """
+    from_date, to_date, tolerance_cents = reconciliation_args()
+    only_flagged = request.args.get("only") == "flagged"
+    days, gaps = reconciliation(from_date, to_date, tolerance_cents)
+    totals = {
+        "revenue_cents": int(days["revenue_cents"].sum()),
+        "cash_cents": int(days["cash_cents"].sum()),
+        "owed_cents": int(days["balance_cents"].iloc[-1]) if len(days) else 0,
+        "flagged_days": int((days["flag"] != "").sum()),
+    }
+    if only_flagged:
+        days = days[days["flag"] != ""]
+
+    return render_template(
+        "reconciliation.html",
+        from_date=from_date,
+        to_date=to_date,
+        tolerance=f"{tolerance_cents / 100:.2f}",
+        only_flagged=only_flagged,
+        days=days.to_dict("records"),
+        gaps=gaps.to_dict("records"),
+        totals=totals,
+    )
+
+@app.route("/reconciliation/export", methods=["GET"])
+@login_required
+def export_reconciliation_csv():
+    """The reconciliation report as CSV, with the order IDs of each flagged day."""
+    from_date, to_date, tolerance_cents = reconciliation_args()
+    days, _ = reconciliation(from_date, to_date, tolerance_cents)
+
+    flagged = days["flag"].values != ""
+    order_lists = reconcile.orders_by_day(
+        store.order_table(ordertable.day_number(from_date), ordertable.day_number(to_date)),
+        days["Day"].values[flagged],
+    )
+    out = pd.DataFrame({
+        "Date": pd.to_datetime(days["Date"]).dt.strftime("%Y-%m-%d"),
+        "Orders": days["order_count"],
+        "Revenue": to_dollars(days["revenue_cents"]),
+        "Cash Remitted": to_dollars(days["cash_cents"]),
+        "Difference": to_dollars(days["diff_cents"]),
+        "Cash Owed": to_dollars(days["balance_cents"]),
+        "Flag": days["flag"],
+        "Gap": days["gap"].where(days["gap"] > 0, ""),
+        "Order IDs": [order_lists.get(day, "") for day in days["Day"].tolist()],
+    })
+
+    return send_file(
+        io.BytesIO(out.to_csv(index=False, float_format="%.2f").encode("utf-8")),
+        as_attachment=True,
+        download_name=f"HarrysKitchen_Reconciliation_{from_date}_{to_date}.csv",
+        mimetype="text/csv",
+    )
+
 
 if __name__ == "__main__":
     app.run(debug=True, host="0.0.0.0", port=5000)
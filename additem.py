@@ -5,6 +5,7 @@ import pandas as pd
 from datetime import datetime
 import re
 from functools import wraps
+from durable import atomic_path
 
 app = Flask(__name__)
 
@@ -192,7 +193,8 @@ def submit_order():
     else:
         out_df = new_df
 
-    out_df.to_excel(EXCEL_FILE, index=False)
+    with atomic_path(EXCEL_FILE, ".tmp.xlsx") as tmp:
+        out_df.to_excel(tmp, index=False)
 
     order_date = today
     customer_name = current_customer
@@ -328,7 +330,8 @@ def update_order_status(order_id):
     df.loc[mask, "Status"] = new_status
 
     # Save back to Excel
-    df.to_excel(EXCEL_FILE, index=False)
+    with atomic_path(EXCEL_FILE, ".tmp.xlsx") as tmp:
+        df.to_excel(tmp, index=False)
 
     # Redirect back to the order details page (updateOrder)
     #return redirect(url_for("updorder",  msg="Order updated successfully"))
@@ -0,0 +1,233 @@
+"""
+Cold archive for closed years.
+
+    archive/
+        index.json              yearly summaries (read without opening a year)
+        2024/orders.pkl.gz      compact order table (ordertable.py)
+        2024/expenses.pkl.gz    storage frames, amounts in cents
+        2024/remits.pkl.gz
+        2024/Expenses.xlsx      the workbooks as they were before the year
+        2024/MoneyMatters.xlsx  was moved out (hand-kept cells included)
+
+index.json holds, per year and kind, the row count, the total in cents and
+the total per month, so the monthly summaries never open an archived year:
+
+    {"2024": {"orders":   {"rows": 5120, "orders": 1702, "items": 6100,
+                           "total_cents": 9120050, "monthly": {"01": 70100, ...}},
+              "expenses": {"rows": 310, "total_cents": 2100400, "monthly": {...}},
+              "remits":   {...}}}
+
+Order totals leave out cancelled lines, like everywhere else. The orders
+summary also carries a "rollup" (see order_rollup): the per-day, per-month
+and per-item totals the live indexes start from, so building them never
+opens an archived year either. Archived files are written once and never
+changed; the frames are only unpickled when a query reaches back into
+their year, and then cached.
+"""
+import json
+import os
+
+import durable
+import ordertable
+from lazyimport import lazy_import
+from ordertable import DATE_FMT
+from partitions import UNDATED
+
+pd = lazy_import("pandas")
+
+KINDS = ["orders", "expenses", "remits"]
+AMOUNT_COLUMNS = {
+    "orders": "Line Total Cents",
+    "expenses": "Amount Cents",
+    "remits": "Cash Amount Cents",
+}
+TOTAL_COLUMNS = {
+    "orders": "total_revenue",
+    "expenses": "total_expense",
+    "remits": "total_cash",
+}
+
+
+class Archive:
+    def __init__(self, path):
+        self.path = path
+        self.index_file = os.path.join(path, "index.json")
+        self._index = None   # (mtime_ns, index)
+        self._frames = {}    # (year, kind) -> frame
+        self._rollups = {}   # year -> rollup computed for an index.json without one
+
+    def file(self, year, kind):
+        return os.path.join(self.path, str(year), f"{kind}.pkl.gz")
+
+    def index(self):
+        """{"YYYY": {kind: summary}}, re-read when index.json changes."""
+        try:
+            mtime = os.stat(self.index_file).st_mtime_ns
+        except FileNotFoundError:
+            return {}
+        if self._index is None or self._index[0] != mtime:
+            with open(self.index_file, encoding="utf-8") as fh:
+                self._index = (mtime, json.load(fh))
+        return self._index[1]
+
+    def years(self):
+        return sorted(int(y) for y in self.index())
+
+    def summary(self, year):
+        return self.index().get(str(year), {})
+
+    def load(self, year, kind):
+        """The archived frame of one year (None if that year has no `kind`)."""
+        if kind not in self.summary(year):
+            return None
+        key = (int(year), kind)
+        if key not in self._frames:
+            self._frames[key] = pd.read_pickle(self.file(year, kind))
+        return self._frames[key]
+
+    def rollup(self, year):
+        """
+        order_rollup() of an archived year, from index.json. Years archived
+        before the rollup was recorded are loaded once to compute it.
+        """
+        rollup = self.summary(year).get("orders", {}).get("rollup")
+        if rollup is not None:
+            return rollup
+        if int(year) not in self._rollups:
+            table = self.load(year, "orders")
+            self._rollups[int(year)] = order_rollup(ordertable.empty_table() if table is None else table)
+        return self._rollups[int(year)]
+
+    def release(self):
+        """Forget the frames loaded so far (they are re-read on demand)."""
+        self._frames = {}
+
+    def frames(self, kind, years=None):
+        """Archived frames of every year (or of `years`), loading the ones not read yet."""
+        years = self.years() if years is None else [y for y in self.years() if y in years]
+        frames = (self.load(y, kind) for y in years)
+        return [f for f in frames if f is not None]
+
+    def monthly(self, kind):
+        """Year, MonthNum, Month, total_<x> (cents) from the summaries alone."""
+        rows = []
+        for year in self.years():
+            for month, cents in sorted(self.summary(year).get(kind, {}).get("monthly", {}).items()):
+                rows.append((year, int(month), cents))
+        col = TOTAL_COLUMNS[kind]
+        if not rows:
+            return pd.DataFrame(columns=["Year", "MonthNum", "Month", col])
+        df = pd.DataFrame(rows, columns=["Year", "MonthNum", col])
+        df.insert(2, "Month", pd.to_datetime(dict(year=df["Year"], month=df["MonthNum"], day=1)).dt.strftime("%b"))
+        return df
+
+    # ---------- writing ----------
+
+    def write(self, year, frames):
+        """
+        Archive {kind: frame} for one year and record its summaries. A year
+        is written once; archiving it again is refused.
+        """
+        index = dict(self.index())
+        if str(year) in index:
+            raise ValueError(f"{year} is already archived")
+        os.makedirs(os.path.join(self.path, str(year)), exist_ok=True)
+        summaries = {}
+        for kind, frame in frames.items():
+            frame = frame.reset_index(drop=True)
+            with durable.atomic_path(self.file(year, kind)) as tmp:
+                frame.to_pickle(tmp, compression="gzip")
+            summaries[kind] = summarise(kind, frame)
+        index[str(year)] = summaries
+        with durable.atomic_path(self.index_file) as tmp:
+            with open(tmp, "w", encoding="utf-8") as fh:
+                json.dump(index, fh, indent=1, sort_keys=True)
+
+
+def summarise(kind, frame):
+    """Row count, total and per-month totals (cents) of one archived frame."""
+    if kind == "orders":
+        live = frame[ordertable.filter_mask(frame, status="not_cancelled")]
+        cents = live[AMOUNT_COLUMNS[kind]]
+        summary = {
+            "orders": int(len(frame[["Order Prefix", "Order Num"]].drop_duplicates())),
+            "items": int(live["Count"].sum()),
+        }
+        months = pd.Series(ordertable.month_keys(live["Day"].values), index=live.index)
+    else:
+        cents = frame[AMOUNT_COLUMNS[kind]]
+        summary = {}
+        months = year_months(frame["Date"])
+    summary["rows"] = int(len(frame))
+    summary["total_cents"] = int(cents.sum())
+    summary["monthly"] = {
+        month[5:]: int(total)
+        for month, total in cents.groupby(months).sum().items()
+        if month != UNDATED
+    }
+    if kind == "orders":
+        summary["rollup"] = order_rollup(frame)
+    return summary
+
+
+def order_rollup(table):
+    """
+    What the live indexes (indexes.py) need from an archived year's orders:
+
+        {"days":   {"<day number>": [orders, cents, items]},
+         "months": {"MM": {"orders": .., "revenue": .., "items": ..,
+                           "item_qty": {item: n}, "item_revenue": {item: cents},
+                           "customer_revenue": {..}, "customer_orders": {..}}},
+         "items":  [[item, lines, price cents, day of its latest line], ...]}
+
+    As in the indexes, an order counts on the day, for the customer and with
+    the status of its first line, and cancelled orders are left out, except
+    from "items" (the autocomplete counts every line), which are listed in
+    the order they first appear.
+    """
+    lines = pd.DataFrame({
+        "order": ordertable.order_ids(table),
+        "day": table["Day"].values.astype("int64"),
+        "customer": table["Customer"].astype(str).values,
+        "status": table["Status"].astype(str).values,
+        "item": table["Item"].astype(str).str.strip().values,
+        "count": table["Count"].values.astype("int64"),
+        "cents": table["Line Total Cents"].values.astype("int64"),
+        "price": table["Price Cents"].values.astype("int64"),
+    })
+    named = lines[lines["item"] != ""].sort_values("day", kind="stable")
+    items = [
+        [item, int(len(rows)), int(rows["price"].iloc[-1]), int(rows["day"].iloc[-1])]
+        for item, rows in named.groupby("item", sort=False)
+    ]
+
+    first = lines.groupby("order", sort=False)[["day", "customer", "status"]].transform("first")
+    lines[["day", "customer", "status"]] = first
+    live = lines[(lines["status"].str.lower() != "cancelled") & (lines["day"] != ordertable.NO_DAY)]
+    days = live.groupby("day").agg(orders=("order", "nunique"), cents=("cents", "sum"), items=("count", "sum"))
+    months = {}
+    for month, rows in live.groupby(ordertable.month_keys(live["day"].values)):
+        months[month[5:]] = {
+            "orders": int(rows["order"].nunique()),
+            "revenue": int(rows["cents"].sum()),
+            "items": int(rows["count"].sum()),
+            "item_qty": _nonzero(rows.groupby("item")["count"].sum()),
+            "item_revenue": _nonzero(rows.groupby("item")["cents"].sum()),
+            "customer_revenue": _nonzero(rows.groupby("customer")["cents"].sum()),
+            "customer_orders": _nonzero(rows.groupby("customer")["order"].nunique()),
+        }
+    return {
+        "days": {str(day): [int(v) for v in row] for day, row in zip(days.index, days.values)},
+        "months": months,
+        "items": items,
+    }
+
+
+def _nonzero(series):
+    return {str(key): int(value) for key, value in series.items() if value}
+
+
+def year_months(dates):
+    """"YYYY-MM" per cell of an expense/remittance Date column (None if unparsable)."""
+    parsed = pd.to_datetime(dates, format=DATE_FMT, errors="coerce")
+    return parsed.dt.strftime("%Y-%m").where(parsed.notna(), None)
@@ -0,0 +1,94 @@
+"""
+Fewer bytes per page view.
+
+- Static URLs carry a fingerprint of the file contents
+  (/static/hk.css?v=3f9a1c2b7d), so browsers may cache them for a year:
+  an edited file gets a new URL (fingerprinted, cache_static).
+- HTML, JSON, CSS and JS responses are compressed with brotli when the
+  optional `brotli` package is installed and the browser accepts it,
+  otherwise with gzip. Streams (/orders/stream) and small bodies are left
+  alone.
+"""
+import gzip
+import hashlib
+import os
+import threading
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+STATIC_MAX_AGE = 365 * 24 * 3600
+MIN_COMPRESS_BYTES = 500
+COMPRESSIBLE = {"text/html", "application/json", "text/css", "text/javascript", "application/javascript", "text/csv"}
+
+_fingerprints = {}   # path -> (mtime_ns, digest)
+_lock = threading.Lock()
+
+
+def fingerprint(path):
+    """Short digest of a file's contents (cached until its mtime changes)."""
+    mtime = os.stat(path).st_mtime_ns
+    with _lock:
+        cached = _fingerprints.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    with open(path, "rb") as fh:
+        digest = hashlib.md5(fh.read()).hexdigest()[:10]
+    with _lock:
+        _fingerprints[path] = (mtime, digest)
+    return digest
+
+
+def fingerprinted(static_folder):
+    """url_defaults hook adding ?v=<fingerprint> to url_for('static', ...)."""
+    def add_fingerprint(endpoint, values):
+        if endpoint != "static" or "v" in values or "filename" not in values:
+            return
+        path = os.path.join(static_folder, values["filename"])
+        if os.path.isfile(path):
+            values["v"] = fingerprint(path)
+    return add_fingerprint
+
+
+def cache_static(request, response):
+    """Fingerprinted static files never change under their URL."""
+    if request.endpoint == "static" and request.args.get("v") and response.status_code == 200:
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = STATIC_MAX_AGE
+        response.cache_control.immutable = True
+    return response
+
+
+def compress(request, response):
+    """Compress the response body if the client accepts it and it is worth it."""
+    if (
+        response.status_code != 200
+        or response.is_streamed and not response.direct_passthrough
+        or response.mimetype not in COMPRESSIBLE
+        or "Content-Encoding" in response.headers
+    ):
+        return response
+    accepted = request.accept_encodings
+    coding = "br" if brotli is not None and accepted["br"] else "gzip" if accepted["gzip"] else None
+    response.vary.add("Accept-Encoding")
+    if coding is None:
+        return response
+
+    response.direct_passthrough = False   # static files: read the file body
+    body = response.get_data()
+    if len(body) < MIN_COMPRESS_BYTES:
+        return response
+    if coding == "br":
+        body = brotli.compress(body, quality=5)
+    else:
+        body = gzip.compress(body, compresslevel=6)
+    response.set_data(body)
+    response.headers["Content-Encoding"] = coding
+    if response.headers.get("ETag"):
+        # The compressed body is a different representation
+        etag, weak = response.get_etag()
+        response.set_etag(f"{etag}-{coding}", weak)
+    return response
@@ -0,0 +1,91 @@
+"""
+Crash-safe file writes.
+
+Data files are never rewritten in place. New contents go to a temporary
+file next to the target, which is flushed to disk and then renamed over it
+(os.replace is atomic), so after a crash or a killed worker the file holds
+either the old or the new version, never a truncated mix. At worst a stray
+temporary file is left behind; OrderStore.recover() removes those.
+
+HK_FSYNC=0 skips the fsync calls (faster on slow disks; a power cut can
+then lose the last writes, but a killed process still cannot).
+"""
+import logging
+import os
+from contextlib import contextmanager
+
+FSYNC = os.environ.get("HK_FSYNC", "1") == "1"
+
+log = logging.getLogger(__name__)
+
+
+def fsync_file(path):
+    if not FSYNC:
+        return
+    with open(path, "rb") as fh:
+        os.fsync(fh.fileno())
+
+
+def fsync_dir(path):
+    """Persist a rename in directory `path` (not possible on Windows)."""
+    if not FSYNC or os.name == "nt":
+        return
+    fd = os.open(path or ".", os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def replace(tmp, path):
+    """Put the finished file `tmp` in place of `path`, durably."""
+    fsync_file(tmp)
+    os.replace(tmp, path)
+    fsync_dir(os.path.dirname(os.path.abspath(path)))
+
+
+@contextmanager
+def atomic_path(path, suffix=".tmp"):
+    """
+    Yield a temporary path to write the new contents of `path` to; it
+    replaces `path` when the block succeeds and is removed if it fails.
+    Writers that pick a format by extension need a suffix like ".tmp.xlsx".
+    """
+    tmp = path + suffix
+    try:
+        yield tmp
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+    replace(tmp, path)
+
+
+def append_line(fh, line):
+    """
+    Append one journal record (bytes ending in a newline) to a file opened
+    in "a+b" mode. A torn record left by a writer that died mid-line is cut
+    off first, so the new record never gets glued onto it.
+    """
+    end = fh.seek(0, os.SEEK_END)
+    if end:
+        fh.seek(end - 1)
+        if fh.read(1) != b"\n":
+            drop_torn_record(fh)
+    fh.write(line)
+    fh.flush()
+    if FSYNC:
+        os.fsync(fh.fileno())
+
+
+def drop_torn_record(fh):
+    """Truncate a file opened in "r+b"/"a+b" mode after its last newline; returns the bytes dropped."""
+    end = fh.seek(0, os.SEEK_END)
+    fh.seek(0)
+    keep = fh.read().rfind(b"\n") + 1
+    if keep < end:
+        fh.truncate(keep)
+        log.warning("dropped an incomplete journal record (%d bytes) from %s", end - keep, fh.name)
+    return end - keep
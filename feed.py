@@ -0,0 +1,139 @@
+"""
+Live order feed for the kitchen screen (/orders/stream).
+
+OrderFeed keeps the most recent write events of a store (Storage.subscribe)
+and lets each Server-Sent Events connection wait for the ones after the
+last it sent:
+
+    id: 57
+    event: order
+    data: {"order_id": "HK1042", "customer": "Riya", "total_cents": 2400, ...}
+
+    id: 58
+    event: status
+    data: {"order_ids": ["HK1042"], "status": "Ready"}
+
+A stream ends after a bounded time (HK_STREAM_SECONDS in HKPortal.py) and
+EventSource reconnects with its Last-Event-ID, so a connection never holds
+a worker for good.
+
+Events written by other workers only reach this process when the store is
+read, so a waiting connection calls store.data_version() every `poll`
+seconds, which delivers them. If a client is further behind than the
+buffer, or a write was never published here (sqlite writes from other
+workers), it gets a "reload" event and should refresh its page.
+"""
+import json
+import threading
+import time
+from collections import deque
+
+from money import format_cents
+
+
+class OrderFeed:
+    def __init__(self, size=500, poll=1.0, keepalive=15.0):
+        self.store = None
+        self.poll = poll
+        self.keepalive = keepalive
+        self._events = deque(maxlen=size)   # consecutive events, oldest first
+        self._cond = threading.Condition()
+
+    def attach(self, store):
+        self.store = store
+        store.subscribe(self.on_event)
+        return self
+
+    def on_event(self, event):
+        with self._cond:
+            if self._events and event["seq"] != self._events[-1]["seq"] + 1:
+                self._events.clear()   # missed writes: the buffer restarts here
+            self._events.append(event)
+            self._cond.notify_all()
+
+    def since(self, after):
+        """Events newer than seq `after`, or None if some of them are gone."""
+        with self._cond:
+            if not self._events or after >= self._events[-1]["seq"]:
+                return []
+            if after < self._events[0]["seq"] - 1:
+                return None
+            return [ev for ev in self._events if ev["seq"] > after]
+
+    def wait(self, after, timeout):
+        """
+        Block up to `timeout` seconds for events newer than `after`.
+        Returns them ([] on timeout), or None if the client has to reload.
+        """
+        deadline = time.monotonic() + timeout
+        unpublished = False
+        while True:
+            version = self.store.data_version()   # picks up other workers' writes
+            with self._cond:
+                events = self.since(after)
+                if events is None or events:
+                    return events
+                newest = self._events[-1]["seq"] if self._events else after
+                if version > max(newest, after):
+                    # Written but not published here; allow one poll for an
+                    # in-process publish that is just behind the commit
+                    if unpublished:
+                        return None
+                    unpublished = True
+                else:
+                    unpublished = False
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return []
+                self._cond.wait(min(self.poll, remaining))
+
+    def stream(self, after, duration=None):
+        """
+        Server-Sent Events text for every order/status event after seq
+        `after`. With `duration` (seconds) the stream ends after that long;
+        the browser reconnects on its own and resumes from its last id.
+        """
+        yield "retry: 3000\n\n"
+        deadline = None if duration is None else time.monotonic() + duration
+        while True:
+            timeout = self.keepalive
+            if deadline is not None:
+                timeout = min(timeout, deadline - time.monotonic())
+                if timeout <= 0:
+                    return
+            events = self.wait(after, timeout)
+            if events is None:
+                after = self.store.data_version()
+                yield f"id: {after}\nevent: reload\ndata: {{}}\n\n"
+                continue
+            if not events:
+                yield ": keepalive\n\n"
+                continue
+            for ev in events:
+                after = ev["seq"]
+                message = sse_message(ev)
+                if message is not None:
+                    yield message
+
+
+def sse_message(event):
+    """One store event as an SSE message (None for expense/remittance entries)."""
+    if event["op"] == "add":
+        rows = event["rows"]
+        total = sum(int(r.get("Line Total Cents") or 0) for r in rows)
+        data = {
+            "order_id": rows[0]["Order ID"] if rows else "",
+            "date": rows[0].get("Date", "") if rows else "",
+            "customer": rows[0].get("Customer", "") if rows else "",
+            "status": rows[0].get("Status", "") if rows else "",
+            "total_cents": total,
+            "total": format_cents(total),
+            "lines": [{"item": r.get("Item", ""), "count": int(r.get("Count") or 0)} for r in rows],
+        }
+        name = "order"
+    elif event["op"] == "status":
+        data = {"order_ids": event["order_ids"], "status": event["status"]}
+        name = "status"
+    else:
+        return None
+    return f"id: {event['seq']}\nevent: {name}\ndata: {json.dumps(data)}\n\n"
@@ -0,0 +1,87 @@
+"""
+Import-time budget check for the web app.
+
+Imports a module (HKPortal by default) in a fresh interpreter with
+`python -X importtime`, then reports:
+- the total import time and the slowest modules it pulled in
+- any heavy module (pandas, numpy, openpyxl, ...) loaded at import time,
+  which should only happen on first use (see lazyimport.py)
+
+Exits with 1 when a heavy module is imported eagerly or the total is over
+the budget, so it can run in CI or before a deploy:
+
+    python importcheck.py                    # HKPortal, 150 ms budget
+    python importcheck.py --budget-ms 150 --module storage
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+HEAVY_MODULES = ["pandas", "numpy", "openpyxl", "dateutil", "xlsxwriter"]
+
+
+def measure(module, runs=3):
+    """
+    Best-of-`runs` cumulative import time of `module` (microseconds) and
+    the per-module timings of that run: [(self us, cumulative us, depth, name)].
+    """
+    env = dict(os.environ, SECRET_KEY=os.environ.get("SECRET_KEY", "importcheck"),
+               HK_COMPACT_INTERVAL="0")
+    best = None
+    for _ in range(runs):
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            capture_output=True, text=True, env=env,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        )
+        if proc.returncode != 0:
+            raise SystemExit(f"import {module} failed:\n{proc.stderr}")
+        rows = []
+        for line in proc.stderr.splitlines():
+            if not line.startswith("import time:") or "self [us]" in line:
+                continue
+            self_us, cumulative, name = line[len("import time:"):].split("|")
+            name = name[1:]  # nesting shows as two spaces per level
+            depth = (len(name) - len(name.lstrip())) // 2
+            rows.append((int(self_us), int(cumulative), depth, name.strip()))
+        total = next(c for _, c, _, name in reversed(rows) if name == module)
+        if best is None or total < best[0]:
+            best = (total, rows)
+    return best
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Check the import-time budget.")
+    p.add_argument("--module", default="HKPortal")
+    p.add_argument("--budget-ms", type=float, default=float(os.environ.get("HK_IMPORT_BUDGET_MS", 150)))
+    p.add_argument("--top", type=int, default=10, help="slowest modules to list")
+    args = p.parse_args(argv)
+
+    total, rows = measure(args.module)
+    print(f"import {args.module}: {total / 1000:.1f} ms (budget {args.budget_ms:.0f} ms)")
+    print("slowest imports (cumulative):")
+    # Direct imports of the checked module only, so nested imports are not
+    # counted twice (children are printed just before their parent)
+    end = max(i for i, r in enumerate(rows) if r[3] == args.module)
+    depth = rows[end][2]
+    start = end
+    while start > 0 and rows[start - 1][2] > depth:
+        start -= 1
+    direct = [r for r in rows[start:end] if r[2] == depth + 1]
+    for _, cumulative, _, name in sorted(direct, key=lambda r: -r[1])[:args.top]:
+        print(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+    problems = []
+    eager = sorted({r[3] for r in rows if r[3] in HEAVY_MODULES})
+    if eager:
+        problems.append(f"heavy modules imported at load time: {', '.join(eager)}")
+    if total / 1000 > args.budget_ms:
+        problems.append(f"over budget by {total / 1000 - args.budget_ms:.1f} ms")
+    for problem in problems:
+        print("FAIL", problem)
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,905 @@
+"""
+In-memory indexes derived from the order history.
+
+Each index is built once from the store's compact order table and then kept
+current from the store's write events (Storage.subscribe), so serving it
+never re-reads the workbook. If an event is missed (another worker wrote,
+or the store was reloaded) the index notices the version gap and rebuilds
+on the next read.
+"""
+import bisect
+import heapq
+import json
+import os
+import threading
+from collections import Counter
+from datetime import date, timedelta
+from itertools import islice
+from operator import itemgetter
+
+import ordertable
+from archive import TOTAL_COLUMNS
+from lazyimport import lazy_import
+from money import parse_cents
+from ordertable import day_number
+
+np = lazy_import("numpy")
+
+
+def row_cents(row, name):
+    """Money from a tail/event row: "<name> Cents", or dollars in "<name>"."""
+    if row.get(name + " Cents") is not None:
+        return int(row[name + " Cents"])
+    return parse_cents(row.get(name) or 0)
+
+
+class LiveIndex:
+    """
+    Base class: subclasses implement rebuild(data) and apply(event), where
+    data is whatever load() returns (by default the compact order table of
+    the hot years and {year: archive.order_rollup} for the archived ones).
+    Call fresh() before reading.
+    """
+
+    def __init__(self):
+        self.store = None
+        self.version = None
+        self._lock = threading.RLock()
+
+    def attach(self, store):
+        self.store = store
+        store.subscribe(self.on_event)
+        return self
+
+    def on_event(self, event):
+        with self._lock:
+            if self.version is None:
+                return  # not built yet; the first read builds it
+            if event["seq"] != self.version + 1:
+                self.version = None  # missed a write: rebuild on next read
+                return
+            self.apply(event)
+            self.version = event["seq"]
+
+    def fresh(self):
+        """Bring the index up to date with the store and return it."""
+        # Read the store before taking our lock: it may publish events to us
+        version = self.store.data_version()
+        with self._lock:
+            if self.version is not None and self.version >= version:
+                return self
+        data, version = self.load()
+        with self._lock:
+            if self.version is None or self.version < version:
+                self.rebuild(data)
+                self.version = version
+        return self
+
+    def load(self):
+        """(data for rebuild, store version it was read at)."""
+        table, rollups, version = self.store.hot_snapshot()
+        return (table, rollups), version
+
+    def release(self):
+        """Drop the index contents; the next fresh() rebuilds them."""
+        with self._lock:
+            self.version = None
+            self.clear()
+
+    def cache_bytes(self):
+        """Rough size of the index in memory."""
+        return 0
+
+    def rebuild(self, table):
+        raise NotImplementedError
+
+    def apply(self, event):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+
+class ItemIndex(LiveIndex):
+    """
+    Item-name autocomplete.
+
+    Every word-suffix of every item name ("chicken biriyani combo",
+    "biriyani combo", "combo") is kept in one sorted list, so a prefix
+    lookup is a bisect plus a short scan, and typing "biri" finds
+    "Chicken Biriyani". Matches are ranked by how many order lines used the
+    item. The price returned is the menu price if there is one, otherwise
+    the price on the most recent order line.
+    """
+
+    TERM_BYTES = 200  # one (term, name) tuple plus its share of the entry
+
+    def __init__(self, menu=None):
+        super().__init__()
+        self.menu = menu or {}     # lower name -> (display name, price cents)
+        self.clear()
+
+    def clear(self):
+        self._entries = {}         # lower name -> [display, lines, price cents, last day]
+        self._terms = []           # sorted (term, lower name)
+
+    def cache_bytes(self):
+        return len(self._terms) * self.TERM_BYTES
+
+    def rebuild(self, data):
+        table, rollups = data
+        entries = {}
+        # Archived years first: they are older than any hot line
+        for year in sorted(rollups):
+            for name, lines, price, day in rollups[year]["items"]:
+                self._count(entries, name, price, day, lines)
+        rows = table[table["Item"].astype(str).str.strip() != ""]
+        if len(rows):
+            # Last line per item (by day, then by position) carries the current price
+            order = np.lexsort((np.arange(len(rows)), rows["Day"].values))
+            rows = rows.iloc[order]
+            names = rows["Item"].astype(str).str.strip().values
+            prices = rows["Price Cents"].values
+            days = rows["Day"].values
+            for name, price, day in zip(names, prices, days):
+                self._count(entries, name, int(price), int(day))
+        for key, (display, price) in self.menu.items():
+            entries.setdefault(key, [display, 0, price, None])
+
+        terms = sorted({(term, key) for key in entries for term in _terms(key)})
+        self._entries, self._terms = entries, terms
+
+    @staticmethod
+    def _count(entries, name, price, day, lines=1):
+        key = _key(name)
+        entry = entries.get(key)
+        if entry is None:
+            entries[key] = [name, lines, price, day]
+            return True
+        entry[1] += lines
+        if entry[3] is None or day >= entry[3]:
+            entry[2], entry[3] = price, day
+        return False
+
+    def apply(self, event):
+        if event["op"] != "add":
+            return
+        for row in event["rows"]:
+            name = str(row.get("Item") or "").strip()
+            if not name:
+                continue
+            day = _event_day(row)
+            if self._count(self._entries, name, row_cents(row, "Price"), day):
+                for term in _terms(_key(name)):
+                    bisect.insort(self._terms, (term, _key(name)))
+
+    def suggest(self, prefix, limit=8):
+        """Up to `limit` items whose name (or a word in it) starts with prefix."""
+        with self._lock:
+            prefix = _key(prefix)
+            if not prefix:
+                return []
+            terms = self._terms
+            i = bisect.bisect_left(terms, (prefix,))
+            keys = set()
+            while i < len(terms) and terms[i][0].startswith(prefix):
+                keys.add(terms[i][1])
+                i += 1
+            entries = self._entries
+            ranked = sorted(keys, key=lambda k: (-entries[k][1], entries[k][0]))[:limit]
+            out = []
+            for key in ranked:
+                display, lines, price, _ = entries[key]
+                if key in self.menu:
+                    display, price = self.menu[key]
+                out.append({"item": display, "price_cents": price, "orders": lines})
+            return out
+
+    def price_of(self, name):
+        """Current price (cents) for an exact item name, or None."""
+        with self._lock:
+            key = _key(name)
+            if key in self.menu:
+                return self.menu[key][1]
+            entry = self._entries.get(key)
+            return entry[2] if entry else None
+
+
+class OrderRollup(LiveIndex):
+    """
+    Base class for running totals over non-cancelled orders.
+
+    Keeps one small record per order (day, customer, status, lines) so a
+    status change can take an order out of the totals, or put it back,
+    without looking at the rest of the history. Subclasses implement
+    reset() and count(order, sign), where sign is +1 or -1, and seed(year,
+    rollup) to add an archived year from its summary: archived orders
+    cannot change status, so they need no records.
+    """
+
+    ORDER_BYTES = 600  # one order record with a couple of lines, plus counters
+
+    def __init__(self):
+        super().__init__()
+        self._orders = {}   # Order ID -> record
+
+    def clear(self):
+        self._orders = {}
+        self.reset()
+
+    def cache_bytes(self):
+        return len(self._orders) * self.ORDER_BYTES
+
+    def rebuild(self, data):
+        table, rollups = data
+        self.reset()
+        self._orders = _records(table)
+        for rec in self._orders.values():
+            if _counted(rec):
+                self.count(rec, 1)
+        for year in sorted(rollups):
+            self.seed(year, rollups[year])
+
+    def apply(self, event):
+        if event["op"] == "add":
+            for row in event["rows"]:
+                oid = str(row["Order ID"])
+                rec = self._orders.get(oid)
+                if rec is None:
+                    day = day_number(row.get("Date"))
+                    rec = self._orders[oid] = {
+                        "day": ordertable.NO_DAY if day is None else day,
+                        "customer": str(row.get("Customer") or ""),
+                        "status": str(row.get("Status") or ""),
+                        "lines": [],
+                    }
+                elif _counted(rec):
+                    self.count(rec, -1)
+                rec["lines"].append((
+                    str(row.get("Item") or "").strip(),
+                    int(row.get("Count") or 0),
+                    row_cents(row, "Line Total"),
+                ))
+                if _counted(rec):
+                    self.count(rec, 1)
+        elif event["op"] == "status":
+            for oid in event["order_ids"]:
+                rec = self._orders.get(oid)
+                if rec is None:
+                    continue
+                was = _counted(rec)
+                rec["status"] = event["status"]
+                if was != _counted(rec):
+                    self.count(rec, -1 if was else 1)
+
+    def reset(self):
+        raise NotImplementedError
+
+    def count(self, rec, sign):
+        raise NotImplementedError
+
+    def seed(self, year, rollup):
+        raise NotImplementedError
+
+
+def _records(table):
+    """Order ID -> record (day, customer, status, lines) for every order of the table."""
+    records = {}
+    columns = zip(
+        ordertable.order_ids(table), table["Day"].values, table["Customer"].astype(str).values,
+        table["Item"].astype(str).values, table["Count"].values,
+        table["Line Total Cents"].values, table["Status"].astype(str).values,
+    )
+    for oid, day, customer, item, count, cents, status in columns:
+        rec = records.get(oid)
+        if rec is None:
+            rec = records[oid] = {
+                "day": int(day), "customer": customer, "status": status, "lines": [],
+            }
+        rec["lines"].append((item.strip(), int(count), int(cents)))
+    return records
+
+
+def _counted(rec):
+    return rec["status"].lower() != "cancelled"
+
+
+class InsightsIndex(OrderRollup):
+    """
+    Top items and customers, overall and per year / month.
+
+    Each period keeps counters (orders, revenue, items, per-item quantity
+    and revenue, per-customer revenue and orders) that move with every new
+    order and every cancellation, so the insights page only reads them.
+    The per-key counters are TopCounters, so a top-n list costs O(n), not
+    a pass over every item or customer. Period keys: "all", "2025", "2025-12".
+    """
+
+    TOP_SIZE = 100  # most rows the insights page lists
+
+    def reset(self):
+        self._periods = {}
+
+    def _bucket(self, period):
+        bucket = self._periods.get(period)
+        if bucket is None:
+            bucket = self._periods[period] = _empty_bucket(self.TOP_SIZE)
+        return bucket
+
+    def count(self, rec, sign):
+        total = sum(cents for _, _, cents in rec["lines"])
+        for period in _periods_of(rec["day"]):
+            b = self._bucket(period)
+            b["orders"] += sign
+            b["revenue"] += sign * total
+            b["customer_revenue"].add(rec["customer"], sign * total)
+            b["customer_orders"].add(rec["customer"], sign)
+            for item, qty, cents in rec["lines"]:
+                b["items"] += sign * qty
+                b["item_qty"].add(item, sign * qty)
+                b["item_revenue"].add(item, sign * cents)
+
+    def seed(self, year, rollup):
+        for month, totals in rollup["months"].items():
+            for period in ("all", str(year), f"{year}-{month}"):
+                b = self._bucket(period)
+                b["orders"] += totals["orders"]
+                b["revenue"] += totals["revenue"]
+                b["items"] += totals["items"]
+                for name in ("item_qty", "item_revenue", "customer_revenue", "customer_orders"):
+                    for key, value in totals[name].items():
+                        b[name].add(key, value)
+
+    def periods(self):
+        """Period keys with data, newest first ("all" first)."""
+        with self._lock:
+            keys = sorted(
+                (k for k in self._periods if k != "all"),
+                key=lambda k: (k[:4], len(k) == 4, k), reverse=True,
+            )  # 2025, 2025-12, 2025-11, ..., 2024, ...
+            return ["all"] + keys
+
+    def top(self, period="all", n=10):
+        """Totals plus the top-n items and customers for one period."""
+        with self._lock:
+            b = self._periods.get(period) or _empty_bucket(self.TOP_SIZE)
+            return {
+                "orders": b["orders"],
+                "revenue": b["revenue"],
+                "items": b["items"],
+                "items_by_count": b["item_qty"].top(n),
+                "items_by_revenue": b["item_revenue"].top(n),
+                "customers_by_revenue": b["customer_revenue"].top(n),
+                "customers_by_orders": b["customer_orders"].top(n),
+            }
+
+
+class TopCounter:
+    """
+    Counts per key that also keep the `size` largest in order, so top(n)
+    for n <= size reads only those. Once read, each add() moves one key
+    within the kept list (a bisect). All keys are scanned again only when
+    cancellations push a kept key below what a key left out may have
+    (_floor). Keys whose count goes back to exactly zero are removed.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.counts = {}
+        self._kept = None   # sorted [(-count, key)], at most size; None until first read
+        self._floor = 0     # no key outside _kept has a higher count
+
+    def add(self, key, delta):
+        old = self.counts.get(key, 0)
+        new = old + delta
+        if new:
+            self.counts[key] = new
+        else:
+            self.counts.pop(key, None)
+        kept = self._kept
+        if kept is None or not delta:
+            return  # the first read sorts everything out
+        i = bisect.bisect_left(kept, (-old, key))
+        if i < len(kept) and kept[i] == (-old, key):
+            del kept[i]
+        if new:
+            bisect.insort(kept, (-new, key))
+            if len(kept) > self.size:
+                self._floor = max(self._floor, -kept.pop()[0])
+
+    def top(self, n):
+        """The n largest (key, count) pairs, largest first."""
+        if n > self.size:
+            return heapq.nlargest(n, self.counts.items(), key=itemgetter(1))
+        kept = self._kept
+        if kept is None or (len(kept) < len(self.counts)
+                            and (len(kept) < n or -kept[n - 1][0] < self._floor)):
+            best = heapq.nlargest(self.size + 1, self.counts.items(), key=itemgetter(1))
+            kept = self._kept = sorted((-count, key) for key, count in best[:self.size])
+            self._floor = best[self.size][1] if len(best) > self.size else 0
+        return [(key, -count) for count, key in kept[:n]]
+
+
+class Fenwick:
+    """
+    Binary indexed tree over a list of numbers: point add and prefix sum,
+    both O(log n). The plain values are kept too, so the tree can be
+    rebuilt at a new size.
+    """
+
+    def __init__(self, values):
+        self.values = list(values)
+        tree = [0] + self.values
+        for i in range(1, len(tree)):
+            j = i + (i & -i)
+            if j < len(tree):
+                tree[j] += tree[i]
+        self.tree = tree
+
+    def add(self, i, delta):
+        self.values[i] += delta
+        i += 1
+        while i < len(self.tree):
+            self.tree[i] += delta
+            i += i & -i
+
+    def prefix(self, i):
+        """Sum of values[0:i]."""
+        total = 0
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+
+class DayTotals(OrderRollup):
+    """
+    Dashboard summary (orders, revenue, items; cancelled excluded) for any
+    date range, from per-day prefix sums.
+
+    Each order is counted on its date, in one Fenwick tree per quantity,
+    so a from/to summary is two prefix lookups and a subtraction. New
+    orders and status changes update one day in O(log n). Orders without
+    a usable date only show up in the unfiltered summary, as they do in
+    Storage.order_summary.
+    """
+
+    HEADROOM = 366  # spare days allocated past the newest order
+
+    def reset(self):
+        self._base = None       # day number of slot 0
+        self._trees = None      # [orders, revenue, items] Fenwicks
+        self._daily = {}        # day -> [orders, revenue, items], while rebuilding
+        self._undated = [0, 0, 0]
+
+    def rebuild(self, data):
+        super().rebuild(data)
+        if self._daily:
+            self._base = min(self._daily)
+            self._resize(max(self._daily) - self._base + 1 + self.HEADROOM, self._daily)
+        self._daily = None
+
+    def cache_bytes(self):
+        # 3 trees, each a values list and a tree list of ints (~36 bytes a slot)
+        trees = getattr(self, "_trees", None)   # not built yet
+        slots = 0 if trees is None else len(trees[0].values)
+        return super().cache_bytes() + 6 * 36 * slots
+
+    def _resize(self, size, daily):
+        columns = [[0] * size for _ in range(3)]
+        for day, amounts in daily.items():
+            for col, amount in zip(columns, amounts):
+                col[day - self._base] += amount
+        self._trees = [Fenwick(col) for col in columns]
+
+    def _slot(self, day):
+        """Index of day in the trees, growing them if the day is out of range."""
+        if self._trees is None:
+            self._base = day
+            self._resize(1 + self.HEADROOM, {})
+        size = len(self._trees[0].values)
+        if day < self._base or day >= self._base + size:
+            daily = {
+                self._base + i: [t.values[i] for t in self._trees]
+                for i in range(size) if any(t.values[i] for t in self._trees)
+            }
+            low = min(day, self._base)
+            high = max(day, self._base + size - 1)
+            self._base = low
+            self._resize(high - low + 1 + self.HEADROOM, daily)
+        return day - self._base
+
+    def count(self, rec, sign):
+        amounts = [
+            sign,
+            sign * sum(cents for _, _, cents in rec["lines"]),
+            sign * sum(qty for _, qty, _ in rec["lines"]),
+        ]
+        day = rec["day"]
+        if day == ordertable.NO_DAY:
+            self._undated = [a + b for a, b in zip(self._undated, amounts)]
+        elif self._daily is not None:
+            totals = self._daily.setdefault(day, [0, 0, 0])
+            for i, amount in enumerate(amounts):
+                totals[i] += amount
+        else:
+            slot = self._slot(day)
+            for tree, amount in zip(self._trees, amounts):
+                tree.add(slot, amount)
+
+    def seed(self, year, rollup):
+        for day, amounts in rollup["days"].items():
+            totals = self._daily.setdefault(int(day), [0, 0, 0])
+            for i, amount in enumerate(amounts):
+                totals[i] += amount
+
+    def summary(self, from_date="", to_date=""):
+        """Same result as Storage.order_summary(from_date, to_date)."""
+        with self._lock:
+            lo = day_number(from_date) if from_date else None
+            hi = day_number(to_date) if to_date else None
+            totals = [0, 0, 0]
+            if self._trees is not None:
+                size = len(self._trees[0].values)
+                start = 0 if lo is None else min(max(lo - self._base, 0), size)
+                stop = size if hi is None else min(max(hi - self._base + 1, 0), size)
+                if start < stop:
+                    totals = [t.prefix(stop) - t.prefix(start) for t in self._trees]
+            if lo is None and hi is None:
+                totals = [a + b for a, b in zip(totals, self._undated)]
+            return {"total_orders": totals[0], "total_revenue": totals[1], "total_items": totals[2]}
+
+
+class MonthlyTotals(OrderRollup):
+    """
+    Revenue (cancelled excluded), expenses and cash received per month,
+    for /stats.
+
+    Built once from the order history and the expense and remittance
+    monthly sums, then moved by every new order, status change, expense
+    and remittance, so /stats never re-reads the workbooks.
+    """
+
+    ENTRY_AMOUNTS = {"expenses": "Amount", "remits": "Cash Amount"}
+
+    def load(self):
+        # The sheet totals must be read at the same version as the orders
+        while True:
+            (table, rollups), version = super().load()
+            sheets = self.store.monthly_sums(list(self.ENTRY_AMOUNTS))
+            if self.store.data_version() == version:
+                return (table, rollups, sheets), version
+
+    def reset(self):
+        self._months = {}   # "YYYY-MM" -> Counter of total_revenue / total_expense / total_cash
+
+    def _month(self, key):
+        totals = self._months.get(key)
+        if totals is None:
+            totals = self._months[key] = Counter()
+        return totals
+
+    def rebuild(self, data):
+        table, rollups, sheets = data
+        super().rebuild((table, rollups))
+        for kind, df in sheets.items():
+            column = TOTAL_COLUMNS[kind]
+            for year, month, cents in zip(df["Year"], df["MonthNum"], df[column]):
+                self._month(f"{int(year):04d}-{int(month):02d}")[column] += int(cents)
+
+    def count(self, rec, sign):
+        if rec["day"] == ordertable.NO_DAY:
+            return
+        total = sum(cents for _, _, cents in rec["lines"])
+        self._month(_periods_of(rec["day"])[-1])["total_revenue"] += sign * total
+
+    def seed(self, year, rollup):
+        for month, totals in rollup["months"].items():
+            self._month(f"{year}-{month}")["total_revenue"] += totals["revenue"]
+
+    def apply(self, event):
+        amount = self.ENTRY_AMOUNTS.get(event["op"])
+        if amount is None:
+            super().apply(event)
+            return
+        column = TOTAL_COLUMNS[event["op"]]
+        for row in event["rows"]:
+            day = day_number(row.get("Date"))
+            if day is not None:
+                self._month(_periods_of(day)[-1])[column] += row_cents(row, amount)
+
+    def stats_by_year(self):
+        """{year: [{"month": "Dec", "total_revenue": .., "total_expense": .., "total_cash": ..}]}"""
+        with self._lock:
+            out = {}
+            for key in sorted(self._months):
+                totals = self._months[key]
+                if not any(totals.values()):
+                    continue
+                year, month = int(key[:4]), int(key[5:])
+                out.setdefault(year, []).append({
+                    "month": MONTH_LABELS[month - 1],
+                    "total_revenue": totals["total_revenue"],
+                    "total_expense": totals["total_expense"],
+                    "total_cash": totals["total_cash"],
+                })
+            return out
+
+
+class OrderSearch(OrderRollup):
+    """
+    Order search by customer, item, status and date range, newest first.
+
+    An inverted index over the order records: every word of a customer or
+    item name maps to the set of orders using it, and the words of each
+    field are kept sorted, so "chick" is a bisect plus a scan over the
+    words starting with it. Each status maps to its set of orders, and
+    (day, order) keys are kept sorted for date ranges and paging. A query
+    intersects the smallest sets first, so it costs in proportion to the
+    matches, not to the history. Cancelled orders are searchable too.
+    Archived years are left out of a rebuild; each is indexed the first
+    time a query's date range reaches into it (any query without one).
+    """
+
+    ORDER_BYTES = 900  # record + sort key + its share of the postings
+    WALK_RATIO = 32    # testing an order of the range costs far less than fetching a key
+
+    def reset(self):
+        self._words = {"customer": {}, "item": {}}   # field -> word -> {Order ID}
+        self._terms = {"customer": [], "item": []}   # field -> sorted words
+        self._status = {}    # lower status -> {Order ID}
+        self._recent = []    # sorted (day, prefix, num, Order ID)
+        self._bulk = False
+        self._cold = set()   # archived years not indexed yet
+
+    def count(self, rec, sign):
+        pass   # records are indexed in _index, cancelled or not
+
+    def seed(self, year, rollup):
+        self._cold.add(year)
+
+    def rebuild(self, data):
+        super().rebuild(data)
+        self._index_all(self._orders)
+
+    def _index_all(self, records):
+        self._bulk = True
+        for oid, rec in records.items():
+            self._index(oid, rec, rec["lines"])
+        self._bulk = False
+        self._recent.sort()
+        self._terms = {field: sorted(words) for field, words in self._words.items()}
+
+    def _open_years(self, from_day, to_day):
+        """Index the archived years that [from_day, to_day] reaches into."""
+        with self._lock:
+            years = sorted(
+                y for y in self._cold
+                if (from_day is None or from_day <= day_number(f"{y}-12-31"))
+                and (to_day is None or to_day >= day_number(f"{y}-01-01"))
+            )
+        if not years:
+            return
+        tables = {year: self.store.archived_order_table(year) for year in years}
+        with self._lock:
+            for year, table in tables.items():
+                if year in self._cold:   # not indexed meanwhile, nor rebuilt without it
+                    self._cold.discard(year)
+                    records = _records(table)
+                    self._orders.update(records)
+                    self._index_all(records)
+
+    def apply(self, event):
+        if event["op"] == "add":
+            new = {str(row["Order ID"]) for row in event["rows"]} - self._orders.keys()
+            super().apply(event)
+            lines = {}
+            for row in event["rows"]:
+                lines.setdefault(str(row["Order ID"]), []).append((str(row.get("Item") or "").strip(),))
+            for oid, order_lines in lines.items():
+                self._index(oid, self._orders[oid], order_lines, new=oid in new)
+        elif event["op"] == "status":
+            before = {oid: self._orders[oid]["status"] for oid in event["order_ids"] if oid in self._orders}
+            super().apply(event)
+            for oid, status in before.items():
+                self._status.get(status.lower(), set()).discard(oid)
+                self._status.setdefault(self._orders[oid]["status"].lower(), set()).add(oid)
+
+    def _index(self, oid, rec, lines, new=True):
+        if new:
+            prefix, num = _order_key(oid)
+            rec["key"] = (rec["day"], prefix, num, oid)
+            if self._bulk:
+                self._recent.append(rec["key"])
+            else:
+                bisect.insort(self._recent, rec["key"])
+            self._status.setdefault(rec["status"].lower(), set()).add(oid)
+            for word in _key(rec["customer"]).split():
+                self._add_word("customer", word, oid)
+        for line in lines:
+            for word in _key(line[0]).split():
+                self._add_word("item", word, oid)
+
+    def _add_word(self, field, word, oid):
+        postings = self._words[field].get(word)
+        if postings is None:
+            postings = self._words[field][word] = set()
+            if not self._bulk:
+                bisect.insort(self._terms[field], word)
+        postings.add(oid)
+
+    def _prefix_ids(self, field, prefix):
+        """Orders with a word in `field` starting with prefix (read-only set)."""
+        terms, words = self._terms[field], self._words[field]
+        i = bisect.bisect_left(terms, prefix)
+        found = []
+        while i < len(terms) and terms[i].startswith(prefix):
+            found.append(words[terms[i]])
+            i += 1
+        return found[0] if len(found) == 1 else set().union(*found)
+
+    def search(self, customer="", item="", status="", from_day=None, to_day=None, page=1, per_page=25):
+        """
+        One page of matching orders, newest first:
+        - customer / item: every word must start a word of the name
+        - status: "not_cancelled", a specific status, or "" for all
+        - from_day / to_day: inclusive day numbers (None = open)
+        Returns {"orders", "total", "page", "per_page", "pages"}.
+        """
+        self._open_years(from_day, to_day)
+        with self._lock:
+            sets = [
+                self._prefix_ids(field, word)
+                for field, text in (("customer", customer), ("item", item))
+                for word in _key(text).split()
+            ]
+            status = status.lower()
+            if status and status != "not_cancelled":
+                sets.append(self._status.get(status, set()))
+            skip = self._status.get("cancelled", set()) if status == "not_cancelled" else set()
+
+            # Orders without a date only match when no range is given
+            recent = self._recent
+            lo, hi = 0, len(recent)
+            if from_day is not None or to_day is not None:
+                first = ordertable.NO_DAY + 1 if from_day is None else max(from_day, ordertable.NO_DAY + 1)
+                lo = bisect.bisect_left(recent, (first,))
+            if to_day is not None:
+                hi = max(lo, bisect.bisect_left(recent, (to_day + 1,)))
+            start = (page - 1) * per_page
+            whole = lo == 0 and hi == len(recent)
+
+            if sets:
+                sets.sort(key=len)
+                ids = sets[0].intersection(*sets[1:]) if len(sets) > 1 else sets[0]
+                if skip:
+                    ids = ids - skip
+                keys = None
+                if whole:
+                    total = len(ids)
+                elif hi - lo <= self.WALK_RATIO * len(ids):
+                    total = self._count(lo, hi, ids)
+                else:
+                    keys = self._keys_in(ids, lo, hi)
+                    total = len(keys)
+                if (start + per_page) * (hi - lo) < total ** 2:
+                    # Dense matches: the page is a short walk back from the end of the range
+                    found = self._walk(lo, hi, ids.__contains__, start, per_page)
+                else:
+                    # Sparse matches: sort just those
+                    keys = self._keys_in(ids, lo, hi) if keys is None else keys
+                    found = heapq.nlargest(start + per_page, keys)[start:]
+            elif not skip:
+                # Date range only: slice the page off the end of the sorted range
+                total = hi - lo
+                found = recent[max(lo, hi - start - per_page):max(lo, hi - start)][::-1]
+            else:
+                # Same, leaving out the cancelled orders
+                total = hi - lo - (len(skip) if whole else self._count(lo, hi, skip))
+                found = self._walk(lo, hi, lambda oid: oid not in skip, start, per_page)
+
+            orders = [self._row(self._orders[key[3]], key[3]) for key in found]
+        return {
+            "orders": orders,
+            "total": total,
+            "page": page,
+            "per_page": per_page,
+            "pages": max(1, -(-total // per_page)),
+        }
+
+    def _walk(self, lo, hi, match, start, per_page):
+        """One page of the keys in self._recent[lo:hi] whose order matches, newest first."""
+        found, seen, i = [], 0, hi - 1
+        while i >= lo and len(found) < per_page:
+            key = self._recent[i]
+            i -= 1
+            if match(key[3]):
+                if seen >= start:
+                    found.append(key)
+                seen += 1
+        return found
+
+    def _count(self, lo, hi, ids):
+        """How many orders in self._recent[lo:hi] are in ids."""
+        return sum(map(ids.__contains__, map(_ORDER_ID, islice(self._recent, lo, hi))))
+
+    def _keys_in(self, ids, lo, hi):
+        """Sort keys of the orders in ids that fall in self._recent[lo:hi]."""
+        if lo >= hi:
+            return []
+        low_key, high_key = self._recent[lo], self._recent[hi - 1]
+        return [key for key in (self._orders[oid]["key"] for oid in ids) if low_key <= key <= high_key]
+
+    @staticmethod
+    def _row(rec, oid):
+        day = rec["day"]
+        return {
+            "order_id": oid,
+            "date": "" if day == ordertable.NO_DAY else str(_EPOCH_DATE + timedelta(days=day)),
+            "customer": rec["customer"],
+            "status": rec["status"],
+            "items": [item for item, _, _ in rec["lines"] if item],
+            "total_cents": sum(cents for _, _, cents in rec["lines"]),
+            "line_count": len(rec["lines"]),
+        }
+
+
+_EPOCH_DATE = date(1970, 1, 1)   # day 0 of ordertable
+_ORDER_ID = itemgetter(3)        # Order ID of an OrderSearch key
+
+
+def _order_key(oid):
+    """"HK1042" -> ("HK", 1042), so HK999 sorts before HK1000."""
+    digits = len(oid) - len(oid.rstrip("0123456789"))
+    if not digits:
+        return oid, -1
+    return oid[:-digits], int(oid[-digits:])
+
+
+MONTH_LABELS = ["Jan","Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+
+
+def _empty_bucket(top_size):
+    return {
+        "orders": 0, "revenue": 0, "items": 0,
+        "item_qty": TopCounter(top_size), "item_revenue": TopCounter(top_size),
+        "customer_revenue": TopCounter(top_size), "customer_orders": TopCounter(top_size),
+    }
+
+
+def _periods_of(day):
+    if day == ordertable.NO_DAY:
+        return ("all",)
+    date = np.datetime64(ordertable.EPOCH, "D") + np.timedelta64(day, "D")
+    month = str(date.astype("datetime64[M]"))
+    return ("all", month[:4], month)
+
+
+def _terms(key):
+    words = key.split()
+    return [" ".join(words[i:]) for i in range(len(words))]
+
+
+def _key(name):
+    return " ".join(str(name).lower().split())
+
+
+def _event_day(row):
+    """Day number of an event row; NO_DAY if undated, as in a rebuild."""
+    day = day_number(row.get("Date"))
+    return day if day is not None else ordertable.NO_DAY
+
+
+def load_menu(path):
+    """
+    Optional menu file: a JSON list of {"item": "Chicken 65", "price": 10}.
+    Returns {lower name: (display name, price cents)}.
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as fh:
+        items = json.load(fh)
+    return {
+        _key(it["item"]): (it["item"], parse_cents(it["price"]))
+        for it in items
+    }
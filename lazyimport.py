@@ -0,0 +1,44 @@
+"""
+Deferred imports for the analytics stack.
+
+pandas (with numpy and dateutil) takes a few hundred milliseconds to
+import, and most requests (login, home, menu, the order form) never touch
+it. Modules bind it with
+
+    pd = lazy_import("pandas")
+
+and the real import happens on the first attribute access (pd.DataFrame,
+np.int64, ...), i.e. when a data route first needs it. The proxy is safe
+to use from several threads: importlib serialises the import itself.
+"""
+import importlib
+import sys
+
+
+class LazyModule:
+    def __init__(self, name):
+        self.__dict__["_name"] = name
+        self.__dict__["_module"] = None
+
+    def _load(self):
+        module = self.__dict__["_module"]
+        if module is None:
+            module = importlib.import_module(self.__dict__["_name"])
+            self.__dict__["_module"] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = "loaded" if self.__dict__["_module"] is not None else "not loaded"
+        return f"<lazy module {self.__dict__['_name']!r} ({state})>"
+
+
+def lazy_import(name):
+    """A stand-in for `import name` that imports on first use."""
+    return LazyModule(name)
+
+
+def is_loaded(name):
+    return name in sys.modules
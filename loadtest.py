@@ -0,0 +1,192 @@
+"""
+Load test for a running portal (e.g. `gunicorn -w 4 HKPortal:app`).
+
+Every simulated staff member logs in once and then loops until the time is
+up, picking one of:
+- an order: `/add` a few items, then `/submit-order`
+- a dashboard refresh
+- a status update on one of the orders it submitted
+
+At the end it prints requests/s and p50/p95/p99 latency per route, then
+checks every submitted order: the Order IDs must be unique and each order
+must be readable at /order/<id> with all of its lines.
+
+Only the standard library is used, so it runs from any machine:
+
+    python loadtest.py --url http://127.0.0.1:8000 --users 16 --duration 60
+
+Orders are created for customers named "LT-<run id>-<user>"; run it
+against a copy of the data, not the live workbooks.
+"""
+import argparse
+import http.cookiejar
+import random
+import re
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import Counter, defaultdict
+
+STATUSES = ["Accepted", "Ready", "Delivered"]
+TITLE_RE = re.compile(r"<title>[^<]*\bOrder ([^\s<]+)")   # confirmation page title
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    # Time each request on its own; a 302 is a normal answer here
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class Session:
+    """One logged-in staff member (own cookie jar) recording latencies."""
+
+    def __init__(self, base_url, results, timeout):
+        self.base_url = base_url.rstrip("/")
+        self.results = results
+        self.timeout = timeout
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _NoRedirect()
+        )
+
+    def request(self, route, path, form=None):
+        """GET (or POST when form is given); returns (status, body text)."""
+        data = urllib.parse.urlencode(form, doseq=True).encode() if form is not None else None
+        start = time.perf_counter()
+        try:
+            with self.opener.open(self.base_url + path, data=data, timeout=self.timeout) as resp:
+                status, body = resp.status, resp.read()
+        except urllib.error.HTTPError as e:
+            status, body = e.code, e.read()
+        except OSError:
+            status, body = 0, b""
+        self.results.record(route, time.perf_counter() - start, status)
+        return status, body.decode("utf-8", "replace")
+
+
+class Results:
+    def __init__(self):
+        self.latencies = defaultdict(list)   # route -> seconds
+        self.errors = defaultdict(int)       # route -> non 2xx/3xx answers
+        self.orders = []                     # (order id, customer, item count)
+        self._lock = threading.Lock()
+
+    def record(self, route, seconds, status):
+        with self._lock:
+            self.latencies[route].append(seconds)
+            if not 200 <= status < 400:
+                self.errors[route] += 1
+
+    def submitted(self, order_id, customer, items):
+        with self._lock:
+            self.orders.append((order_id, customer, items))
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, max(0, int(round(p / 100 * len(sorted_values))) - 1))
+    return sorted_values[k]
+
+
+def staff_loop(args, user_no, run_id, results, deadline):
+    s = Session(args.url, results, args.timeout)
+    s.request("login", "/", {"userid": args.user, "password": args.password})
+    customer = f"LT-{run_id}-{user_no}"
+    mine = []
+    weights = [args.order_weight, args.dashboard_weight, args.status_weight]
+    rnd = random.Random(f"{run_id}-{user_no}")
+
+    while time.time() < deadline:
+        action = rnd.choices(["order", "dashboard", "status"], weights)[0]
+        if action == "status" and not mine:
+            action = "order"
+
+        if action == "order":
+            n = rnd.randint(1, args.items)
+            for i in range(n):
+                s.request("add", "/add", {
+                    "customer": customer, "item": f"LT item {i}",
+                    "price": f"{rnd.randint(100, 2000) / 100:.2f}", "count": rnd.randint(1, 3),
+                })
+            status, body = s.request("submit-order", "/submit-order", {})
+            m = TITLE_RE.search(body)
+            if status == 200 and m:
+                mine.append(m.group(1))
+                results.submitted(m.group(1), customer, n)
+        elif action == "dashboard":
+            s.request("dashboard", "/dashboard")
+        else:
+            order_id = rnd.choice(mine)
+            s.request("update-status", f"/order/{order_id}/update-status", {"status": rnd.choice(STATUSES)})
+
+
+def verify(args, results):
+    """Every submitted order must have a unique ID and be readable in full."""
+    s = Session(args.url, Results(), args.timeout)
+    s.request("login", "/", {"userid": args.user, "password": args.password})
+    ids = [oid for oid, _, _ in results.orders]
+    problems = []
+    dupes = sorted(oid for oid, n in Counter(ids).items() if n > 1)
+    if dupes:
+        problems.append(f"duplicate order IDs: {', '.join(dupes)}")
+    for oid, customer, items in results.orders:
+        status, body = s.request("verify", f"/order/{oid}")
+        if status != 200:
+            problems.append(f"{oid}: HTTP {status}")
+        elif f"<strong>{customer}</strong>" not in body or body.count("<td>LT item ") != items:
+            problems.append(f"{oid}: expected {items} line(s) for {customer}")
+    return problems
+
+
+def report(results, elapsed):
+    print(f"{'route':<16}{'requests':>9}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}")
+    for route in sorted(results.latencies):
+        lat = sorted(results.latencies[route])
+        print(
+            f"{route:<16}{len(lat):>9}{len(lat) / elapsed:>9.1f}"
+            f"{percentile(lat, 50) * 1000:>9.1f}{percentile(lat, 95) * 1000:>9.1f}"
+            f"{percentile(lat, 99) * 1000:>9.1f}{results.errors[route]:>8}"
+        )
+    total = sum(len(v) for v in results.latencies.values())
+    print(f"{total} requests in {elapsed:.1f}s ({total / elapsed:.1f} req/s), "
+          f"{len(results.orders)} orders submitted")
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Load test the Harry's Kitchen portal.")
+    p.add_argument("--url", default="http://127.0.0.1:5000")
+    p.add_argument("--users", type=int, default=8, help="concurrent staff sessions")
+    p.add_argument("--duration", type=float, default=30, help="seconds to run")
+    p.add_argument("--items", type=int, default=4, help="max items per order")
+    p.add_argument("--user", default="admin")
+    p.add_argument("--password", default="admin123")
+    p.add_argument("--timeout", type=float, default=30)
+    p.add_argument("--order-weight", type=float, default=3)
+    p.add_argument("--dashboard-weight", type=float, default=2)
+    p.add_argument("--status-weight", type=float, default=1)
+    args = p.parse_args(argv)
+
+    run_id = time.strftime("%H%M%S")
+    results = Results()
+    start = time.time()
+    threads = [
+        threading.Thread(target=staff_loop, args=(args, i, run_id, results, start + args.duration))
+        for i in range(args.users)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    report(results, time.time() - start)
+
+    problems = verify(args, results)
+    for problem in problems:
+        print("FAIL", problem)
+    print("verify:", "OK" if not problems else f"{len(problems)} problem(s)")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,50 @@
+"""
+Money helpers.
+
+Amounts are held as integer cents (paise) everywhere inside the app: the
+cart, the order store, sqlite and every rollup. Dollar values only exist at
+the edges: parsing form input, reading/writing the human-facing workbooks,
+and rendering (the `money` template filter).
+"""
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+from lazyimport import lazy_import
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+
+def parse_cents(text):
+    """
+    "12.5" -> 1250, exactly (no float in between).
+    Raises ValueError for anything that is not a plain decimal number.
+    """
+    try:
+        value = Decimal(str(text).strip())
+    except InvalidOperation:
+        raise ValueError(f"Not a valid amount: {text!r}")
+    if not value.is_finite():
+        raise ValueError(f"Not a valid amount: {text!r}")
+    return int((value * 100).quantize(Decimal("1"), rounding=ROUND_HALF_UP))
+
+
+def to_cents(values):
+    """
+    Workbook dollar column -> int64 cents Series. Blank/non-numeric cells
+    become 0. Values with at most two decimals convert exactly.
+    """
+    dollars = pd.to_numeric(pd.Series(values), errors="coerce").fillna(0).astype(np.float64)
+    return pd.Series(np.round(dollars.values * 100).astype(np.int64), index=dollars.index)
+
+
+def to_dollars(cents):
+    """int cents (scalar or Series) -> float dollars, for workbook exports."""
+    return cents / 100
+
+
+def format_cents(cents):
+    """1234567 -> "12,345.67" using integer arithmetic only."""
+    cents = int(cents or 0)
+    sign = "-" if cents < 0 else ""
+    whole, frac = divmod(abs(cents), 100)
+    return f"{sign}{whole:,}.{frac:02d}"
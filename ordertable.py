@@ -0,0 +1,242 @@
+"""
+Compact in-memory order table.
+
+The order store keeps the full order history resident in every worker, so
+it is held in a dictionary-encoded layout instead of the workbook's object
+columns (one row per order line):
+
+    Order Prefix  category  "HK"
+    Order Num     int32     1042   (-1 when the ID has no trailing number)
+    Day           int32     days since 1970-01-01 (NO_DAY if unparseable)
+    Customer      category
+    Item          category
+    Price Cents       int32
+    Count             int32
+    Line Total Cents  int64
+    Status        category
+
+expand_orders() turns it back into plain rows (FRAME_COLUMNS, "%m/%d/%Y"
+date strings, money still in cents); to_workbook() converts those to the
+dollar columns of orders.xlsx (ORDER_COLUMNS).
+"""
+from lazyimport import lazy_import
+from money import to_cents, to_dollars
+from schema import columns_of
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+ORDER_COLUMNS = columns_of("orders")
+FRAME_COLUMNS = ["Order ID", "Date", "Customer", "Item", "Price Cents", "Count", "Line Total Cents", "Status"]
+TABLE_COLUMNS = [
+    "Order Prefix", "Order Num", "Day", "Customer", "Item",
+    "Price Cents", "Count", "Line Total Cents", "Status",
+]
+CATEGORY_COLUMNS = ["Order Prefix", "Customer", "Item", "Status"]
+DATE_FMT = "%m/%d/%Y"
+NO_DAY = -2**31          # int32 min
+INT32_MAX = 2**31 - 1    # largest Price Cents / Count an order line can hold
+EPOCH = "1970-01-01"     # day 0; np.datetime64(EPOCH, "D")
+
+
+# ---------- conversions ----------
+
+def to_day_numbers(values):
+    """Dates (strings in DATE_FMT, datetimes, ...) -> int32 day numbers."""
+    values = pd.Series(values)
+    parsed = pd.to_datetime(values, format=DATE_FMT, errors="coerce")
+    retry = parsed.isna() & values.notna()
+    if retry.any():
+        # Cells edited in Excel come back as real dates or other formats
+        parsed[retry] = pd.to_datetime(values[retry], errors="coerce", format="mixed")
+    days = parsed.values.astype("datetime64[D]")
+    out = (days - np.datetime64(EPOCH, "D")).astype(np.int64)
+    out[np.isnat(days)] = NO_DAY
+    return out.astype(np.int32)
+
+
+def day_number(value):
+    """One date-like value -> int32 day number, or None if unparseable."""
+    ts = pd.to_datetime(value, errors="coerce")
+    if pd.isna(ts):
+        return None
+    return int((np.datetime64(ts.date(), "D") - np.datetime64(EPOCH, "D")).astype(np.int64))
+
+
+def from_day_numbers(days):
+    """int32 day numbers -> datetime64[ns] Series (NaT for NO_DAY)."""
+    days = np.asarray(days, dtype=np.int64)
+    out = (np.datetime64(EPOCH, "D") + days.astype("timedelta64[D]")).astype("datetime64[ns]")
+    out[days == NO_DAY] = np.datetime64("NaT")
+    return pd.Series(out)
+
+
+def split_order_ids(values):
+    """"HK1042" -> ("HK", 1042); IDs without a trailing number get -1."""
+    parts = pd.Series(values, dtype="object").astype(str).str.extract(r"^(.*?)(\d*)$")
+    nums = pd.to_numeric(parts[1], errors="coerce").fillna(-1).astype(np.int32)
+    return parts[0].values, nums.values
+
+
+def order_ids(table):
+    """Rebuild the "Order ID" strings for every row of the table."""
+    nums = table["Order Num"].astype(str).where(table["Order Num"] >= 0, "")
+    return (table["Order Prefix"].astype(str) + nums).values
+
+
+# ---------- building ----------
+
+def empty_table():
+    return compact_orders(pd.DataFrame(columns=FRAME_COLUMNS))
+
+
+def compact_orders(df):
+    """
+    Orders frame -> compact table. Money may come as "Price Cents" /
+    "Line Total Cents" or as workbook dollars in "Price" / "Line Total".
+    """
+    n = len(df)
+    col = lambda name, default: df[name] if name in df.columns else pd.Series([default] * n, index=df.index)
+    cents = lambda name: (
+        pd.to_numeric(df[name + " Cents"], errors="coerce").fillna(0).astype(np.int64)
+        if name + " Cents" in df.columns else to_cents(col(name, 0))
+    )
+
+    prefix, nums = split_order_ids(col("Order ID", ""))
+    table = pd.DataFrame({
+        "Order Prefix": pd.Categorical(prefix),
+        "Order Num": nums,
+        "Day": to_day_numbers(col("Date", None)),
+        "Customer": pd.Categorical(col("Customer", "").fillna("").astype(str).values),
+        "Item": pd.Categorical(col("Item", "").fillna("").astype(str).values),
+        "Price Cents": cents("Price").astype(np.int32).values,
+        "Count": pd.to_numeric(col("Count", 0), errors="coerce").fillna(0).astype(np.int32).values,
+        "Line Total Cents": cents("Line Total").values,
+        "Status": pd.Categorical(col("Status", "").fillna("").astype(str).values),
+    })
+    return table
+
+
+def expand_orders(table):
+    """Compact table -> plain order lines (FRAME_COLUMNS)."""
+    dates = from_day_numbers(table["Day"].values).dt.strftime(DATE_FMT)
+    return pd.DataFrame({
+        "Order ID": order_ids(table),
+        "Date": dates.where(table["Day"].values != NO_DAY, None).values,
+        "Customer": table["Customer"].astype(str).values,
+        "Item": table["Item"].astype(str).values,
+        "Price Cents": table["Price Cents"].astype(np.int64).values,
+        "Count": table["Count"].astype(np.int64).values,
+        "Line Total Cents": table["Line Total Cents"].values,
+        "Status": table["Status"].astype(str).values,
+    })
+
+
+def to_workbook(df):
+    """Plain order lines (FRAME_COLUMNS) -> orders.xlsx columns, in dollars."""
+    out = df.copy()
+    out["Price"] = to_dollars(out.pop("Price Cents"))
+    out["Line Total"] = to_dollars(out.pop("Line Total Cents"))
+    return out[ORDER_COLUMNS]
+
+
+def append_rows(table, rows):
+    """Append workbook-shaped row dicts, keeping the categorical encoding."""
+    if not rows:
+        return table
+    table = table.copy(deep=False)
+    new = compact_orders(pd.DataFrame(rows))
+    for name in CATEGORY_COLUMNS:
+        cats = table[name].cat.categories.union(new[name].cat.categories)
+        table[name] = table[name].cat.set_categories(cats)
+        new[name] = new[name].cat.set_categories(cats)
+    return pd.concat([table, new], ignore_index=True)
+
+
+def concat_tables(tables):
+    """Stack compact tables (e.g. month partitions) into one."""
+    tables = [t for t in tables if len(t)] or tables[:1]
+    if not tables:
+        return empty_table()
+    if len(tables) == 1:
+        return tables[0]
+    tables = [t.copy(deep=False) for t in tables]
+    for name in CATEGORY_COLUMNS:
+        cats = tables[0][name].cat.categories
+        for t in tables[1:]:
+            cats = cats.union(t[name].cat.categories)
+        for t in tables:
+            t[name] = t[name].cat.set_categories(cats)
+    return pd.concat(tables, ignore_index=True)
+
+
+def month_keys(days):
+    """Day numbers -> "YYYY-MM" strings ("undated" for NO_DAY)."""
+    days = np.asarray(days, dtype=np.int64)
+    months = (np.datetime64(EPOCH, "D") + days.astype("timedelta64[D]")).astype("datetime64[M]")
+    keys = months.astype(str).astype(object)
+    keys[days == NO_DAY] = "undated"
+    return keys
+
+
+def set_status(table, mask, status):
+    """
+    Return a table with Status set on the masked rows. Only the Status
+    column is copied, so readers of the old table never see a half update.
+    """
+    column = table["Status"]
+    if status not in column.cat.categories:
+        column = column.cat.add_categories([status])
+    column = column.copy()
+    column[mask] = status
+    table = table.copy(deep=False)
+    table["Status"] = column
+    return table
+
+
+# ---------- selections ----------
+
+def order_mask(table, ids):
+    """Boolean mask of the rows belonging to any of the given Order IDs."""
+    prefix, nums = split_order_ids(list(ids))
+    mask = np.zeros(len(table), dtype=bool)
+    row_prefix = table["Order Prefix"].astype(str).values
+    for p in set(prefix):
+        wanted = nums[prefix == p]
+        mask |= (row_prefix == p) & np.isin(table["Order Num"].values, wanted)
+    return mask
+
+
+def category_mask(column, predicate):
+    """Evaluate predicate once per distinct value and map it onto the rows."""
+    hits = np.asarray(predicate(column.cat.categories.to_series()), dtype=bool)
+    codes = column.cat.codes.values
+    return (codes >= 0) & hits[np.maximum(codes, 0)] if len(hits) else np.zeros(len(column), dtype=bool)
+
+
+def filter_mask(table, from_day=None, to_day=None, customer="", status=""):
+    """
+    Dashboard filters as a boolean mask:
+    - from_day / to_day: inclusive day numbers (None = open)
+    - customer: partial match, case-insensitive
+    - status: "not_cancelled", a specific status, or "" for all
+    """
+    mask = np.ones(len(table), dtype=bool)
+    day = table["Day"].values
+    if from_day is not None:
+        mask &= (day >= from_day) & (day != NO_DAY)
+    if to_day is not None:
+        mask &= (day <= to_day) & (day != NO_DAY)
+    if customer:
+        mask &= category_mask(
+            table["Customer"], lambda c: c.str.contains(customer, case=False, regex=False)
+        )
+    if status == "not_cancelled":
+        mask &= ~category_mask(table["Status"], lambda c: c.str.lower() == "cancelled")
+    elif status:
+        mask &= category_mask(table["Status"], lambda c: c.str.lower() == status)
+    return mask
+
+
+def memory_bytes(df):
+    return int(df.memory_usage(deep=True).sum())
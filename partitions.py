@@ -0,0 +1,192 @@
+"""
+Month partitions for the order store's base snapshot.
+
+    orders.parts/
+        manifest.json
+        2025-11.17.pkl     compact table (ordertable.py) of the lines dated
+        2025-12.42.pkl     in that month; the number is the last seq folded in
+        undated.42.pkl     lines whose Date could not be parsed
+
+manifest.json names the current file of every partition with its range
+and totals, so readers can skip partitions without opening them:
+
+    {"last_seq": 42,
+     "partitions": {
+        "2025-12": {"file": "2025-12.42.pkl", "from_day": 20423, "to_day": 20453,
+                    "rows": 310, "orders": 97, "min_num": 1004, "max_num": 1101,
+                    "revenue_cents": 612300, "items": 402},
+        ...}}
+
+revenue_cents and items leave out cancelled lines. Partition files are
+never rewritten in place: a compaction writes new files for the months it
+touched, swaps manifest.json with os.replace and then deletes the old files.
+
+A closed year moved to the cold archive (archive.py) stays listed under its
+year ("2024") with "archived": true and a file path into the archive; it is
+read like any other partition but never rewritten.
+"""
+import json
+import os
+
+import durable
+import ordertable
+from lazyimport import lazy_import
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+UNDATED = "undated"
+
+
+class PartitionDir:
+    def __init__(self, path):
+        self.path = path
+        self.manifest_file = os.path.join(path, "manifest.json")
+        self._tables = {}   # file name -> compact table (files are immutable)
+
+    def exists(self):
+        return os.path.exists(self.manifest_file)
+
+    def signature(self):
+        if not self.exists():
+            return None
+        st = os.stat(self.manifest_file)
+        return (self.manifest_file, st.st_mtime_ns, st.st_size)
+
+    def read_manifest(self):
+        with open(self.manifest_file, encoding="utf-8") as fh:
+            manifest = json.load(fh)
+        # Forget cached partitions that are no longer current
+        current = {p["file"] for p in manifest["partitions"].values()}
+        for name in list(self._tables):
+            if name not in current:
+                del self._tables[name]
+        return manifest
+
+    def cached(self):
+        """Partition tables loaded so far."""
+        return list(self._tables.values())
+
+    def release(self):
+        """Forget the loaded partitions (they are re-read on demand)."""
+        self._tables = {}
+
+    # ---------- reading ----------
+
+    @staticmethod
+    def select(manifest, from_day=None, to_day=None, order_nums=None, archived=True):
+        """
+        Names of the partitions that can hold lines in [from_day, to_day]
+        (None = open) or belonging to any of order_nums. archived=False
+        leaves out the closed years.
+        """
+        names = []
+        for name, p in sorted(manifest["partitions"].items()):
+            if p.get("archived") and not archived:
+                continue
+            if order_nums is not None:
+                if not any(p["min_num"] <= n <= p["max_num"] for n in order_nums):
+                    continue
+            elif from_day is not None or to_day is not None:
+                if name == UNDATED:
+                    continue
+                if from_day is not None and p["to_day"] < from_day:
+                    continue
+                if to_day is not None and p["from_day"] > to_day:
+                    continue
+            names.append(name)
+        return names
+
+    def load(self, manifest, names):
+        """Compact tables of the named partitions (cached per file)."""
+        tables = []
+        for name in names:
+            file = manifest["partitions"][name]["file"]
+            table = self._tables.get(file)
+            if table is None:
+                table = self._tables[file] = pd.read_pickle(os.path.join(self.path, file))
+            tables.append(table)
+        return tables
+
+    # ---------- writing ----------
+
+    def write(self, manifest, tables, last_seq, remove=()):
+        """
+        Write new files for the given {name: table} partitions, drop the
+        partitions named in `remove`, and return (new manifest, files no
+        longer referenced). Nothing is visible to readers until
+        swap(new manifest).
+        """
+        os.makedirs(self.path, exist_ok=True)
+        old = manifest["partitions"] if manifest else {}
+        parts = dict(old)
+        replaced = []
+        for name, table in tables.items():
+            file = f"{name}.{last_seq}.pkl"
+            table = table.reset_index(drop=True)
+            table.to_pickle(os.path.join(self.path, file))
+            durable.fsync_file(os.path.join(self.path, file))   # on disk before the manifest names it
+            if name in old and old[name]["file"] != file:
+                replaced.append(old[name]["file"])
+            parts[name] = dict(describe(table), file=file)
+        for name in remove:
+            replaced.append(parts.pop(name)["file"])
+        return {"last_seq": last_seq, "partitions": parts}, replaced
+
+    def add_archived(self, manifest, name, file, table):
+        """Manifest with `name` pointing at a read-only archive file."""
+        parts = dict(manifest["partitions"])
+        path = os.path.relpath(file, self.path)
+        parts[name] = dict(describe(table), file=path, archived=True)
+        return dict(manifest, partitions=parts)
+
+    def swap(self, manifest):
+        with durable.atomic_path(self.manifest_file) as tmp:
+            with open(tmp, "w", encoding="utf-8") as fh:
+                json.dump(manifest, fh, indent=1, sort_keys=True)
+
+    def unreferenced(self, manifest):
+        """Files in the directory the manifest does not name (left by an interrupted compaction)."""
+        if not os.path.isdir(self.path):
+            return []
+        current = {p["file"] for p in manifest["partitions"].values()}
+        return sorted(
+            f for f in os.listdir(self.path)
+            if f != os.path.basename(self.manifest_file) and f not in current
+        )
+
+    def remove(self, files):
+        for file in files:
+            try:
+                os.remove(os.path.join(self.path, file))
+            except FileNotFoundError:
+                pass
+
+
+def split_by_month(table):
+    """{"YYYY-MM" / "undated": compact table} for the lines of table."""
+    if table.empty:
+        return {}
+    keys = ordertable.month_keys(table["Day"].values)
+    return {
+        name: table[keys == name].reset_index(drop=True)
+        for name in sorted(set(keys))
+    }
+
+
+def describe(table):
+    """Range and totals of one partition, as stored in the manifest."""
+    days = table["Day"].values
+    dated = days[days != ordertable.NO_DAY]
+    nums = table["Order Num"].values
+    live = ~ordertable.category_mask(table["Status"], lambda c: c.str.lower() == "cancelled")
+    return {
+        "from_day": int(dated.min()) if len(dated) else None,
+        "to_day": int(dated.max()) if len(dated) else None,
+        "rows": int(len(table)),
+        "orders": int(len(table[["Order Prefix", "Order Num"]].drop_duplicates())),
+        "min_num": int(nums.min()) if len(nums) else 0,
+        "max_num": int(nums.max()) if len(nums) else -1,
+        "revenue_cents": int(table["Line Total Cents"].values[live].sum()),
+        "items": int(table["Count"].values[live].astype(np.int64).sum()),
+    }
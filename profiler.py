@@ -0,0 +1,97 @@
+"""
+Opt-in sampling profiler for live requests.
+
+Nothing is recorded until an admin turns it on, either for one request
+(?profile=1) or for a fraction of the requests to one endpoint
+(set_rate("dashboard", 0.1)). A profiled request gets a small sampler
+thread that reads the request thread's call stack every `interval` seconds
+until the request ends. Stacks are aggregated by count and exported in the
+collapsed format used by flamegraph.pl / speedscope / inferno:
+
+    GET dashboard;HKPortal.py:dashboard;storage.py:list_orders 42
+
+Profiles and rates live in the worker process: with several gunicorn
+workers each one keeps (and serves) its own.
+"""
+import os
+import random
+import sys
+import threading
+from collections import Counter
+
+
+class SamplingProfiler:
+    def __init__(self, interval=0.005, max_depth=64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.rates = {}            # endpoint -> fraction of requests to profile
+        self.stacks = Counter()    # collapsed stack -> samples
+        self.requests = Counter()  # label -> profiled requests
+        self._lock = threading.Lock()
+
+    def set_rate(self, endpoint, rate):
+        """Profile `rate` (0..1) of the requests to endpoint; 0 turns it off."""
+        rate = min(max(float(rate), 0.0), 1.0)
+        with self._lock:
+            if rate:
+                self.rates[endpoint] = rate
+            else:
+                self.rates.pop(endpoint, None)
+
+    def wants(self, endpoint, forced=False):
+        if forced:
+            return True
+        rate = self.rates.get(endpoint)
+        return bool(rate) and random.random() < rate
+
+    def start(self, label):
+        """Start sampling the calling thread; call .stop() on the result."""
+        sampler = _Sampler(self, label, threading.get_ident())
+        sampler.start()
+        return sampler
+
+    def _merge(self, label, stacks):
+        with self._lock:
+            self.requests[label] += 1
+            self.stacks.update(stacks)
+
+    def collapsed(self):
+        """All samples so far, one "frame;frame;frame count" line per stack."""
+        with self._lock:
+            lines = [f"{stack} {n}" for stack, n in sorted(self.stacks.items())]
+        return "\n".join(lines) + ("\n" if lines else "")
+
+    def reset(self):
+        with self._lock:
+            self.stacks.clear()
+            self.requests.clear()
+
+
+class _Sampler(threading.Thread):
+    def __init__(self, profiler, label, thread_id):
+        super().__init__(name="hk-profiler", daemon=True)
+        self.profiler = profiler
+        self.label = label
+        self.thread_id = thread_id
+        self.stacks = Counter()
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.wait(self.profiler.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[self._collapse(frame)] += 1
+
+    def _collapse(self, frame):
+        names = []
+        while frame is not None and len(names) < self.profiler.max_depth:
+            code = frame.f_code
+            names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+            frame = frame.f_back
+        names.append(self.label)
+        return ";".join(reversed(names))
+
+    def stop(self):
+        self._done.set()
+        self.join()
+        self.profiler._merge(self.label, self.stacks)
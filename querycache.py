@@ -0,0 +1,72 @@
+"""
+Cache of computed page results, e.g. the dashboard's summary and order list
+for one combination of filters.
+
+Entries are keyed by the normalized query plus the store's data_version(),
+so any write makes the older entries unreachable; they are dropped as soon
+as a newer version is seen. At most `max_entries` are kept, least recently
+used out first. Hit/miss counts are kept for /admin/cache.
+"""
+import threading
+from collections import OrderedDict
+
+
+class QueryCache:
+    def __init__(self, max_entries=64, entry_bytes=None):
+        self.max_entries = max_entries
+        self.entry_bytes = entry_bytes or (lambda value: 0)   # value -> rough size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._version = None
+        self._entries = OrderedDict()   # key -> (value, bytes), least recently used first
+        self._lock = threading.Lock()
+
+    def get(self, key, version, compute):
+        """
+        The cached value for key at this data version, or compute() stored
+        under it. Read the version before computing, so a write racing the
+        computation is never hidden behind a newer key.
+        """
+        with self._lock:
+            if self._version is None or version > self._version:
+                self._entries.clear()   # results of older versions can never hit
+                self._version = version
+            elif version == self._version and key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            self.misses += 1
+        value = compute()
+        if self.max_entries < 1:
+            return value
+        with self._lock:
+            if version == self._version:
+                self._entries[key] = (value, self.entry_bytes(value))
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._version = None
+
+    def cache_bytes(self):
+        with self._lock:
+            return sum(size for _, size in self._entries.values())
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "version": self._version,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            }
@@ -0,0 +1,136 @@
+"""
+Cash reconciliation: remittances (MoneyMatters.xlsx) against order revenue,
+day by day.
+
+Both sides are first reduced to one row per day (hash group-by on the day
+number), then joined with one outer merge on the sorted days, so the cost
+grows linearly with the number of order lines and remittances, whatever
+the range. Every day with revenue or cash gets:
+
+    Day, Date       day number (see ordertable.py) and datetime.date
+    revenue_cents   non-cancelled order revenue of that day
+    order_count     orders of that day
+    cash_cents      cash remitted that day
+    diff_cents      cash - revenue
+    balance_cents   cash still owed: revenue - cash summed from the first day
+    flag            "" (matched), "short", "over", "no cash", "no orders"
+
+Cash is often remitted a few days after the sales, so single days rarely
+match. A gap is a run of days during which the balance is not zero: it is
+"settled" if the balance gets back to zero (within the tolerance) and
+"open" if money is still owed at the end of the range. The range is assumed
+to start balanced.
+"""
+from lazyimport import lazy_import
+from ordertable import NO_DAY, filter_mask, from_day_numbers, order_ids, to_day_numbers
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+DAY_COLUMNS = [
+    "Day", "Date", "revenue_cents", "order_count", "cash_cents", "diff_cents", "balance_cents", "flag", "gap",
+]
+GAP_COLUMNS = ["gap", "from", "to", "days", "revenue_cents", "cash_cents", "owed_cents", "status"]
+
+
+def daily_revenue(table, from_day=None, to_day=None):
+    """Day, revenue_cents, order_count of a compact order table (cancelled left out)."""
+    table = table[filter_mask(table, from_day, to_day, "", "not_cancelled")]
+    table = table[table["Day"].values != NO_DAY]
+    if table.empty:
+        return pd.DataFrame({"Day": [], "revenue_cents": [], "order_count": []}, dtype=np.int64)
+    per_day = table.groupby("Day").agg(revenue_cents=("Line Total Cents", "sum"))
+    per_day["order_count"] = (
+        table[["Day", "Order Prefix", "Order Num"]].drop_duplicates().groupby("Day").size()
+    )
+    return per_day.reset_index()
+
+
+def daily_cash(remits, from_day=None, to_day=None):
+    """Day, cash_cents of a remittance frame (Date, Cash Amount Cents)."""
+    if remits.empty:
+        return pd.DataFrame({"Day": [], "cash_cents": []}, dtype=np.int64)
+    days = to_day_numbers(remits["Date"]).astype(np.int64)
+    keep = days != NO_DAY
+    if from_day is not None:
+        keep &= days >= from_day
+    if to_day is not None:
+        keep &= days <= to_day
+    cash = pd.DataFrame({
+        "Day": days[keep],
+        "cash_cents": remits["Cash Amount Cents"].values[keep].astype(np.int64),
+    })
+    return cash.groupby("Day", sort=False, as_index=False)["cash_cents"].sum()
+
+
+def reconcile(table, remits, from_day=None, to_day=None, tolerance_cents=0):
+    """
+    (days, gaps) DataFrames with DAY_COLUMNS and GAP_COLUMNS for the orders
+    in `table` (compact order table) and the remittances in `remits`.
+    """
+    revenue = daily_revenue(table, from_day, to_day).sort_values("Day")
+    cash = daily_cash(remits, from_day, to_day).sort_values("Day")
+    days = pd.merge(revenue, cash, on="Day", how="outer", sort=True).fillna(0)
+
+    rev = days["revenue_cents"].values.astype(np.int64)
+    paid = days["cash_cents"].values.astype(np.int64)
+    diff = paid - rev
+    balance = np.cumsum(rev - paid)
+    flag = np.select(
+        [
+            np.abs(diff) <= tolerance_cents,
+            paid == 0,
+            rev == 0,
+            diff < 0,
+        ],
+        ["", "no cash", "no orders", "short"],
+        default="over",
+    )
+
+    # Gaps: runs of days that end with money owed (or over-remitted)
+    open_ = np.abs(balance) > tolerance_cents
+    starts = open_ & ~np.concatenate(([False], open_[:-1]))
+    gap = np.cumsum(starts) * open_
+    # The day that brings the balance back to zero closes its gap
+    closes = ~open_ & np.concatenate(([False], open_[:-1]))
+    gap[closes] = np.concatenate(([0], gap[:-1]))[closes]
+
+    out = pd.DataFrame({
+        "Day": days["Day"].values.astype(np.int64),
+        "Date": from_day_numbers(days["Day"].values).dt.date.values,
+        "revenue_cents": rev,
+        "order_count": days["order_count"].values.astype(np.int64),
+        "cash_cents": paid,
+        "diff_cents": diff,
+        "balance_cents": balance,
+        "flag": flag,
+        "gap": gap,
+    }, columns=DAY_COLUMNS)
+    return out, _gaps(out, tolerance_cents)
+
+
+def _gaps(days, tolerance_cents):
+    in_gap = days[days["gap"].values > 0]
+    if in_gap.empty:
+        return pd.DataFrame(columns=GAP_COLUMNS)
+    gaps = in_gap.groupby("gap", sort=True).agg(**{
+        "from": ("Date", "first"),
+        "to": ("Date", "last"),
+        "days": ("Date", "size"),
+        "revenue_cents": ("revenue_cents", "sum"),
+        "cash_cents": ("cash_cents", "sum"),
+        "owed_cents": ("balance_cents", "last"),
+    }).reset_index()
+    gaps["status"] = np.where(np.abs(gaps["owed_cents"].values) > tolerance_cents, "open", "settled")
+    return gaps[GAP_COLUMNS]
+
+
+def orders_by_day(table, days):
+    """{day number: "HK1001 HK1002 ..."} for the non-cancelled orders on the given days."""
+    table = table[filter_mask(table, status="not_cancelled")]
+    table = table[np.isin(table["Day"].values, np.asarray(days, dtype=np.int64))]
+    if table.empty:
+        return {}
+    ids = pd.DataFrame({"Day": table["Day"].values.astype(np.int64), "id": order_ids(table)})
+    ids = ids.drop_duplicates()
+    return ids.groupby("Day", sort=False)["id"].agg(" ".join).to_dict()
@@ -0,0 +1,217 @@
+"""
+Replay a traffic log (see traffic.py) against a local portal, to compare
+latency between versions on the workload we actually have.
+
+Each recorded session is replayed in its own thread with its own cookie
+jar, in the recorded order and with the recorded gaps between requests
+(--speed 2 halves them, --speed 0 sends without waiting). Every session
+logs in first with --user/--password, and recorded logins use them too.
+Orders created during the recording are created again. Later requests for
+those Order IDs are sent for the new orders instead.
+
+Pseudonymized text (customers, items, search words) is mapped back to the
+names in the data copy when --data and the recording key are given, so
+searches and filters hit the same kind of rows. Unknown words stay as
+pseudonyms and match nothing.
+
+    cp -r /srv/hk /tmp/hk-replay          # always replay on a copy: orders are created
+    (cd /tmp/hk-replay && SECRET_KEY=x gunicorn -k gthread --threads 8 -b 127.0.0.1:8000 HKPortal:app)
+    python replay.py traffic.jsonl --url http://127.0.0.1:8000 --data /tmp/hk-replay \\
+        --key "$HK_TRAFFIC_KEY" --save before.json
+    python replay.py --compare before.json after.json
+
+It prints p50/p95/p99 per endpoint like loadtest.py, plus how many answers
+had a different status than recorded (a sign the copy or the code drifted).
+"""
+import argparse
+import json
+import os
+import re
+import threading
+import time
+import urllib.parse
+from collections import defaultdict
+
+from loadtest import TITLE_RE, Results, Session, percentile, report
+from traffic import pseudonym
+
+LOCAL_HOSTS = {"127.0.0.1", "localhost", "::1"}
+PSEUDONYM_RE = re.compile(r"~[0-9a-f]{12}")
+
+
+def load(path):
+    """Recorded requests, oldest first."""
+    with open(path, encoding="utf-8") as fh:
+        records = [json.loads(line) for line in fh if line.strip()]
+    records.sort(key=lambda r: r["at"])
+    return records
+
+
+def names_of(data_dir):
+    """Customer and item names in a portal data directory."""
+    from indexes import load_menu
+    from storage import open_storage
+
+    table = open_storage(data_dir).order_table()
+    names = set()
+    for column in ("Customer", "Item"):
+        names.update(str(name) for name in table[column].cat.categories)
+    names.update(display for display, _ in load_menu(os.path.join(data_dir, "menu.json")).values())
+    return names
+
+
+def word_map(names, key):
+    """pseudonym -> word, for every word of the names and every prefix of one."""
+    out = {}
+    for name in names:
+        for word in name.split():
+            for end in range(1, len(word) + 1):
+                out.setdefault(pseudonym(word[:end], key), word[:end])
+    return out
+
+
+class Replay:
+    def __init__(self, args, records, words):
+        self.args = args
+        self.records = records
+        self.words = words
+        self.results = Results()
+        self.mismatches = defaultdict(int)   # endpoint -> answers with another status than recorded
+        self.order_ids = {}                  # recorded Order ID -> replayed one
+        self._lock = threading.Lock()
+
+    def text(self, value):
+        return PSEUDONYM_RE.sub(lambda m: self.words.get(m.group(0), m.group(0)), value)
+
+    def order_id(self, value):
+        with self._lock:
+            return self.order_ids.get(value, value)
+
+    def fields(self, fields):
+        return {
+            name: [self.order_id(self.text(v)) for v in values]
+            for name, values in fields.items()
+        }
+
+    def path(self, record):
+        parts = [urllib.parse.quote(self.order_id(urllib.parse.unquote(p))) for p in record["path"].split("/")]
+        query = urllib.parse.urlencode(self.fields(record["args"]), doseq=True)
+        return record["prefix"] + "/".join(parts) + ("?" + query if query else "")
+
+    def session_loop(self, records, t0, start):
+        s = Session(self.args.url, self.results, self.args.timeout)
+        credentials = {"userid": self.args.user, "password": self.args.password}
+        s.request("login", records[0]["prefix"] + "/", credentials)
+        for record in records:
+            if self.args.speed:
+                delay = start + (record["at"] - t0) / self.args.speed - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+            form = None
+            if record["method"] == "POST":
+                form = self.fields(record["form"])
+                if record["endpoint"] == "login":
+                    form.update(credentials)
+            endpoint = record["endpoint"] or "unknown"
+            status, body = s.request(endpoint, self.path(record), form)
+            if status != record["status"]:
+                with self._lock:
+                    self.mismatches[endpoint] += 1
+            if record.get("order_id"):
+                m = TITLE_RE.search(body)
+                if m:
+                    with self._lock:
+                        self.order_ids[record["order_id"]] = m.group(1)
+                    self.results.submitted(m.group(1), "", 0)
+
+    def run(self):
+        sessions = defaultdict(list)
+        for record in self.records:
+            sessions[record["session"]].append(record)
+        t0 = self.records[0]["at"]
+        start = time.time()
+        threads = [
+            threading.Thread(target=self.session_loop, args=(records, t0, start))
+            for records in sessions.values()
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return time.time() - start
+
+
+def save(path, results, elapsed):
+    with open(path, "w", encoding="utf-8") as fh:
+        json.dump({"elapsed": elapsed, "latencies": results.latencies, "errors": results.errors}, fh)
+
+
+def compare(before_path, after_path):
+    runs = []
+    for path in (before_path, after_path):
+        with open(path, encoding="utf-8") as fh:
+            runs.append(json.load(fh))
+    print(f"{'endpoint':<24}{'requests':>9}" + "".join(
+        f"{f'p{p} before':>11}{f'p{p} after':>10}{'change':>8}" for p in (50, 95, 99)
+    ))
+    for route in sorted(set(runs[0]["latencies"]) | set(runs[1]["latencies"])):
+        before, after = (sorted(run["latencies"].get(route, [])) for run in runs)
+        line = f"{route:<24}{len(after):>9}"
+        for p in (50, 95, 99):
+            b, a = percentile(before, p) * 1000, percentile(after, p) * 1000
+            change = f"{(a - b) / b * 100:+.0f}%" if b else "-"
+            line += f"{b:>11.1f}{a:>10.1f}{change:>8}"
+        print(line)
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Replay a Harry's Kitchen traffic log against a local portal.")
+    p.add_argument("log", nargs="?", help="traffic log written with HK_TRAFFIC_LOG")
+    p.add_argument("--url", default="http://127.0.0.1:5000")
+    p.add_argument("--data", help="data directory the portal serves, to map pseudonyms back to names")
+    p.add_argument("--key", default=os.environ.get("HK_TRAFFIC_KEY"), help="HK_TRAFFIC_KEY of the recording (default: <log>.key if there is one)")
+    p.add_argument("--speed", type=float, default=1.0, help="time scale; 0 = no waits between requests")
+    p.add_argument("--user", default="admin")
+    p.add_argument("--password", default="admin123")
+    p.add_argument("--timeout", type=float, default=30)
+    p.add_argument("--save", help="write the latencies to this JSON file for --compare")
+    p.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="compare two --save files")
+    p.add_argument("--allow-remote", action="store_true", help="replay against a non-local URL")
+    args = p.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return 0
+    if not args.log:
+        p.error("a traffic log is required (or --compare)")
+    if urllib.parse.urlsplit(args.url).hostname not in LOCAL_HOSTS and not args.allow_remote:
+        p.error(f"{args.url} is not local; replay creates orders, so use a local copy (or --allow-remote)")
+
+    records = load(args.log)
+    if not records:
+        print("empty traffic log")
+        return 1
+    if not args.key and os.path.exists(args.log + ".key"):
+        with open(args.log + ".key", encoding="utf-8") as fh:
+            args.key = fh.read().strip()   # generated by the recording (traffic.shared_key)
+    words = {}
+    if args.data and args.key:
+        words = word_map(names_of(args.data), args.key.encode("utf-8"))
+    elif args.data:
+        print("no --key: pseudonymized text is sent as it is")
+
+    replay = Replay(args, records, words)
+    elapsed = replay.run()
+    recorded = records[-1]["at"] - records[0]["at"]
+    print(f"replayed {len(records)} requests from {len({r['session'] for r in records})} sessions "
+          f"(recorded over {recorded:.1f}s)")
+    report(replay.results, elapsed)
+    for endpoint, n in sorted(replay.mismatches.items()):
+        print(f"{endpoint}: {n} answer(s) with another status than recorded")
+    if args.save:
+        save(args.save, replay.results, elapsed)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,222 @@
+"""
+Declared layout of the three workbooks, and a reader that loads only the
+columns a caller asks for.
+
+    orders.xlsx        Order ID, Date, Customer, Item, Price, Count, Line Total, Status
+    Expenses.xlsx      Date, Expense, Amount
+    MoneyMatters.xlsx  Date, Type of Remit, Cash Amount
+
+Anything else in a sheet (the hand-kept "Total" cells next to the data,
+stray notes) is ignored. Each column has a fixed kind, so dtypes no longer
+depend on what happens to be in the cells:
+
+    text    object, str values, "" for blanks
+    number  float64, NaN for blanks / non-numeric cells
+    int     int64, 0 for blanks / non-numeric cells
+    date    cells as stored (datetimes, or "mm/dd/YYYY" text); datetime64
+            when every cell is a real date
+
+read_workbook() streams the sheet with openpyxl in read-only mode and only
+materialises the requested columns, skipping pandas' generic Excel parser.
+
+read_workbooks() parses several workbooks at once, one per worker process,
+so loading all three takes about as long as the largest one.
+
+Expenses and remittances entered in the portal are written into their
+workbooks by append_rows(), below the last data row. The workbook records
+the seq of the last tail entry it holds in a custom document property
+(read back as df.attrs["last_seq"]), so an entry is never counted twice.
+"""
+import os
+import threading
+from datetime import datetime
+
+from lazyimport import lazy_import
+
+pd = lazy_import("pandas")
+
+WORKBOOKS = {
+    "orders": {
+        "Order ID": "text",
+        "Date": "date",
+        "Customer": "text",
+        "Item": "text",
+        "Price": "number",
+        "Count": "int",
+        "Line Total": "number",
+        "Status": "text",
+    },
+    "expenses": {
+        "Date": "date",
+        "Expense": "text",
+        "Amount": "number",
+    },
+    "remits": {
+        "Date": "date",
+        "Type of Remit": "text",
+        "Cash Amount": "number",
+    },
+}
+
+
+SEQ_PROPERTY = "HK last seq"
+
+# Worker processes for read_workbooks (HK_READ_PROCESSES, 0 or 1 = read in turn)
+READ_PROCESSES = int(os.environ.get("HK_READ_PROCESSES", "3"))
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def columns_of(workbook):
+    return list(WORKBOOKS[workbook])
+
+
+def read_workbook(path, workbook, columns=None):
+    """
+    Read `columns` (default: all declared columns) of a workbook's first
+    sheet. Declared columns missing from the sheet come back empty.
+    """
+    import openpyxl
+
+    schema = WORKBOOKS[workbook]
+    columns = list(columns or schema)
+    unknown = [c for c in columns if c not in schema]
+    if unknown:
+        raise KeyError(f"{workbook} has no column(s) {unknown}")
+
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        last_seq = _last_seq(wb)
+        ws = wb.worksheets[0]
+        rows = ws.iter_rows(values_only=True)
+        header = next(rows, ())
+        index = {}
+        for i, name in enumerate(header):
+            if name is not None:
+                index.setdefault(str(name).strip(), i)
+        wanted = [index[c] for c in columns if c in index]
+        data = {c: [] for c in columns}
+        if wanted:
+            # Only walk the span of columns we need
+            lo, hi = min(wanted), max(wanted)
+            rows = ws.iter_rows(min_row=2, min_col=lo + 1, max_col=hi + 1, values_only=True)
+            picks = [(c, index[c] - lo) for c in columns if c in index]
+            for row in rows:
+                values = [row[i] if i < len(row) else None for _, i in picks]
+                if all(v is None or v == "" for v in values):
+                    continue  # blank/formatted-only row
+                for (c, _), v in zip(picks, values):
+                    data[c].append(v)
+    finally:
+        wb.close()
+
+    n = max((len(v) for v in data.values()), default=0)
+    df = pd.DataFrame({c: _typed(data[c] or [None] * n, schema[c]) for c in columns})
+    df.attrs["last_seq"] = last_seq
+    return df
+
+
+def read_workbooks(reads):
+    """
+    Read several workbooks at once: reads is {key: (path, workbook[, columns])}
+    and the result is {key: DataFrame}, as read_workbook would return them.
+    Parsing is CPU-bound, so each workbook goes to its own worker process;
+    the pool is started on first use (forkserver, or spawn where there is
+    none) and kept for later calls.
+    """
+    if len(reads) < 2 or READ_PROCESSES < 2:
+        return {key: read_workbook(*args) for key, args in reads.items()}
+    pool = _read_pool()
+    futures = {key: pool.submit(read_workbook, *args) for key, args in reads.items()}
+    return {key: future.result() for key, future in futures.items()}
+
+
+def _read_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            # Never fork a threaded web worker: a lock held by another
+            # thread (logging, ours) would stay locked in the child
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+            _pool = ProcessPoolExecutor(max_workers=READ_PROCESSES, mp_context=context)
+        return _pool
+
+
+def workbook_seq(path):
+    """Seq recorded by append_rows() in a workbook (0 if none or no file)."""
+    import openpyxl
+
+    if not os.path.exists(path):
+        return 0
+    wb = openpyxl.load_workbook(path, read_only=True)
+    try:
+        return _last_seq(wb)
+    finally:
+        wb.close()
+
+
+def append_rows(path, workbook, rows, last_seq, out_path):
+    """
+    Write a copy of the workbook to out_path with `rows` (dicts keyed by
+    declared column) added below the last row that has a declared column
+    filled in. Everything else in the sheet (hand-kept totals, formatting)
+    is kept. The copy records last_seq. A missing workbook is started with
+    the declared header.
+    """
+    import openpyxl
+    from openpyxl.packaging.custom import IntProperty
+
+    schema = WORKBOOKS[workbook]
+    if os.path.exists(path):
+        wb = openpyxl.load_workbook(path)
+    else:
+        wb = openpyxl.Workbook()
+        wb.worksheets[0].append(list(schema))
+    ws = wb.worksheets[0]
+    index = {}
+    for cell in ws[1]:
+        if cell.value is not None:
+            index.setdefault(str(cell.value).strip(), cell.column)
+    for name in schema:
+        if name not in index:
+            index[name] = max(index.values(), default=0) + 1
+            ws.cell(row=1, column=index[name], value=name)
+
+    last = 1
+    for r, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
+        if any(row[i - 1] not in (None, "") for i in index.values() if i <= len(row)):
+            last = r
+    for offset, values in enumerate(rows, start=1):
+        for name, value in values.items():
+            ws.cell(row=last + offset, column=index[name], value=value)
+
+    props = wb.custom_doc_props
+    props.props = [p for p in props.props if p.name != SEQ_PROPERTY]
+    props.append(IntProperty(name=SEQ_PROPERTY, value=int(last_seq)))
+    wb.save(out_path)
+
+
+def _last_seq(wb):
+    for prop in wb.custom_doc_props:
+        if prop.name == SEQ_PROPERTY:
+            return int(prop.value)
+    return 0
+
+
+def _typed(values, kind):
+    s = pd.Series(values, dtype=object)
+    if kind == "text":
+        return s.map(lambda v: "" if v is None else str(v))
+    if kind == "number":
+        return pd.to_numeric(s, errors="coerce").astype("float64")
+    if kind == "int":
+        return pd.to_numeric(s, errors="coerce").fillna(0).astype("int64")
+    if kind == "date":
+        present = s.dropna()
+        if len(present) and all(isinstance(v, datetime) for v in present):
+            return pd.to_datetime(s)
+        return s
+    raise ValueError(f"Unknown column kind {kind!r}")
@@ -1,46 +1,232 @@
+"""
+Monthly revenue / expense / cash totals of a data directory, read through
+its storage backend (storage.open_storage), so orders and entries still in
+the tail journal are counted. Totals are summed in integer cents and only
+turned into dollars when printed or written out.
+
+    python stats.py                       # this directory, printed as a dict
+
+Batch mode reports on several kitchens (data directories) and date ranges
+in one run. Each kitchen is read once, in its own worker process, and every
+range is cut from that read:
+
+    python stats.py --kitchen main=/srv/hk/main --kitchen north=/srv/hk/north \
+        --range 2025-01-01:2025-06-30 --range 2025-07-01: --out reports/
+
+writes reports/<kitchen>.csv, reports/combined.csv (all kitchens summed)
+and reports/rollup.json. A range is FROM:TO (YYYY-MM-DD, either end may be
+left open). Archived years only have monthly totals, so for them a range
+keeps the months it overlaps.
+"""
+import argparse
+import json
 import os
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 
+import ordertable
+import schema
+from archive import Archive
+from money import to_dollars
+from storage import check_data_dirs, open_storage
+
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 EXCEL_FILE = os.path.join(BASE_DIR, "orders.xlsx")
 EXPENSE_FILE = os.path.join(BASE_DIR, "Expenses.xlsx")
 REMIT_FILE = os.path.join(BASE_DIR, "MoneyMatters.xlsx")
+ARCHIVE_DIR = os.path.join(BASE_DIR, "archive")
+
+ALL = (None, None)
+TOTAL_KEYS = ["total_revenue", "total_expense", "total_cash"]
+MONTHS = [datetime(2000, m, 1).strftime("%b") for m in range(1, 13)]
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Monthly stats for one or more kitchens.")
+    p.add_argument("--kitchen", action="append", default=[], metavar="NAME=DIR",
+                   help="a kitchen's data directory (repeatable; default: this directory)")
+    p.add_argument("--range", action="append", default=[], metavar="FROM:TO",
+                   help="date range, YYYY-MM-DD:YYYY-MM-DD, either end optional (repeatable)")
+    p.add_argument("--out", help="write <kitchen>.csv, combined.csv and rollup.json here")
+    p.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                   help="kitchens processed at once")
+    args = p.parse_args(argv)
+
+    if not args.kitchen and not args.range and not args.out:
+        print(in_dollars(stats()))
+        return 0
+
+    kitchens = dict(parse_kitchen(k) for k in args.kitchen) or {"default": BASE_DIR}
+    try:
+        check_data_dirs(kitchens.values())
+    except ValueError as exc:
+        raise SystemExit(str(exc))
+    ranges = [parse_range(r) for r in args.range] or [ALL]
+    by_kitchen = batch(kitchens, ranges, args.workers)
+    combined = {label: combine(reports[label] for reports in by_kitchen.values())
+                for label in map(range_label, ranges)}
+
+    if args.out:
+        write_reports(args.out, by_kitchen, combined)
+        print(f"{len(kitchens)} kitchen(s) x {len(ranges)} range(s) -> {args.out}")
+    else:
+        print(json.dumps(rollup_in_dollars(by_kitchen, combined), indent=2))
+    return 0
+
+
+def parse_kitchen(text):
+    name, sep, path = text.partition("=")
+    if not sep:
+        path, name = name, os.path.basename(os.path.normpath(name))
+    if not os.path.isdir(path):
+        raise SystemExit(f"Not a directory: {path}")
+    return name, os.path.abspath(path)
+
+
+def parse_range(text):
+    lo, sep, hi = text.partition(":")
+    if not sep:
+        raise SystemExit(f"Range must be FROM:TO, got {text!r}")
+    try:
+        return tuple(datetime.strptime(d, "%Y-%m-%d") if d else None for d in (lo, hi))
+    except ValueError:
+        raise SystemExit(f"Dates must be YYYY-MM-DD, got {text!r}")
+
+
+def range_label(date_range):
+    if date_range == ALL:
+        return "all"
+    return ":".join("" if d is None else d.strftime("%Y-%m-%d") for d in date_range)
+
+
+def batch(kitchens, ranges, workers):
+    """{kitchen: {range label: stats_by_year}}, one worker process per kitchen."""
+    if workers < 2 or len(kitchens) < 2:
+        return {name: kitchen_stats(path, ranges) for name, path in kitchens.items()}
+    # Each worker reads its kitchen's three workbooks in turn
+    with ProcessPoolExecutor(max_workers=min(workers, len(kitchens)), initializer=_read_in_turn) as pool:
+        futures = {name: pool.submit(kitchen_stats, path, ranges) for name, path in kitchens.items()}
+        return {name: future.result() for name, future in futures.items()}
+
+
+def _read_in_turn():
+    schema.READ_PROCESSES = 1
+
+
+def kitchen_stats(base_dir, ranges):
+    """{range label: stats_by_year} for one data directory, reading it once."""
+    frames = load_sources(base_dir)
+    archive = Archive(os.path.join(base_dir, "archive"))
+    return {range_label(r): monthly_stats(frames, archive, *r) for r in ranges}
+
+
+def combine(reports):
+    """Add up several stats_by_year dicts month by month."""
+    months = {}
+    for stats_by_year in reports:
+        for year, rows in stats_by_year.items():
+            for row in rows:
+                totals = months.setdefault((int(year), row["month"]), dict.fromkeys(TOTAL_KEYS, 0))
+                for key in TOTAL_KEYS:
+                    totals[key] += row[key]
+    out = {}
+    for (year, month), totals in sorted(months.items(), key=lambda kv: (kv[0][0], MONTHS.index(kv[0][1]))):
+        out.setdefault(year, []).append({"month": month, **totals})
+    return out
+
+
+def in_dollars(stats_by_year):
+    """A stats_by_year dict in cents -> the same in dollars, for output."""
+    return {
+        year: [{"month": row["month"], **{k: to_dollars(row[k]) for k in TOTAL_KEYS}} for row in rows]
+        for year, rows in stats_by_year.items()
+    }
+
+
+def rollup_in_dollars(by_kitchen, combined):
+    return {
+        "kitchens": {
+            name: {label: in_dollars(s) for label, s in reports.items()}
+            for name, reports in by_kitchen.items()
+        },
+        "combined": {label: in_dollars(s) for label, s in combined.items()},
+    }
 
 
-def main():
-    stats_by_year = stats()
-    print(stats_by_year)
+def write_reports(out_dir, by_kitchen, combined):
+    os.makedirs(out_dir, exist_ok=True)
+    for name, reports in list(by_kitchen.items()) + [("combined", combined)]:
+        rows = [
+            {"Kitchen": name, "Range": label, "Year": year, "Month": row["month"],
+             "Total Expense": to_dollars(row["total_expense"]), "Total Cash": to_dollars(row["total_cash"]),
+             "Total Revenue": to_dollars(row["total_revenue"])}
+            for label, stats_by_year in reports.items()
+            for year, monthly in stats_by_year.items()
+            for row in monthly
+        ]
+        columns = ["Kitchen", "Range", "Year", "Month", "Total Expense", "Total Cash", "Total Revenue"]
+        pd.DataFrame(rows, columns=columns).to_csv(os.path.join(out_dir, f"{name}.csv"), index=False)
+    with open(os.path.join(out_dir, "rollup.json"), "w", encoding="utf-8") as fh:
+        json.dump(rollup_in_dollars(by_kitchen, combined), fh, indent=2)
+
+
+def stats(base_dir=BASE_DIR, from_date=None, to_date=None):
+    """stats_by_year of a data directory, in integer cents."""
+    archive = Archive(os.path.join(base_dir, "archive"))
+    return monthly_stats(load_sources(base_dir), archive, from_date, to_date)
+
+
+def load_sources(base_dir):
+    """
+    Orders (Date, Line Total Cents, Status), expenses (Date, Amount Cents)
+    and remittances (Date, Cash Amount Cents) of a data directory, read through its
+    storage backend. orders.xlsx and Expenses.xlsx are exports that only
+    compaction refreshes; the backend also reads the month partitions and
+    the tail journal, so the latest orders and entries are counted.
+    Archived years stay on disk: with_archive adds their monthly totals.
+    """
+    store = open_storage(base_dir)
+    orders = ordertable.expand_orders(store.order_table(archived=False))
+    return {
+        "orders": orders[["Date", "Line Total Cents", "Status"]],
+        "expenses": store.load_expenses(archived=False)[["Date", "Amount Cents"]],
+        "remits": store.load_remits(archived=False)[["Date", "Cash Amount Cents"]],
+    }
 
 
-def stats():
-    # Read Excel files
-    df_orders = pd.read_excel(EXCEL_FILE)
-    df_exp = pd.read_excel(EXPENSE_FILE)
-    df_cash = pd.read_excel(REMIT_FILE)
+def monthly_stats(frames, archive, from_date=None, to_date=None):
+    df_orders = in_range(frames["orders"], from_date, to_date)
+    df_exp = in_range(frames["expenses"], from_date, to_date)
+    df_cash = in_range(frames["remits"], from_date, to_date)
 
     # Build three monthly summaries
     rev_df = build_monthly_sum(
         df_orders,
-        amt_col="Line Total",
+        amt_col="Line Total Cents",
         new_col="total_revenue",
         exclude_cancelled=True,
     )
 
     exp_df = build_monthly_sum(
         df_exp,
-        amt_col="Amount",
+        amt_col="Amount Cents",
         new_col="total_expense",
         exclude_cancelled=False,
     )
 
     cash_df = build_monthly_sum(
         df_cash,
-        amt_col="Cash Amount",
+        amt_col="Cash Amount Cents",
         new_col="total_cash",
         exclude_cancelled=False,
     )
 
+    # Closed years moved to the archive only keep their monthly totals
+    rev_df = with_archive(rev_df, archive, "orders", from_date, to_date)
+    exp_df = with_archive(exp_df, archive, "expenses", from_date, to_date)
+    cash_df = with_archive(cash_df, archive, "remits", from_date, to_date)
+
     # Merge them all on Year + Month
     merged = (
         rev_df
@@ -59,9 +245,9 @@ def stats():
 
         stats_by_year.setdefault(year, []).append({
             "month": month_label,
-            "total_revenue": float(row.get("total_revenue", 0.0)),
-            "total_expense": float(row.get("total_expense", 0.0)),
-            "total_cash": float(row.get("total_cash", 0.0)),
+            "total_revenue": int(row.get("total_revenue", 0)),
+            "total_expense": int(row.get("total_expense", 0)),
+            "total_cash": int(row.get("total_cash", 0)),
         })
 
     return stats_by_year
@@ -73,7 +259,7 @@ def build_monthly_sum(df, amt_col, new_col, exclude_cancelled=False):
     Year, MonthNum, Month, <new_col>
 
     - df:        input DataFrame
-    - amt_col:   column to sum (e.g., 'Line Total', 'Amount', 'Cash Amount')
+    - amt_col:   integer cents column to sum (e.g., 'Line Total Cents')
     - new_col:   output column name (e.g., 'total_revenue')
     - exclude_cancelled: if True, filter out Status == 'cancelled'
     """
@@ -101,13 +287,48 @@ def build_monthly_sum(df, amt_col, new_col, exclude_cancelled=False):
 
     return grouped
 
+def in_range(df, from_date=None, to_date=None):
+    """Rows of a workbook frame dated from_date..to_date (inclusive)."""
+    if df.empty or (from_date is None and to_date is None):
+        return df
+    dates = pd.to_datetime(df["Date"], format="%m/%d/%Y")
+    mask = pd.Series(True, index=df.index)
+    if from_date is not None:
+        mask &= dates >= from_date
+    if to_date is not None:
+        mask &= dates <= to_date
+    return df[mask]
+
+
+def with_archive(df, archive, kind, from_date=None, to_date=None):
+    """
+    Add the archived years' monthly totals to a monthly summary (both in
+    cents). Rows of archived years still in the workbooks are
+    already counted in the archive and are dropped. With a date range, the
+    archived months it overlaps are kept.
+    """
+    years = archive.years()
+    if not years:
+        return df
+    archived = archive.monthly(kind)
+    month = archived["Year"] * 12 + archived["MonthNum"]
+    if from_date is not None:
+        archived = archived[month >= from_date.year * 12 + from_date.month]
+    if to_date is not None:
+        archived = archived[month <= to_date.year * 12 + to_date.month]
+    df = df[~df["Year"].isin(years)]
+    if df.empty:
+        return archived
+    return pd.concat([archived, df], ignore_index=True)
+
+
 def compute_totals(stats_by_year):
     """
-    stats_by_year looks like:
+    stats_by_year (integer cents) looks like:
     {
         2025: [
-            {"month": "Nov", "total_revenue": 0, "total_expense": 90, "total_cash": 0},
-            {"month": "Dec", "total_revenue": 306, "total_expense": 255.37, "total_cash": 293},
+            {"month": "Nov", "total_revenue": 0, "total_expense": 9000, "total_cash": 0},
+            {"month": "Dec", "total_revenue": 30600, "total_expense": 25537, "total_cash": 29300},
         ],
         2026: [...]
     }
@@ -119,20 +340,20 @@ def compute_totals(stats_by_year):
 
     totals_by_year = {}
     grand_totals = {
-        "total_revenue": 0.0,
-        "total_expense": 0.0,
-        "total_cash": 0.0,
+        "total_revenue": 0,
+        "total_expense": 0,
+        "total_cash": 0,
     }
 
     for year, rows in stats_by_year.items():
-        year_rev = 0.0
-        year_exp = 0.0
-        year_cash = 0.0
+        year_rev = 0
+        year_exp = 0
+        year_cash = 0
 
         for row in rows:
-            year_rev += float(row.get("total_revenue", 0) or 0)
-            year_exp += float(row.get("total_expense", 0) or 0)
-            year_cash += float(row.get("total_cash", 0) or 0)
+            year_rev += int(row.get("total_revenue", 0) or 0)
+            year_exp += int(row.get("total_expense", 0) or 0)
+            year_cash += int(row.get("total_cash", 0) or 0)
 
         totals_by_year[year] = {
             "total_revenue": year_rev,
@@ -148,4 +369,4 @@ def compute_totals(stats_by_year):
 
 
 if __name__ == "__main__":
-    main()
+    raise SystemExit(main())
@@ -0,0 +1,1542 @@
+"""
+Storage for Harry's Kitchen.
+
+Every route in HKPortal.py goes through a Storage object (see open_storage):
+- XlsxStorage:   orders.xlsx / Expenses.xlsx / MoneyMatters.xlsx, with the
+                 append-only OrderStore below for order writes
+- SqliteStorage: one stdlib sqlite3 database with indexed tables; fill it
+                 once from the workbooks with `python storage.py migrate`
+
+XlsxStorage orders live in two places on disk:
+- a base: month partitions (orders.parts/, see partitions.py), or
+  orders.xlsx / an older single-file orders.snapshot.pkl until the first
+  compaction splits it
+- a tail log (orders.tail.jsonl) with one JSON event per line:
+    {"seq": 12, "op": "add", "rows": [...]}
+    {"seq": 13, "op": "status", "order_ids": [...], "status": "Delivered"}
+    {"seq": 14, "op": "expenses", "rows": [{"Date": ..., "Expense": ..., "Amount Cents": ...}]}
+    {"seq": 15, "op": "remits", "rows": [{"Date": ..., "Type of Remit": ..., "Cash Amount Cents": ...}]}
+
+Writes only append a line to the tail, which is the write-ahead journal:
+the line is fsynced before the write returns (durable.py), and every data
+file derived from it is replaced atomically. recover() runs at startup and
+cuts off a line a crashed writer left half written. Reads take the
+partitions a query can need (by date range or Order ID, using the
+manifest) and replay the tail on top; the result is cached per process and
+only the new tail lines are replayed on the next read.
+
+compact() folds the tail into the partitions it touches (normally just the
+current month) and swaps in a new manifest with os.replace. The manifest
+remembers the last seq it contains, so a crash between swapping it and
+trimming the tail never applies an event twice. Expense and remittance
+entries made in the portal are appended to Expenses.xlsx / MoneyMatters.xlsx
+by the same compaction; each workbook records the last seq it holds (see
+schema.append_rows). start_compactor() runs compact() from a daemon thread.
+
+Closed years can be moved out of the hot stores into the cold archive
+(archive.py) with `python storage.py archive`: their month partitions are
+replaced by one read-only archived partition, their expense and remittance
+rows leave the workbooks, and the monthly summaries read their precomputed
+totals instead. An archived year is only unpickled when a query reaches
+back into it (a date range, an Order ID in its range, an unfiltered list).
+"""
+import json
+import logging
+import os
+import re
+import sqlite3
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date
+
+import durable
+import ordertable
+from archive import TOTAL_COLUMNS, Archive, year_months
+from lazyimport import lazy_import
+from money import to_cents
+from ordertable import DATE_FMT
+from partitions import PartitionDir, split_by_month
+from schema import append_rows, columns_of, read_workbook, read_workbooks, workbook_seq
+
+pd = lazy_import("pandas")
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to in-process locking only
+    fcntl = None
+
+# Money is integer cents everywhere below; the workbooks hold dollars
+EXPENSE_COLUMNS = ["Date", "Expense", "Amount Cents"]
+REMIT_COLUMNS = ["Date", "Type of Remit", "Cash Amount Cents"]
+ENTRY_COLUMNS = {"expenses": EXPENSE_COLUMNS, "remits": REMIT_COLUMNS}
+LISTING_COLUMNS = ["Order ID", "Date_parsed", "Customer", "Status", "Order Total Cents", "Line Count"]
+BASE_ORDER_NUM = 1000
+
+log = logging.getLogger(__name__)
+
+
+def build_monthly_sum(df, amt_col, new_col, exclude_cancelled=False):
+    """
+    Helper to aggregate a single dataframe into:
+    Year, MonthNum, Month, <new_col>
+
+    - df:        input DataFrame
+    - amt_col:   integer cents column to sum (e.g., 'Amount Cents')
+    - new_col:   output column name (e.g., 'total_revenue')
+    - exclude_cancelled: if True, filter out Status == 'cancelled'
+    """
+    if df.empty:
+        # Return empty frame with expected columns
+        return pd.DataFrame(columns=["Year", "MonthNum", "Month", new_col])
+
+    df = df.copy()
+
+    if exclude_cancelled and "Status" in df.columns:
+        df = df[df["Status"].astype(str).str.lower() != "cancelled"].copy()
+
+    # Parse Date (mm/dd/yyyy)
+    df["Date"] = pd.to_datetime(df["Date"], format=DATE_FMT)
+
+    df["Year"] = df["Date"].dt.year
+    df["MonthNum"] = df["Date"].dt.month
+    df["Month"] = df["Date"].dt.strftime("%b")
+
+    grouped = (
+        df.groupby(["Year", "MonthNum", "Month"])
+          .agg(**{new_col: (amt_col, "sum")})
+          .reset_index()
+    )
+
+    return grouped
+
+
+def _parse_day(value):
+    """YYYY-MM-DD (or anything pandas understands) -> Timestamp, else None."""
+    if not value:
+        return None
+    ts = pd.to_datetime(value, errors="coerce")
+    return None if pd.isna(ts) else ts.normalize()
+
+
+def _day_number(value):
+    """YYYY-MM-DD -> int day number for the compact table, else None."""
+    return None if not value else ordertable.day_number(value)
+
+
+class OrderStore:
+    def __init__(self, excel_file, entry_files=None):
+        root, _ = os.path.splitext(excel_file)
+        self.excel_file = excel_file
+        # "expenses"/"remits" -> workbook that compaction appends their entries to
+        self.entry_files = dict(entry_files or {})
+        self.snapshot_file = root + ".snapshot.pkl"   # single-file snapshot (older layout)
+        self.parts = PartitionDir(root + ".parts")
+        self.tail_file = root + ".tail.jsonl"
+        self.lock_file = root + ".lock"
+        self.compact_lock_file = root + ".compact.lock"
+
+        self._thread_locks = {
+            self.lock_file: threading.RLock(),
+            self.compact_lock_file: threading.RLock(),
+        }
+        self._lock_depth = {}
+        # Base + tail as last read: signature, base seq, tail offset, tail events, last seq
+        self._state = None
+        self._legacy = None   # (signature, table, seq) for a single-file base
+        self._manifest = None  # manifest of the current partitioned base
+        self._views = {}      # selected partition names -> (last seq applied, table)
+        self._sizes = {}      # id(table) -> (table, bytes) for cache_bytes
+        self._listeners = []
+
+    # ---------- locking ----------
+
+    @contextmanager
+    def _locked(self, path=None, blocking=True):
+        """
+        Hold the in-process lock for path and, where available, an flock on
+        it so other gunicorn workers are excluded too. Re-entrant per thread.
+        """
+        path = path or self.lock_file
+        lock = self._thread_locks[path]
+        if not lock.acquire(blocking=blocking):
+            yield False
+            return
+        depth = self._lock_depth.get(path, 0)
+        self._lock_depth[path] = depth + 1
+        try:
+            if fcntl is None or depth:
+                yield True
+                return
+            with open(path, "a") as fh:
+                flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+                try:
+                    fcntl.flock(fh, flags)
+                except BlockingIOError:
+                    yield False
+                    return
+                try:
+                    yield True
+                finally:
+                    fcntl.flock(fh, fcntl.LOCK_UN)
+        finally:
+            self._lock_depth[path] = depth
+            lock.release()
+
+    # ---------- reading ----------
+
+    def exists(self):
+        return self.parts.exists() or any(
+            os.path.exists(p) for p in (self.snapshot_file, self.excel_file, self.tail_file)
+        )
+
+    def partitioned(self):
+        return self.parts.exists()
+
+    def _is_partitioned(self, signature):
+        return signature is not None and signature[0] == self.parts.manifest_file
+
+    def _base_signature(self):
+        signature = self.parts.signature()
+        if signature is not None:
+            return signature
+        for path in (self.snapshot_file, self.excel_file):
+            if os.path.exists(path):
+                st = os.stat(path)
+                return (path, st.st_mtime_ns, st.st_size)
+        return None
+
+    def _read_base(self, signature):
+        """Return (compact table, last seq already folded into it) for a single-file base."""
+        if signature is None:
+            return ordertable.empty_table(), 0
+        path = signature[0]
+        if path == self.snapshot_file:
+            df = pd.read_pickle(path)
+            last_seq = int(df.attrs.get("last_seq", 0))
+            if "Day" not in df.columns:  # snapshot written before the compact layout
+                df = ordertable.compact_orders(df)
+            return df, last_seq
+        return ordertable.compact_orders(read_workbook(path, "orders")), 0
+
+    def _legacy_base(self, signature):
+        if self._legacy is None or self._legacy[0] != signature:
+            table, seq = self._read_base(signature)
+            self._legacy = (signature, table, seq)
+        return self._legacy
+
+    def _read_tail(self, start, end=None):
+        """Return (events, new offset) for complete lines in [start, end)."""
+        if not os.path.exists(self.tail_file):
+            return [], 0
+        with open(self.tail_file, "rb") as fh:
+            fh.seek(start)
+            data = fh.read() if end is None else fh.read(end - start)
+        # Ignore a trailing partial line; it will be picked up next time
+        used = data.rfind(b"\n") + 1
+        events = [json.loads(line) for line in data[:used].splitlines() if line.strip()]
+        return events, start + used
+
+    @staticmethod
+    def _apply(table, events, last_seq):
+        """Replay tail events newer than last_seq onto the compact table."""
+        added = []
+        for ev in events:
+            if ev["seq"] <= last_seq:
+                continue
+            last_seq = ev["seq"]
+            if ev["op"] == "add":
+                added.extend(ev["rows"])
+            elif ev["op"] == "status":
+                table = ordertable.append_rows(table, added)
+                added = []
+                mask = ordertable.order_mask(table, ev["order_ids"])
+                table = ordertable.set_status(table, mask, ev["status"])
+        return ordertable.append_rows(table, added), last_seq
+
+    def _sync(self):
+        """
+        Bring the base signature and the tail events up to date and return
+        the state tuple (signature, base seq, offset, events, last seq).
+        Must be called with the store lock held.
+        """
+        signature = self._base_signature()
+        state = self._state
+        seen_seq = state[4] if state is not None else None
+        tail_size = self.tail_size()
+        if state is None or state[0] != signature or tail_size < state[2]:
+            # New base (or the tail was trimmed by a compaction elsewhere)
+            if self._is_partitioned(signature):
+                self._manifest = self.parts.read_manifest()
+                base_seq = self._manifest["last_seq"]
+            elif signature is not None and signature[0] == self.excel_file:
+                base_seq = 0   # orders.xlsx holds no tail events; read it when needed
+            else:
+                base_seq = self._legacy_base(signature)[2]
+            state = (signature, base_seq, 0, [], base_seq)
+            self._views = {}
+
+        signature, base_seq, offset, events, last_seq = state
+        new, offset = self._read_tail(offset)
+        new = [ev for ev in new if ev["seq"] > last_seq]
+        if new:
+            events = events + new
+            last_seq = new[-1]["seq"]
+        self._state = (signature, base_seq, offset, events, last_seq)
+
+        # Tell listeners about every event this process has not seen yet,
+        # whichever worker wrote it
+        if seen_seq is not None:
+            for ev in new:
+                if ev["seq"] > seen_seq:
+                    self._publish(ev)
+        return self._state
+
+    def _table(self, from_day=None, to_day=None, order_nums=None, archived=True):
+        """(compact table, last seq), reading only the partitions the selection needs."""
+        with self._locked():
+            signature, base_seq, _, events, last_seq = self._sync()
+            if self._is_partitioned(signature):
+                manifest = self._manifest
+                names = tuple(self.parts.select(manifest, from_day, to_day, order_nums, archived))
+                base = lambda: ordertable.concat_tables(self.parts.load(manifest, names))
+            else:
+                names = ("*",)
+                base = lambda: self._legacy_base(signature)[1]
+
+            applied, table = self._views.pop(names, (None, None))
+            if table is None:
+                table, applied = base(), base_seq
+            if applied < last_seq:
+                # Only the tail events this view has not seen yet
+                table, applied = self._apply(table, events, applied)
+            self._views[names] = (applied, table)
+            if len(self._views) > 8:
+                self._views.pop(next(iter(self._views)))  # least recently used
+            return table, last_seq
+
+    def _current(self):
+        """The whole table, up to date, and its last seq."""
+        return self._table()
+
+    def hot_table(self):
+        """(table without the archived partitions, their years, last seq)."""
+        with self._locked():
+            table, last_seq = self._table(archived=False)
+            years = []
+            if self._is_partitioned(self._state[0]):
+                parts = self._manifest["partitions"]
+                years = sorted(int(name) for name, p in parts.items() if p.get("archived"))
+        return table, years, last_seq
+
+    def archived_table(self, year):
+        """Lines of one archived year, from its archived partition (empty if none)."""
+        with self._locked():
+            if not self._is_partitioned(self._sync()[0]):
+                return ordertable.empty_table()
+            manifest = self._manifest
+            part = manifest["partitions"].get(str(year))
+            if part is None or not part.get("archived"):
+                return ordertable.empty_table()
+            return ordertable.concat_tables(self.parts.load(manifest, [str(year)]))
+
+    def cache_bytes(self):
+        """
+        Memory held by the cached order tables and month partitions. Called
+        after every request (tenants.Kitchens.release), so it takes no lock:
+        it sizes a copy of the cache lists, and each table only once.
+        """
+        legacy = self._legacy
+        tables = [t for _, t in list(self._views.values())] + self.parts.cached()
+        if legacy is not None:
+            tables.append(legacy[1])
+        sizes = {}
+        for t in tables:
+            known = self._sizes.get(id(t))
+            # The memo holds the table, so its id cannot be reused meanwhile
+            sizes[id(t)] = known if known is not None and known[0] is t else (t, ordertable.memory_bytes(t))
+        self._sizes = sizes
+        return sum(size for _, size in sizes.values())
+
+    def release_caches(self):
+        """Drop the cached tables; the next read loads what it needs again."""
+        with self._locked():
+            self._state = None
+            self._legacy = None
+            self._manifest = None
+            self._views = {}
+            self._sizes = {}
+            self.parts.release()
+
+    def subscribe(self, listener):
+        """Call listener(event) for each new tail event (see module docstring)."""
+        self._listeners.append(listener)
+
+    def _publish(self, event):
+        for listener in self._listeners:
+            listener(event)
+
+    def data_version(self):
+        """Seq of the newest event folded in; bumps by one per write."""
+        with self._locked():
+            return self._sync()[4]
+
+    def table(self, from_day=None, to_day=None, order_ids=None, archived=True):
+        """
+        The compact order table (see ordertable.py); treat it as read-only.
+        With a day range or order IDs only the partitions that can hold
+        matching lines are read, so callers must still filter the rows.
+        archived=False leaves out the years moved to the cold archive.
+        """
+        nums = None
+        if order_ids is not None:
+            _, nums = ordertable.split_order_ids(list(order_ids))
+            nums = [int(n) for n in nums]
+        table, _ = self._table(from_day, to_day, nums, archived)
+        return table
+
+    def load(self):
+        """Return all order lines as a workbook-shaped DataFrame."""
+        return ordertable.expand_orders(self.table())
+
+    def next_order_id(self):
+        """HK<highest numeric part of Order ID + 1>, starting at HK1000."""
+        with self._locked():
+            signature, _, _, events, _ = self._sync()
+            if self._is_partitioned(signature):
+                # The manifest knows each partition's highest number
+                parts = self._manifest["partitions"].values()
+                highest = max((p["max_num"] for p in parts), default=-1)
+            elif (signature is not None and signature[0] == self.excel_file
+                  and (self._legacy is None or self._legacy[0] != signature)):
+                # Only the Order ID column of an unread orders.xlsx is needed
+                ids = read_workbook(self.excel_file, "orders", ["Order ID"])["Order ID"].dropna()
+                nums = ordertable.split_order_ids(ids.values)[1] if len(ids) else []
+                highest = int(nums.max()) if len(nums) else -1
+            else:
+                nums = self._legacy_base(signature)[1]["Order Num"].values
+                highest = int(nums.max()) if len(nums) else -1
+            added = [r["Order ID"] for ev in events if ev["op"] == "add" for r in ev["rows"]]
+            if added:
+                _, nums = ordertable.split_order_ids(added)
+                highest = max(highest, int(nums.max()))
+        return f"HK{highest + 1 if highest >= 0 else BASE_ORDER_NUM}"
+
+    def entries(self, kind, after_seq=0):
+        """Expense/remittance rows still in the tail, newer than after_seq."""
+        with self._locked():
+            events = self._sync()[3]
+        return [r for ev in events if ev["op"] == kind and ev["seq"] > after_seq for r in ev["rows"]]
+
+    # ---------- writing ----------
+
+    def _append_event(self, event):
+        last_seq = self._sync()[4]
+        event = dict(event, seq=last_seq + 1)
+        # The tail is the journal: the event is on disk before the write returns
+        with open(self.tail_file, "a+b") as fh:
+            durable.append_line(fh, (json.dumps(event) + "\n").encode("utf-8"))
+        return event
+
+    def append_order(self, rows):
+        """
+        Allocate the next Order ID, stamp it on every row and append the
+        rows to the tail. Returns the new Order ID.
+        """
+        with self._locked():
+            order_id = self.next_order_id()
+            rows = [dict(r, **{"Order ID": order_id}) for r in rows]
+            self._append_event({"op": "add", "rows": rows})
+        return order_id
+
+    def append_entry(self, kind, row):
+        """Append one expense or remittance row (see ENTRY_COLUMNS) to the tail."""
+        if kind not in self.entry_files:
+            raise ValueError(f"Unknown entry kind {kind!r}")
+        with self._locked():
+            return self._append_event({"op": kind, "rows": [row]})["seq"]
+
+    def set_status(self, order_ids, status):
+        """
+        Set Status for every line of the given orders with one tail event.
+        Returns the number of orders that exist and were updated (archived
+        years are read-only, so their orders are never updated).
+        """
+        order_ids = sorted({str(o) for o in order_ids})
+        with self._locked():
+            table = self.table(order_ids=order_ids, archived=False)
+            mask = ordertable.order_mask(table, order_ids)
+            found = sorted(set(ordertable.order_ids(table[mask])))
+            if found:
+                self._append_event({"op": "status", "order_ids": found, "status": status})
+        return len(found)
+
+    # ---------- recovery ----------
+
+    def recover(self):
+        """
+        Startup check after a crash or a killed worker: cut off a journal
+        record that was only half written, delete the files an interrupted
+        compaction left behind, and replay the journal so a damaged store
+        fails here rather than on a request. Returns the data version.
+        """
+        with self._locked(self.compact_lock_file, blocking=False) as acquired:
+            if acquired:  # no compaction is running, so no temp file is in use
+                leftovers = [self.tail_file + ".tmp", self.excel_file + ".tmp.xlsx"]
+                leftovers += [path + ".tmp.xlsx" for path in self.entry_files.values()]
+                for path in leftovers:
+                    if os.path.exists(path):
+                        os.remove(path)
+                if self.parts.exists():
+                    self.parts.remove(self.parts.unreferenced(self.parts.read_manifest()))
+        with self._locked():
+            if os.path.exists(self.tail_file):
+                with open(self.tail_file, "r+b") as fh:
+                    durable.drop_torn_record(fh)
+            return self._sync()[4]
+
+    # ---------- compaction ----------
+
+    def tail_size(self):
+        return os.path.getsize(self.tail_file) if os.path.exists(self.tail_file) else 0
+
+    def compact(self, export_xlsx=False):
+        """
+        Fold the tail into the month partitions, rewriting only the months
+        it touches. A single-file base (orders.xlsx or an older snapshot) is
+        split into partitions on the first run.
+        Writers are only blocked while the manifest and tail are swapped.
+        Returns True if a compaction was done.
+        """
+        with self._locked(self.compact_lock_file, blocking=False) as acquired:
+            if not acquired:
+                return False  # another worker is already compacting
+
+            with self._locked():
+                signature = self._base_signature()
+                cutoff = self.tail_size()
+            partitioned = self._is_partitioned(signature)
+            if cutoff == 0 and (partitioned or signature is None):
+                return False
+
+            events, cutoff = self._read_tail(0, cutoff)
+            if partitioned:
+                manifest = self.parts.read_manifest()
+                base_seq = manifest["last_seq"]
+                events = [ev for ev in events if ev["seq"] > base_seq]
+                names = self._touched(manifest, events)
+                base = ordertable.concat_tables(self.parts.load(manifest, names))
+            else:
+                manifest = None
+                base, base_seq = self._read_base(signature)
+            merged, last_seq = self._apply(base, events, base_seq)
+            new_manifest, replaced = self.parts.write(manifest, split_by_month(merged), last_seq)
+            workbooks = self._fold_entries(events)
+
+            with self._locked():
+                # Keep whatever was appended while we were merging
+                with open(self.tail_file, "a+b") as fh:
+                    fh.seek(cutoff)
+                    rest = fh.read()
+                # Workbooks first: each one knows the last seq it holds
+                for tmp, path in workbooks:
+                    durable.replace(tmp, path)
+                self.parts.swap(new_manifest)
+                with durable.atomic_path(self.tail_file) as tail_tmp:
+                    with open(tail_tmp, "wb") as fh:
+                        fh.write(rest)
+                if not partitioned and os.path.exists(self.snapshot_file):
+                    os.remove(self.snapshot_file)
+            self.parts.remove(replaced)
+
+            if export_xlsx:
+                self.export_xlsx()
+        return True
+
+    def _fold_entries(self, events):
+        """
+        Write the expense/remittance entries among `events` into copies of
+        their workbooks. Returns [(copy, workbook)] for compact() to swap in.
+        """
+        out = []
+        for kind, path in self.entry_files.items():
+            done = workbook_seq(path)
+            new = [ev for ev in events if ev["op"] == kind and ev["seq"] > done]
+            if not new:
+                continue
+            rows = [_entry_to_workbook(kind, r) for ev in new for r in ev["rows"]]
+            tmp = path + ".tmp.xlsx"
+            append_rows(path, kind, rows, new[-1]["seq"], tmp)
+            out.append((tmp, path))
+        return out
+
+    @staticmethod
+    def _touched(manifest, events):
+        """Partitions a batch of tail events can change."""
+        names = set()
+        nums = []
+        for ev in events:
+            if ev["op"] == "add":
+                days = [ordertable.day_number(r.get("Date")) for r in ev["rows"]]
+                days = [ordertable.NO_DAY if d is None else d for d in days]
+                names.update(ordertable.month_keys(days))
+            elif ev["op"] == "status":
+                _, found = ordertable.split_order_ids(ev["order_ids"])
+                nums.extend(int(n) for n in found)
+        if nums:
+            names.update(PartitionDir.select(manifest, order_nums=nums, archived=False))
+        return sorted(
+            n for n in names
+            if n in manifest["partitions"] and not manifest["partitions"][n].get("archived")
+        )
+
+    # ---------- archiving ----------
+
+    @staticmethod
+    def _year_parts(manifest, year):
+        return sorted(
+            name for name, p in manifest["partitions"].items()
+            if name.startswith(f"{year}-") and not p.get("archived")
+        )
+
+    def year_table(self, year):
+        """Lines of one calendar year still in the month partitions."""
+        if not self.partitioned():
+            return ordertable.empty_table()
+        manifest = self.parts.read_manifest()
+        names = self._year_parts(manifest, year)
+        if not names:
+            return ordertable.empty_table()
+        return ordertable.concat_tables(self.parts.load(manifest, names))
+
+    def retire_year(self, year, archive):
+        """
+        Swap the month partitions of an archived year for its archive file
+        in the manifest. Returns True if the manifest changed.
+        """
+        with self._locked():
+            if not self.partitioned():
+                return False
+            manifest = self.parts.read_manifest()
+            names = self._year_parts(manifest, year)
+            table = archive.load(year, "orders")
+            if not names or table is None:
+                return False
+            new_manifest, replaced = self.parts.write(manifest, {}, manifest["last_seq"], remove=names)
+            new_manifest = self.parts.add_archived(new_manifest, str(year), archive.file(year, "orders"), table)
+            self.parts.swap(new_manifest)
+        self.parts.remove(replaced)
+        return True
+
+    def export_xlsx(self, table=None):
+        """Regenerate orders.xlsx (for the owners who open it in Excel) without the archived years."""
+        df = ordertable.to_workbook(ordertable.expand_orders(
+            self.table(archived=False) if table is None else table
+        ))
+        with durable.atomic_path(self.excel_file, ".tmp.xlsx") as tmp:
+            df.to_excel(tmp, index=False)
+
+
+def start_compactor(store, interval, min_tail_bytes=64 * 1024, export_xlsx=False):
+    """
+    Run store.compact() every `interval` seconds in a daemon thread once the
+    tail has grown past min_tail_bytes. Returns the thread.
+    """
+    def loop():
+        while True:
+            time.sleep(interval)
+            try:
+                # A single-file base is split into month partitions right away
+                if store.tail_size() >= min_tail_bytes or not store.partitioned():
+                    store.compact(export_xlsx=export_xlsx)
+            except Exception:  # keep the thread alive; try again next round
+                log.exception("compaction failed")
+
+    t = threading.Thread(target=loop, name="order-compactor", daemon=True)
+    t.start()
+    return t
+
+
+# =====================================================================
+# Storage backends
+# =====================================================================
+
+class Storage:
+    """
+    What the portal needs from persistence.
+
+    Subclasses must provide exists(), load_orders(), load_expenses(),
+    load_remits(), next_order_id(), append_order(), set_status(),
+    append_entry(), data_version() and subscribe().
+    load_expenses(from_day, to_day, archived) and load_remits(...) take the
+    same kind of hints as order_table: rows outside them may be returned too.
+    The query helpers below work on the loaded frames; backends that can
+    answer them more cheaply (SqliteStorage) override them.
+
+    data_version() is an integer that goes up by one on every write (orders,
+    status changes, expenses and remittances).
+    subscribe(listener) registers listener(event) to be called with each
+    write as it is committed, carrying the same "seq" as data_version():
+        {"seq": 12, "op": "add", "rows": [...]}
+        {"seq": 13, "op": "status", "order_ids": [...], "status": "Delivered"}
+        {"seq": 14, "op": "expenses", "rows": [{"Date": "12/03/2025", "Expense": ..., "Amount Cents": ...}]}
+        {"seq": 15, "op": "remits", "rows": [{"Date": ..., "Type of Remit": ..., "Cash Amount Cents": ...}]}
+    """
+
+    # ---------- maintenance ----------
+
+    def start_background(self):
+        """Start backend housekeeping threads, if any."""
+
+    def cache_bytes(self):
+        """Memory held by in-process caches (see release_caches)."""
+        return 0
+
+    def release_caches(self):
+        """Drop in-process caches; they are rebuilt on demand."""
+
+    def snapshot(self):
+        """(order table, data version) read consistently with each other."""
+        while True:
+            version = self.data_version()
+            table = self.order_table()
+            if self.data_version() == version:
+                return table, version
+
+    def hot_snapshot(self):
+        """
+        (order table without the archived years, {year: archive.order_rollup}
+        for those years, data version): what the live indexes are built
+        from, so building them never opens the archive.
+        """
+        table, version = self.snapshot()
+        return table, {}, version
+
+    def archived_order_table(self, year):
+        """Compact order table of one archived year (empty if none)."""
+        return ordertable.empty_table()
+
+    # ---------- queries ----------
+
+    def order_table(self, from_day=None, to_day=None, order_ids=None, archived=True):
+        """
+        Order lines in the compact layout of ordertable.py. The arguments
+        are hints: a backend may return only the lines that can match them
+        (and may return more), so callers still filter. archived=False may
+        leave out the years moved to the cold archive.
+        """
+        return ordertable.compact_orders(self.load_orders())
+
+    def _filtered(self, from_date="", to_date="", customer="", status=""):
+        from_day, to_day = _day_number(from_date), _day_number(to_date)
+        table = self.order_table(from_day, to_day)
+        mask = ordertable.filter_mask(table, from_day, to_day, customer, status)
+        return table[mask]
+
+    def find_order(self, order_id):
+        """All lines of one order (empty frame if unknown)."""
+        table = self.order_table(order_ids=[order_id])
+        return ordertable.expand_orders(table[ordertable.order_mask(table, [order_id])])
+
+    def list_orders(self, from_date="", to_date="", customer="", status=""):
+        """
+        One row per order matching the dashboard filters, with columns
+        Order ID, Date_parsed, Customer, Status, Order Total Cents, Line Count.
+        """
+        table = self._filtered(from_date, to_date, customer, status)
+        if table.empty:
+            return pd.DataFrame(columns=LISTING_COLUMNS)
+        grouped = (
+            table.groupby(["Order Prefix", "Order Num"], observed=True, sort=False)
+              .agg(**{
+                  "Day": ("Day", "max"),
+                  "Customer": ("Customer", "first"),
+                  "Status": ("Status", "first"),
+                  "Order Total Cents": ("Line Total Cents", "sum"),
+                  "Line Count": ("Item", "size"),
+              })
+              .reset_index()
+        )
+        return pd.DataFrame({
+            "Order ID": ordertable.order_ids(grouped),
+            "Date_parsed": ordertable.from_day_numbers(grouped["Day"].values).values,
+            "Customer": grouped["Customer"].astype(str).values,
+            "Status": grouped["Status"].astype(str).values,
+            "Order Total Cents": grouped["Order Total Cents"].values,
+            "Line Count": grouped["Line Count"].values,
+        })
+
+    def order_summary(self, from_date="", to_date="", customer=""):
+        """
+        Totals over non-cancelled orders matching the date/customer filters
+        (total_revenue in cents).
+        """
+        table = self._filtered(from_date, to_date, customer, "not_cancelled")
+        if table.empty:
+            return {"total_orders": 0, "total_revenue": 0, "total_items": 0}
+        orders = table[["Order Prefix", "Order Num"]].drop_duplicates()
+        return {
+            "total_orders": int(len(orders)),
+            "total_revenue": int(table["Line Total Cents"].sum()),
+            "total_items": int(table["Count"].sum()),
+        }
+
+    def daily_totals(self, year, month):
+        """
+        Per-day revenue and order count (cancelled excluded) for one month.
+        Columns: Date (datetime.date), total_cents, order_count.
+        """
+        start = _day_number(f"{year:04d}-{month:02d}-01")
+        end = _day_number(f"{year + (month == 12):04d}-{month % 12 + 1:02d}-01") - 1
+        table = self.order_table(start, end)
+        table = table[ordertable.filter_mask(table, start, end, "", "not_cancelled")]
+        if table.empty:
+            return pd.DataFrame(columns=["Date", "total_cents", "order_count"])
+        per_day = table.groupby("Day").agg(total_cents=("Line Total Cents", "sum"))
+        per_day["order_count"] = (
+            table[["Day", "Order Prefix", "Order Num"]].drop_duplicates().groupby("Day").size()
+        )
+        per_day = per_day.reset_index()
+        per_day.insert(0, "Date", ordertable.from_day_numbers(per_day.pop("Day").values).dt.date.values)
+        return per_day
+
+    def monthly_sum(self, source):
+        """
+        Monthly totals in cents for "orders" (revenue, cancelled excluded),
+        "expenses" or "remits" as Year, MonthNum, Month, total_<x>.
+        """
+        if source == "orders":
+            return _monthly_revenue(self._filtered(status="not_cancelled"))
+        if source == "expenses":
+            return build_monthly_sum(self.load_expenses(), "Amount Cents", "total_expense")
+        if source == "remits":
+            return build_monthly_sum(self.load_remits(), "Cash Amount Cents", "total_cash")
+        raise ValueError(f"Unknown source {source!r}")
+
+    def monthly_sums(self, sources):
+        """{source: monthly_sum(source)} for several sources at once."""
+        return {source: self.monthly_sum(source) for source in sources}
+
+    def archived_orders(self, order_ids):
+        """{Order ID: year} for those of the orders held in the read-only archive."""
+        return {}
+
+    def archived_year(self, order_id):
+        """Year of the read-only archive holding this order, or None."""
+        return self.archived_orders([order_id]).get(order_id)
+
+
+def _monthly_revenue(table):
+    """Monthly revenue (cents) of already-filtered order lines."""
+    table = table[table["Day"] != ordertable.NO_DAY]
+    if table.empty:
+        return pd.DataFrame(columns=["Year", "MonthNum", "Month", "total_revenue"])
+    month = ordertable.from_day_numbers(table["Day"].values).dt.to_period("M").values
+    grouped = table.groupby(month)["Line Total Cents"].sum()
+    return pd.DataFrame({
+        "Year": grouped.index.year,
+        "MonthNum": grouped.index.month,
+        "Month": grouped.index.strftime("%b"),
+        "total_revenue": grouped.values,
+    })
+
+
+def _from_workbook(df, amount_col, columns):
+    """Expense/remittance sheet -> storage frame with the amount in cents."""
+    df = df.dropna(subset=["Date"]).copy()
+    df[amount_col + " Cents"] = to_cents(df[amount_col]).values
+    return df[columns].reset_index(drop=True)
+
+
+def _sheet_columns(kind, amounts_only=False):
+    """Workbook columns to read for an expense/remittance frame."""
+    if not amounts_only:
+        return columns_of(kind)
+    name, _, amount = ENTRY_COLUMNS[kind]
+    return [name, amount[:-len(" Cents")]]
+
+
+def _entry_to_workbook(kind, row):
+    """Expense/remittance tail row -> workbook row (real date, dollars)."""
+    name, label, amount = ENTRY_COLUMNS[kind]
+    return {
+        name: pd.to_datetime(row[name], format=DATE_FMT).to_pydatetime(),
+        label: row[label],
+        amount[:-len(" Cents")]: int(row[amount]) / 100,
+    }
+
+
+def _file_signature(path):
+    """(inode, mtime, size) of a file, None if it does not exist."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def _in_years(df, years):
+    """Mask of expense/remittance rows dated in one of `years`."""
+    return year_months(df["Date"]).str[:4].isin([str(y) for y in years]).values
+
+
+class XlsxStorage(Storage):
+    """
+    The workbooks next to the app, with OrderStore handling order writes
+    and closed years in archive/ (see archive.py).
+    """
+
+    def __init__(self, excel_file, expense_file, remit_file):
+        self.orders = OrderStore(excel_file, {"expenses": expense_file, "remits": remit_file})
+        self.expense_file = expense_file
+        self.remit_file = remit_file
+        self.archive = Archive(os.path.join(os.path.dirname(os.path.abspath(excel_file)), "archive"))
+
+    def start_background(self):
+        self.orders.recover()
+        interval = int(os.environ.get("HK_COMPACT_INTERVAL", "300"))  # seconds, 0 = off
+        if interval > 0:
+            start_compactor(
+                self.orders,
+                interval,
+                min_tail_bytes=int(os.environ.get("HK_COMPACT_MIN_BYTES", str(64 * 1024))),
+                export_xlsx=os.environ.get("HK_COMPACT_EXPORT_XLSX", "1") == "1",
+            )
+
+    def exists(self):
+        return self.orders.exists()
+
+    def cache_bytes(self):
+        return self.orders.cache_bytes()
+
+    def release_caches(self):
+        self.orders.release_caches()
+        self.archive.release()
+
+    def order_table(self, from_day=None, to_day=None, order_ids=None, archived=True):
+        return self.orders.table(from_day, to_day, order_ids, archived)
+
+    def snapshot(self):
+        return self.orders._current()
+
+    def hot_snapshot(self):
+        table, years, version = self.orders.hot_table()
+        return table, {year: self.archive.rollup(year) for year in years}, version
+
+    def archived_order_table(self, year):
+        return self.orders.archived_table(year)
+
+    def data_version(self):
+        return self.orders.data_version()
+
+    def subscribe(self, listener):
+        self.orders.subscribe(listener)
+
+    def load_orders(self):
+        return self.orders.load()
+
+    def _workbooks(self, kinds, amounts_only=False):
+        """
+        {kind: rows in cents} for expenses ("expenses") and/or remittances
+        ("remits"): each workbook plus the entries still waiting in the
+        tail. Several workbooks are parsed in parallel (schema.read_workbooks).
+        amounts_only keeps just Date and the amount, all monthly sums need.
+        """
+        paths = {kind: self.orders.entry_files[kind] for kind in kinds}
+        while True:
+            # Parse without the store lock so writers in other workers are not
+            # held up; if compaction replaced a workbook meanwhile, read again
+            files = {kind: _file_signature(path) for kind, path in paths.items()}
+            raws = read_workbooks({
+                kind: (path, kind, _sheet_columns(kind, amounts_only))
+                for kind, path in paths.items() if files[kind] is not None
+            })
+            with self.orders._locked():
+                if any(_file_signature(path) != files[kind] for kind, path in paths.items()):
+                    continue
+                pending = {
+                    kind: self.orders.entries(kind, raws[kind].attrs.get("last_seq", 0) if kind in raws else 0)
+                    for kind in kinds
+                }
+            break
+        out = {}
+        for kind in kinds:
+            columns = ENTRY_COLUMNS[kind]
+            if amounts_only:
+                columns = (columns[0], columns[-1])
+            raw = raws.get(kind)
+            if raw is None:
+                raw = pd.DataFrame(columns=_sheet_columns(kind, amounts_only))
+            df = _from_workbook(raw, columns[-1][:-len(" Cents")], list(columns))
+            if pending[kind]:
+                tail = pd.DataFrame(pending[kind], columns=columns)
+                tail["Date"] = pd.to_datetime(tail["Date"], format=DATE_FMT)
+                df = tail if df.empty else pd.concat([df, tail], ignore_index=True)
+            out[kind] = df
+        return out
+
+    def _workbook(self, kind):
+        return self._workbooks([kind])[kind]
+
+    def _hot(self, kind, df=None):
+        """Workbook rows (df, read if not given) outside the archived years."""
+        if df is None:
+            df = self._workbook(kind)
+        years = self.archive.years()
+        if years and not df.empty:
+            df = df[~_in_years(df, years)].reset_index(drop=True)
+        return df
+
+    def _with_archive(self, kind, from_day=None, to_day=None, archived=True):
+        """Hot rows plus the archived years that overlap [from_day, to_day] (None = open)."""
+        years = [
+            y for y in (self.archive.years() if archived else [])
+            if (from_day is None or ordertable.day_number(f"{y}-12-31") >= from_day)
+            and (to_day is None or ordertable.day_number(f"{y}-01-01") <= to_day)
+        ]
+        frames = self.archive.frames(kind, years)
+        hot = self._hot(kind)
+        if not frames:
+            return hot
+        if not hot.empty:
+            frames.append(hot)
+        return pd.concat(frames, ignore_index=True)
+
+    def load_expenses(self, from_day=None, to_day=None, archived=True):
+        return self._with_archive("expenses", from_day, to_day, archived)
+
+    def load_remits(self, from_day=None, to_day=None, archived=True):
+        return self._with_archive("remits", from_day, to_day, archived)
+
+    def monthly_sums(self, sources):
+        """Same as Storage.monthly_sums, parsing the workbooks involved in parallel."""
+        sheets = self._workbooks([s for s in sources if s in ENTRY_COLUMNS], amounts_only=True)
+        return {source: self._monthly_sum(source, sheets.get(source)) for source in sources}
+
+    def monthly_sum(self, source):
+        return self.monthly_sums([source])[source]
+
+    def _monthly_sum(self, source, sheet=None):
+        """
+        Same as Storage.monthly_sum, but archived years come from their
+        precomputed monthly totals and are never loaded. sheet is the
+        already-read workbook for "expenses" / "remits".
+        """
+        if source not in TOTAL_COLUMNS:
+            return super().monthly_sum(source)
+        years = self.archive.years()
+        if source == "orders":
+            if not years:
+                return super().monthly_sum(source)
+            table = self.orders.table(archived=False)
+            hot = _monthly_revenue(table[ordertable.filter_mask(table, status="not_cancelled")])
+        else:
+            hot = build_monthly_sum(self._hot(source, sheet), ENTRY_COLUMNS[source][-1], TOTAL_COLUMNS[source])
+            if not years:
+                return hot
+        # Month partitions of a year whose archiving was interrupted are
+        # still hot; the archive totals already cover them
+        hot = hot[~hot["Year"].isin(years)]
+        frames = [f for f in (self.archive.monthly(source), hot) if not f.empty]
+        if len(frames) < 2:
+            return frames[0] if frames else hot
+        return (
+            pd.concat(frames, ignore_index=True)
+              .groupby(["Year", "MonthNum", "Month"], as_index=False)[TOTAL_COLUMNS[source]]
+              .sum()
+        )
+
+    def next_order_id(self):
+        return self.orders.next_order_id()
+
+    def append_order(self, rows):
+        return self.orders.append_order(rows)
+
+    def set_status(self, order_ids, status):
+        return self.orders.set_status(order_ids, status)
+
+    def archived_orders(self, order_ids):
+        years = set(self.archive.years())
+        order_ids = sorted({str(o) for o in order_ids})
+        if not years or not order_ids:
+            return {}
+        table = self.orders.table(order_ids=order_ids)
+        lines = table[ordertable.order_mask(table, order_ids) & (table["Day"].values != ordertable.NO_DAY)]
+        found = zip(ordertable.order_ids(lines), ordertable.from_day_numbers(lines["Day"].values).dt.year)
+        return {oid: int(year) for oid, year in found if int(year) in years}
+
+    def append_entry(self, kind, row):
+        """
+        Record one expense or remittance; it reaches the workbook on the
+        next compaction. Entries dated in an archived year are refused.
+        """
+        year = pd.to_datetime(row["Date"], format=DATE_FMT).year
+        if year in self.archive.years():
+            raise ValueError(f"{year} is archived")
+        return self.orders.append_entry(kind, row)
+
+    # ---------- archiving ----------
+
+    def closed_years(self):
+        """Years before the current one that still have hot data."""
+        years = set()
+        if self.orders.partitioned():
+            names = self.orders.parts.read_manifest()["partitions"]
+            years.update(int(n[:4]) for n in names if n[:4].isdigit() and "-" in n)
+        for df in self._workbooks(["expenses", "remits"], amounts_only=True).values():
+            months = year_months(df["Date"]).dropna()
+            years.update(int(m[:4]) for m in months)
+        return sorted(y for y in years if y < date.today().year)
+
+    def archive_year(self, year):
+        """
+        Move one closed year out of the hot stores into self.archive.
+        Writing the archive index is the commit point; the steps after it
+        (swapping the order partitions, trimming the workbooks) are repeated
+        by simply running this again if they were interrupted.
+        """
+        year = int(year)
+        if year >= date.today().year:
+            raise ValueError(f"{year} is not closed yet")
+        with self.orders._locked(self.orders.compact_lock_file):
+            if year not in self.archive.years():
+                self.orders.compact()
+                frames = {}
+                orders = self.orders.year_table(year)
+                if not orders.empty:
+                    frames["orders"] = orders
+                for kind, df in self._workbooks(["expenses", "remits"]).items():
+                    df = df[_in_years(df, [year])] if not df.empty else df
+                    if not df.empty:
+                        frames[kind] = df
+                if not frames:
+                    raise ValueError(f"Nothing recorded in {year}")
+                self.archive.write(year, frames)
+
+            if self.orders.retire_year(year, self.archive) and os.path.exists(self.orders.excel_file):
+                self.orders.export_xlsx()
+            self._trim_workbook(self.expense_file, "expenses", year)
+            self._trim_workbook(self.remit_file, "remits", year)
+
+    def _trim_workbook(self, path, workbook, year):
+        """
+        Drop an archived year's rows from a workbook, keeping a copy of the
+        original (hand-kept cells and all) next to the archived frames.
+        """
+        if not os.path.exists(path):
+            return
+        raw = read_workbook(path, workbook)
+        closed = _in_years(raw, [year]) if not raw.empty else []
+        if not any(closed):
+            return
+        backup = os.path.join(self.archive.path, str(year), os.path.basename(path))
+        if not os.path.exists(backup):
+            shutil.copy2(path, backup)
+        with durable.atomic_path(path, ".tmp.xlsx") as tmp:
+            raw[~closed].to_excel(tmp, index=False)
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS orders (
+    id         INTEGER PRIMARY KEY,
+    order_id   TEXT NOT NULL,
+    order_num  INTEGER,
+    date       TEXT,            -- ISO YYYY-MM-DD so ranges use the index
+    customer   TEXT,
+    item       TEXT,
+    price_cents      INTEGER,
+    count            INTEGER,
+    line_total_cents INTEGER,
+    status     TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_orders_order_id ON orders(order_id);
+CREATE INDEX IF NOT EXISTS idx_orders_order_num ON orders(order_num);
+CREATE INDEX IF NOT EXISTS idx_orders_date     ON orders(date);
+CREATE INDEX IF NOT EXISTS idx_orders_customer ON orders(customer COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS idx_orders_status   ON orders(status COLLATE NOCASE);
+
+CREATE TABLE IF NOT EXISTS expenses (
+    id      INTEGER PRIMARY KEY,
+    date    TEXT,
+    expense TEXT,
+    amount_cents INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_expenses_date ON expenses(date);
+
+CREATE TABLE IF NOT EXISTS remits (
+    id          INTEGER PRIMARY KEY,
+    date        TEXT,
+    remit_type  TEXT,
+    cash_amount_cents INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_remits_date ON remits(date);
+
+-- version: bumped in the same transaction as every order write
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value INTEGER
+);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 0);
+"""
+
+NOT_CANCELLED = "lower(coalesce(status, '')) != 'cancelled'"
+
+ORDER_SELECT = """
+    order_id AS "Order ID", date AS "Date", customer AS "Customer", item AS "Item",
+    price_cents AS "Price Cents", count AS "Count", line_total_cents AS "Line Total Cents",
+    status AS "Status"
+"""
+ORDER_INSERT = """INSERT INTO orders
+    (order_id, order_num, date, customer, item, price_cents, count, line_total_cents, status)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"""
+
+# Databases created before money moved to cents stored REAL dollar columns
+CENTS_UPGRADES = [
+    ("orders", "price", "price_cents"),
+    ("orders", "line_total", "line_total_cents"),
+    ("expenses", "amount", "amount_cents"),
+    ("remits", "cash_amount", "cash_amount_cents"),
+]
+
+
+class SqliteStorage(Storage):
+    """stdlib sqlite3 backend; filters and aggregates run as indexed SQL."""
+
+    def __init__(self, db_file):
+        self.db_file = db_file
+        self._local = threading.local()
+        self._listeners = []
+        with self._conn() as conn:
+            conn.executescript(SQLITE_SCHEMA)
+            self._upgrade_schema(conn)
+
+    @staticmethod
+    def _upgrade_schema(conn):
+        """Add and fill the *_cents columns on databases that predate them."""
+        for table, old, new in CENTS_UPGRADES:
+            columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+            if new not in columns:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {new} INTEGER")
+                conn.execute(f"UPDATE {table} SET {new} = CAST(ROUND({old} * 100) AS INTEGER)")
+
+    def _conn(self):
+        """One connection per thread (sqlite3 connections are not shareable)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_file, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _frame(self, sql, params=()):
+        return pd.read_sql_query(sql, self._conn(), params=params)
+
+    # ---------- primitives ----------
+
+    def exists(self):
+        return self._conn().execute("SELECT 1 FROM orders LIMIT 1").fetchone() is not None
+
+    def data_version(self):
+        return self._conn().execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+
+    def subscribe(self, listener):
+        self._listeners.append(listener)
+
+    def _bump_version(self, conn):
+        """Increment the data version inside the caller's transaction."""
+        conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+        return conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+
+    def _publish(self, event):
+        for listener in self._listeners:
+            listener(event)
+
+    def load_orders(self):
+        df = self._frame(
+            f"""SELECT {ORDER_SELECT} FROM orders ORDER BY id"""
+        )
+        df["Date"] = pd.to_datetime(df["Date"]).dt.strftime(DATE_FMT)
+        return df
+
+    def load_expenses(self, from_day=None, to_day=None, archived=True):
+        df = self._frame(
+            'SELECT date AS "Date", expense AS "Expense", amount_cents AS "Amount Cents" FROM expenses ORDER BY id'
+        )
+        df["Date"] = pd.to_datetime(df["Date"])
+        return df
+
+    def load_remits(self, from_day=None, to_day=None, archived=True):
+        df = self._frame(
+            'SELECT date AS "Date", remit_type AS "Type of Remit", cash_amount_cents AS "Cash Amount Cents" '
+            "FROM remits ORDER BY id"
+        )
+        df["Date"] = pd.to_datetime(df["Date"])
+        return df
+
+    def next_order_id(self):
+        row = self._conn().execute("SELECT MAX(order_num) FROM orders").fetchone()
+        return f"HK{row[0] + 1 if row[0] is not None else BASE_ORDER_NUM}"
+
+    def append_order(self, rows):
+        conn = self._conn()
+        # BEGIN IMMEDIATE takes the write lock before we read MAX(order_num)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            order_id = self.next_order_id()
+            rows = [dict(r, **{"Order ID": order_id}) for r in rows]
+            conn.executemany(ORDER_INSERT, [_order_params(r) for r in rows])
+            seq = self._bump_version(conn)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self._publish({"seq": seq, "op": "add", "rows": rows})
+        return order_id
+
+    def set_status(self, order_ids, status):
+        order_ids = sorted({str(o) for o in order_ids})
+        if not order_ids:
+            return 0
+        conn = self._conn()
+        marks = ",".join("?" * len(order_ids))
+        with conn:
+            found = [r[0] for r in conn.execute(
+                f"SELECT DISTINCT order_id FROM orders WHERE order_id IN ({marks}) ORDER BY order_id", order_ids
+            )]
+            if not found:
+                return 0
+            conn.execute(f"UPDATE orders SET status = ? WHERE order_id IN ({marks})", [status] + order_ids)
+            seq = self._bump_version(conn)
+        self._publish({"seq": seq, "op": "status", "order_ids": found, "status": status})
+        return len(found)
+
+    def append_entry(self, kind, row):
+        sql = {
+            "expenses": "INSERT INTO expenses (date, expense, amount_cents) VALUES (?, ?, ?)",
+            "remits": "INSERT INTO remits (date, remit_type, cash_amount_cents) VALUES (?, ?, ?)",
+        }[kind]
+        _, label, amount = ENTRY_COLUMNS[kind]
+        conn = self._conn()
+        with conn:
+            conn.execute(sql, (_iso_day(row["Date"]), _none(row[label]), int(row[amount])))
+            seq = self._bump_version(conn)
+        self._publish({"seq": seq, "op": kind, "rows": [row]})
+        return seq
+
+    # ---------- indexed queries ----------
+
+    @staticmethod
+    def _where(from_date="", to_date="", customer="", status=""):
+        clauses, params = [], []
+        from_dt = _parse_day(from_date)
+        if from_dt is not None:
+            clauses.append("date >= ?")
+            params.append(from_dt.strftime("%Y-%m-%d"))
+        to_dt = _parse_day(to_date)
+        if to_dt is not None:
+            clauses.append("date <= ?")
+            params.append(to_dt.strftime("%Y-%m-%d"))
+        if customer:
+            clauses.append("customer LIKE ? ESCAPE '\\'")
+            escaped = customer.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            params.append(f"%{escaped}%")
+        if status == "not_cancelled":
+            clauses.append(NOT_CANCELLED)
+        elif status:
+            clauses.append("status = ? COLLATE NOCASE")
+            params.append(status)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def find_order(self, order_id):
+        df = self._frame(
+            f"""SELECT {ORDER_SELECT} FROM orders WHERE order_id = ? ORDER BY id""",
+            (str(order_id),),
+        )
+        df["Date"] = pd.to_datetime(df["Date"]).dt.strftime(DATE_FMT)
+        return df
+
+    def list_orders(self, from_date="", to_date="", customer="", status=""):
+        where, params = self._where(from_date, to_date, customer, status)
+        # Customer/Status come from the first line of each order, as in the xlsx backend
+        df = self._frame(
+            f"""SELECT order_id AS "Order ID", MAX(date) AS "Date_parsed",
+                       customer AS "Customer", status AS "Status",
+                       SUM(line_total_cents) AS "Order Total Cents", COUNT(*) AS "Line Count"
+                FROM orders{where} GROUP BY order_id""",
+            params,
+        )
+        df["Date_parsed"] = pd.to_datetime(df["Date_parsed"])
+        return df
+
+    def order_summary(self, from_date="", to_date="", customer=""):
+        where, params = self._where(from_date, to_date, customer, "not_cancelled")
+        orders, revenue, items = self._conn().execute(
+            f"SELECT COUNT(DISTINCT order_id), SUM(line_total_cents), SUM(count) FROM orders{where}", params
+        ).fetchone()
+        return {
+            "total_orders": int(orders or 0),
+            "total_revenue": int(revenue or 0),
+            "total_items": int(items or 0),
+        }
+
+    def daily_totals(self, year, month):
+        start = f"{year:04d}-{month:02d}-01"
+        end = f"{year + (month == 12):04d}-{month % 12 + 1:02d}-01"
+        df = self._frame(
+            f"""SELECT date AS "Date", SUM(line_total_cents) AS total_cents,
+                       COUNT(DISTINCT order_id) AS order_count
+                FROM orders WHERE date >= ? AND date < ? AND {NOT_CANCELLED}
+                GROUP BY date ORDER BY date""",
+            (start, end),
+        )
+        df["Date"] = pd.to_datetime(df["Date"]).dt.date
+        return df
+
+    def monthly_sum(self, source):
+        table, amount, new_col, where = {
+            "orders": ("orders", "line_total_cents", "total_revenue", f" WHERE {NOT_CANCELLED}"),
+            "expenses": ("expenses", "amount_cents", "total_expense", ""),
+            "remits": ("remits", "cash_amount_cents", "total_cash", ""),
+        }[source]
+        df = self._frame(
+            f"""SELECT CAST(substr(date, 1, 4) AS INTEGER) AS "Year",
+                       CAST(substr(date, 6, 2) AS INTEGER) AS "MonthNum",
+                       SUM({amount}) AS {new_col}
+                FROM {table}{where} GROUP BY 1, 2 ORDER BY 1, 2"""
+        )
+        df.insert(2, "Month", pd.to_datetime(dict(year=df["Year"], month=df["MonthNum"], day=1)).dt.strftime("%b"))
+        return df
+
+    # ---------- migration ----------
+
+    def import_frames(self, orders, expenses, remits):
+        """Replace all tables with the given frames (used by migrate_xlsx_to_sqlite)."""
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM orders")
+            conn.execute("DELETE FROM expenses")
+            conn.execute("DELETE FROM remits")
+            conn.executemany(
+                ORDER_INSERT,
+                [_order_params(r) for r in orders.to_dict("records")],
+            )
+            conn.executemany(
+                "INSERT INTO expenses (date, expense, amount_cents) VALUES (?, ?, ?)",
+                [(_iso_day(r["Date"]), _none(r["Expense"]), _none(r["Amount Cents"]))
+                 for r in expenses.to_dict("records") if _iso_day(r["Date"])],
+            )
+            conn.executemany(
+                "INSERT INTO remits (date, remit_type, cash_amount_cents) VALUES (?, ?, ?)",
+                [(_iso_day(r["Date"]), _none(r["Type of Remit"]), _none(r["Cash Amount Cents"]))
+                 for r in remits.to_dict("records") if _iso_day(r["Date"])],
+            )
+            self._bump_version(conn)
+
+
+def _none(value):
+    """NaN -> None, numpy scalars -> Python scalars (for sqlite3 params)."""
+    if value is None or (isinstance(value, float) and value != value) or value is pd.NaT:
+        return None
+    return value.item() if hasattr(value, "item") else value
+
+
+def _iso_day(value):
+    ts = pd.to_datetime(value, errors="coerce")
+    return None if pd.isna(ts) else ts.strftime("%Y-%m-%d")
+
+
+def _order_params(r):
+    m = re.search(r"(\d+)$", str(r["Order ID"]))
+    return (
+        str(r["Order ID"]),
+        int(m.group(1)) if m else None,
+        _iso_day(r["Date"]),
+        _none(r.get("Customer")),
+        _none(r.get("Item")),
+        _none(r.get("Price Cents")),
+        _none(r.get("Count")),
+        _none(r.get("Line Total Cents")),
+        _none(r.get("Status")),
+    )
+
+
+def migrate_xlsx_to_sqlite(excel_file, expense_file, remit_file, db_file):
+    """One-time copy of the workbooks (plus any unfolded order tail) into sqlite."""
+    src = XlsxStorage(excel_file, expense_file, remit_file)
+    dst = SqliteStorage(db_file)
+    orders = src.load_orders()
+    expenses = src.load_expenses() if os.path.exists(expense_file) else pd.DataFrame(columns=EXPENSE_COLUMNS)
+    remits = src.load_remits() if os.path.exists(remit_file) else pd.DataFrame(columns=REMIT_COLUMNS)
+    dst.import_frames(orders, expenses, remits)
+    return len(orders), len(expenses), len(remits)
+
+
+def check_data_dirs(data_dirs):
+    """
+    Refuse settings that would make several data directories share one
+    store: with HK_SQLITE_FILE set, every directory would open that one
+    database and their orders, entries and Order IDs would mix.
+    """
+    shared = os.environ.get("HK_STORAGE", "xlsx").lower() == "sqlite" and os.environ.get("HK_SQLITE_FILE")
+    if shared and len(set(data_dirs)) > 1:
+        raise ValueError(
+            "HK_SQLITE_FILE names one database for every kitchen; unset it so each "
+            "kitchen uses harryskitchen.db in its own directory"
+        )
+
+
+def open_storage(base_dir):
+    """
+    Pick the backend from HK_STORAGE ("xlsx", the default, or "sqlite").
+    The sqlite database defaults to <base_dir>/harryskitchen.db (HK_SQLITE_FILE).
+    """
+    kind = os.environ.get("HK_STORAGE", "xlsx").lower()
+    if kind == "sqlite":
+        return SqliteStorage(os.environ.get("HK_SQLITE_FILE", os.path.join(base_dir, "harryskitchen.db")))
+    if kind != "xlsx":
+        raise ValueError(f"Unknown HK_STORAGE {kind!r} (expected 'xlsx' or 'sqlite')")
+    return XlsxStorage(
+        os.path.join(base_dir, "orders.xlsx"),
+        os.path.join(base_dir, "Expenses.xlsx"),
+        os.path.join(base_dir, "MoneyMatters.xlsx"),
+    )
+
+
+if __name__ == "__main__":
+    import sys
+
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    if sys.argv[1:2] == ["migrate"]:
+        db_file = sys.argv[2] if len(sys.argv) > 2 else os.path.join(base_dir, "harryskitchen.db")
+        counts = migrate_xlsx_to_sqlite(
+            os.path.join(base_dir, "orders.xlsx"),
+            os.path.join(base_dir, "Expenses.xlsx"),
+            os.path.join(base_dir, "MoneyMatters.xlsx"),
+            db_file,
+        )
+        print(f"Migrated {counts[0]} order lines, {counts[1]} expenses, {counts[2]} remittances -> {db_file}")
+    elif sys.argv[1:2] == ["compact"]:
+        store = XlsxStorage(
+            os.path.join(base_dir, "orders.xlsx"),
+            os.path.join(base_dir, "Expenses.xlsx"),
+            os.path.join(base_dir, "MoneyMatters.xlsx"),
+        ).orders
+        store.compact()
+        print(f"{len(store.parts.read_manifest()['partitions'])} month partition(s) in {store.parts.path}")
+    elif sys.argv[1:2] == ["archive"]:
+        storage = XlsxStorage(
+            os.path.join(base_dir, "orders.xlsx"),
+            os.path.join(base_dir, "Expenses.xlsx"),
+            os.path.join(base_dir, "MoneyMatters.xlsx"),
+        )
+        years = [int(y) for y in sys.argv[2:]] or storage.closed_years()
+        for year in years:
+            storage.archive_year(year)
+            summary = storage.archive.summary(year)
+            counts = ", ".join(f"{summary[k]['rows']} {k}" for k in summary)
+            print(f"Archived {year}: {counts} -> {storage.archive.path}")
+        if not years:
+            print("No closed years to archive")
+    else:
+        print("usage: python storage.py migrate [db_file] | compact | archive [year ...]")
@@ -0,0 +1,155 @@
+"""
+Several kitchens served by one portal.
+
+Each kitchen has its own data directory (workbooks, order store, archive,
+menu.json) and its own Kitchen: the storage backend plus the live indexes
+built from it. The kitchens are listed in HK_KITCHENS:
+
+    HK_KITCHENS="main=/srv/hk/main,north=/srv/hk/north"
+
+Without it there is one kitchen, "default", in the app directory. A request
+is served for the kitchen in its /k/<name>/ URL prefix (KitchenPrefix), or
+else for the kitchen picked at login.
+
+The cached order tables and indexes of all kitchens share one memory
+budget (HK_CACHE_MB, default 512). After each request the least recently
+used kitchens drop their caches until the total fits again. A kitchen
+serving a request, and the most recently used one, are never dropped.
+Dropped caches are rebuilt from disk on the kitchen's next request. Index
+sizes are estimates (see LiveIndex.cache_bytes).
+"""
+import os
+import threading
+from collections import OrderedDict
+
+from feed import OrderFeed
+from indexes import DayTotals, InsightsIndex, ItemIndex, MonthlyTotals, OrderSearch, load_menu
+from querycache import QueryCache
+from storage import check_data_dirs, open_storage
+
+DASHBOARD_CACHE_SIZE = int(os.environ.get("HK_DASHBOARD_CACHE", "64"))
+DASHBOARD_ROW_BYTES = 400   # one listed order dict
+
+
+class Kitchen:
+    def __init__(self, name, data_dir):
+        self.name = name
+        self.data_dir = data_dir
+        self.excel_file = os.path.join(data_dir, "orders.xlsx")
+        self.expense_file = os.path.join(data_dir, "Expenses.xlsx")
+        self.remit_file = os.path.join(data_dir, "MoneyMatters.xlsx")
+        self.active = 0   # requests in flight
+
+        # All reads/writes go through the storage backend (HK_STORAGE=xlsx|sqlite)
+        self.store = open_storage(data_dir)
+        self.store.start_background()
+
+        # Indexes kept current from the store's write events
+        self.item_index = ItemIndex(load_menu(os.path.join(data_dir, "menu.json"))).attach(self.store)
+        self.insights_index = InsightsIndex().attach(self.store)
+        self.day_totals = DayTotals().attach(self.store)
+        self.monthly_totals = MonthlyTotals().attach(self.store)
+        self.order_search = OrderSearch().attach(self.store)
+        # Recent order events for /orders/stream
+        self.order_feed = OrderFeed().attach(self.store)
+        # Dashboard results per filter combination and data version
+        self.dashboard_cache = QueryCache(
+            DASHBOARD_CACHE_SIZE, lambda result: len(result[1]) * DASHBOARD_ROW_BYTES
+        )
+
+    def indexes(self):
+        return [self.item_index, self.insights_index, self.day_totals, self.monthly_totals, self.order_search]
+
+    def cache_bytes(self):
+        return (self.store.cache_bytes() + self.dashboard_cache.cache_bytes()
+                + sum(ix.cache_bytes() for ix in self.indexes()))
+
+    def release(self):
+        """Drop the cached tables, indexes and dashboard results."""
+        for ix in self.indexes():
+            ix.release()
+        self.dashboard_cache.clear()
+        self.store.release_caches()
+
+
+class Kitchens:
+    """
+    name -> Kitchen, each opened on its first request and kept in
+    least-recently-used order for the memory budget.
+    """
+
+    def __init__(self, data_dirs, budget_bytes):
+        self.data_dirs = dict(data_dirs)
+        check_data_dirs(self.data_dirs.values())
+        self.default = next(iter(self.data_dirs))
+        self.budget_bytes = budget_bytes
+        self._open = OrderedDict()   # name -> Kitchen, least recently used first
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, base_dir):
+        """Kitchens from HK_KITCHENS ("name=dir,..."), budget from HK_CACHE_MB."""
+        spec = os.environ.get("HK_KITCHENS", "").strip()
+        dirs = {}
+        for item in filter(None, (part.strip() for part in spec.split(","))):
+            name, sep, path = item.partition("=")
+            if not sep or not name.strip() or "/" in name:
+                raise ValueError(f"HK_KITCHENS entries must be name=dir, got {item!r}")
+            dirs[name.strip()] = os.path.abspath(path.strip())
+        budget = int(float(os.environ.get("HK_CACHE_MB", "512")) * 1024 * 1024)
+        return cls(dirs or {"default": base_dir}, budget)
+
+    def __contains__(self, name):
+        return name in self.data_dirs
+
+    def names(self):
+        return list(self.data_dirs)
+
+    def acquire(self, name):
+        """The Kitchen for a request (opened if needed), marked in use."""
+        with self._lock:
+            kitchen = self._open.get(name)
+            if kitchen is None:
+                kitchen = self._open[name] = Kitchen(name, self.data_dirs[name])
+            self._open.move_to_end(name)
+            kitchen.active += 1
+            return kitchen
+
+    def release(self, kitchen):
+        """End of a request: mark the kitchen idle and keep the caches in budget."""
+        with self._lock:
+            kitchen.active -= 1
+            if len(self._open) < 2:
+                return
+            sizes = {name: k.cache_bytes() for name, k in self._open.items()}
+            total = sum(sizes.values())
+            newest = next(reversed(self._open))
+            for name, k in self._open.items():
+                if total <= self.budget_bytes:
+                    break
+                if name == newest or k.active or not sizes[name]:
+                    continue
+                k.release()
+                total -= sizes[name]
+
+
+class KitchenPrefix:
+    """
+    WSGI middleware for /k/<name>/... URLs: strips the prefix, records the
+    kitchen in the environ and moves the prefix to SCRIPT_NAME, so url_for
+    keeps generating links inside the same kitchen.
+    """
+
+    ENVIRON_KEY = "hk.kitchen"
+
+    def __init__(self, app, kitchens):
+        self.app = app
+        self.kitchens = kitchens
+
+    def __call__(self, environ, start_response):
+        parts = environ.get("PATH_INFO", "").split("/", 3)   # "", "k", name, rest
+        if len(parts) >= 3 and parts[1] == "k" and parts[2] in self.kitchens:
+            environ[self.ENVIRON_KEY] = parts[2]
+            environ["SCRIPT_NAME"] = environ.get("SCRIPT_NAME", "") + f"/k/{parts[2]}"
+            environ["PATH_INFO"] = "/" + (parts[3] if len(parts) > 3 else "")
+        return self.app(environ, start_response)
@@ -0,0 +1,124 @@
+"""
+Opt-in traffic log, for replaying the real workload with replay.py.
+
+With HK_TRAFFIC_LOG=/path/traffic.jsonl each request (or the fraction set
+by HK_TRAFFIC_SAMPLE) appends one line:
+
+    {"at": 1760900000.123, "session": "5f0c2a9e", "method": "GET", "prefix": "",
+     "endpoint": "dashboard", "path": "/dashboard",
+     "args": {"customer": ["~1b9e04c2d7aa"], "status": ["not_cancelled"]},
+     "form": {}, "status": 200, "ms": 12.4}
+
+Nothing in it names a person:
+- sessions are random tokens kept in the session cookie, not user IDs;
+- passwords and user IDs are never written;
+- free text (customers, items, descriptions, search words, ...) is replaced
+  word by word with a keyed hash, "~" + 12 hex digits. The same word always
+  gets the same pseudonym, so repeated searches stay repeated, and
+  replay.py, given the key and a copy of the data, maps them back to the
+  names in that copy.
+Dates, statuses, amounts, paging parameters and Order IDs are kept as they
+are. The key is HK_TRAFFIC_KEY, else the app's SECRET_KEY, else a random
+key written once next to the log (<log>.key) and shared by every worker,
+so the same word gets the same pseudonym whichever worker logs it.
+
+Each worker appends whole lines to the same file.
+"""
+import hashlib
+import hmac
+import json
+import os
+import random
+import secrets
+import threading
+import time
+
+# Parameters written as they are; everything else not dropped is pseudonymized
+PLAIN_FIELDS = {
+    "from_date", "to_date", "status", "new_status", "apply_to", "order_ids",
+    "page", "per_page", "period", "n", "month", "year", "tolerance", "only", "limit",
+    "price", "count", "amount", "date", "kitchen", "endpoint", "rate", "action", "profile", "v",
+}
+DROPPED_FIELDS = {"userid", "password"}
+SKIPPED_ENDPOINTS = {"static", "order_stream"}   # long-lived streams are not replayable requests
+SESSION_KEY = "traffic_id"
+
+
+def shared_key(path):
+    """The key stored in `path`, generating it if no process has yet."""
+    if not os.path.exists(path):
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w") as fh:
+            fh.write(secrets.token_hex(16))
+        try:
+            os.link(tmp, path)   # fails if another worker got there first
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(tmp)
+    with open(path, encoding="utf-8") as fh:
+        return fh.read().strip()
+
+
+def pseudonym(word, key):
+    """"Ravi" -> "~3fa2..." (case-insensitive, keyed)."""
+    digest = hmac.new(key, word.lower().encode("utf-8"), hashlib.sha256).hexdigest()
+    return "~" + digest[:12]
+
+
+def anonymize(fields, key):
+    """{name: [values]} with free text pseudonymized word by word and secrets dropped."""
+    out = {}
+    for name, values in fields.items():
+        if name in DROPPED_FIELDS:
+            continue
+        if name not in PLAIN_FIELDS:
+            values = [" ".join(pseudonym(word, key) for word in str(v).split()) for v in values]
+        out[name] = values
+    return out
+
+
+class TrafficRecorder:
+    def __init__(self, path, key, sample=1.0):
+        self.path = path
+        self.key = key
+        self.sample = sample
+        self._fh = open(path, "a", encoding="utf-8", buffering=1)   # one write per line
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, secret_key):
+        """A recorder if HK_TRAFFIC_LOG is set, else None."""
+        path = os.environ.get("HK_TRAFFIC_LOG", "").strip()
+        if not path:
+            return None
+        key = os.environ.get("HK_TRAFFIC_KEY") or secret_key or shared_key(path + ".key")
+        return cls(path, key.encode("utf-8"), float(os.environ.get("HK_TRAFFIC_SAMPLE", "1")))
+
+    def start(self, request, session):
+        """(start time, session token) for a request to log, or None to leave it out."""
+        if request.endpoint in SKIPPED_ENDPOINTS or random.random() >= self.sample:
+            return None
+        if SESSION_KEY not in session:
+            session[SESSION_KEY] = secrets.token_hex(4)
+        return time.perf_counter(), session[SESSION_KEY]
+
+    def record(self, started, request, response, order_id=None):
+        started, token = started
+        seconds = time.perf_counter() - started
+        line = {
+            "at": round(time.time() - seconds, 3),   # when the request came in
+            "session": token,
+            "method": request.method,
+            "prefix": request.script_root,
+            "endpoint": request.endpoint,
+            "path": request.path,
+            "args": anonymize(request.args.to_dict(flat=False), self.key),
+            "form": anonymize(request.form.to_dict(flat=False), self.key),
+            "status": response.status_code,
+            "ms": round(seconds * 1000, 2),
+        }
+        if order_id:
+            line["order_id"] = order_id   # created by this request; replay maps it to the new one
+        with self._lock:
+            self._fh.write(json.dumps(line, separators=(",", ":")) + "\n")